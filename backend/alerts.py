@@ -0,0 +1,348 @@
+"""
+Alertes de prix pour l'application Portefeuille Crypto
+
+Les alertes actives sont gardées en mémoire sous forme d'index triés par
+symbole: un tableau des seuils hauts (déclenchés quand le prix monte
+au-dessus) et un tableau des seuils bas (déclenchés quand il descend en
+dessous). À chaque rafraîchissement, les alertes déclenchées d'un symbole
+sont une tranche de ces tableaux trouvée par bisection: le coût dépend du
+nombre de symboles et d'alertes déclenchées, pas du nombre total d'alertes.
+
+Une alerte 'move' (variation en % depuis le prix de référence) est indexée
+comme un seuil haut et un seuil bas. Les alertes déclenchées sont
+désactivées en base par un UPDATE ... WHERE active (une alerte n'est
+notifiée qu'une fois, même si plusieurs processus évaluent les mêmes
+prix), puis transmises aux notificateurs.
+"""
+
+import math
+import queue
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, bindparam
+
+KINDS = ('above', 'below', 'move')
+# Alertes chargées par paquet à la construction de l'index
+LOAD_CHUNK_SIZE = 10000
+# Alertes désactivées par requête UPDATE (limite de paramètres SQLite)
+CLAIM_CHUNK_SIZE = 5000
+
+AlertEvent = namedtuple('AlertEvent', 'alert_id user_id symbol kind threshold price triggered_at')
+
+
+def alert_levels(kind, threshold, reference_price):
+    """Seuils de prix d'une alerte: [('above' | 'below', prix)]"""
+    if kind == 'above':
+        return [('above', threshold)]
+    if kind == 'below':
+        return [('below', threshold)]
+    if kind == 'move' and reference_price:
+        return [('above', reference_price * (1 + threshold / 100)),
+                ('below', reference_price * (1 - threshold / 100))]
+    return []
+
+
+def validate_alert(kind, threshold):
+    """Vérifie le type et le seuil d'une alerte, lève ValueError"""
+    if kind not in KINDS:
+        raise ValueError(f"Type d'alerte inconnu: {kind} ({', '.join(KINDS)})")
+    if threshold is None or not math.isfinite(threshold) or threshold <= 0:
+        raise ValueError("Le seuil doit être un nombre positif")
+    if kind == 'move' and threshold >= 100:
+        raise ValueError("La variation doit être inférieure à 100%")
+
+
+class SymbolIndex:
+    """Seuils triés des alertes actives d'un symbole (tableaux parallèles seuil / id)"""
+
+    __slots__ = ('above_levels', 'above_ids', 'below_levels', 'below_ids')
+
+    def __init__(self, above=(), below=()):
+        above = sorted(above)
+        below = sorted(below)
+        self.above_levels = array('d', [level for level, _ in above])
+        self.above_ids = array('q', [alert_id for _, alert_id in above])
+        self.below_levels = array('d', [level for level, _ in below])
+        self.below_ids = array('q', [alert_id for _, alert_id in below])
+
+    def __len__(self):
+        return len(self.above_ids) + len(self.below_ids)
+
+    def add(self, side, level, alert_id):
+        if side == 'above':
+            position = bisect_right(self.above_levels, level)
+            self.above_levels.insert(position, level)
+            self.above_ids.insert(position, alert_id)
+        else:
+            position = bisect_right(self.below_levels, level)
+            self.below_levels.insert(position, level)
+            self.below_ids.insert(position, alert_id)
+
+    def pop_triggered(self, price):
+        """Retire et retourne les ids des alertes déclenchées par un prix"""
+        # Seuils hauts <= prix: préfixe du tableau trié
+        end = bisect_right(self.above_levels, price)
+        triggered = self.above_ids[:end].tolist()
+        del self.above_levels[:end]
+        del self.above_ids[:end]
+        # Seuils bas >= prix: suffixe du tableau trié
+        start = bisect_left(self.below_levels, price)
+        triggered.extend(self.below_ids[start:].tolist())
+        del self.below_levels[start:]
+        del self.below_ids[start:]
+        return triggered
+
+
+class AlertIndex:
+    """Index en mémoire des alertes actives, mis à jour de façon incrémentale
+
+    Les alertes créées depuis le dernier chargement (id supérieur au plus
+    grand id connu) sont ajoutées avant chaque évaluation. Une alerte
+    supprimée ou déjà déclenchée par un autre processus reste dans l'index
+    jusqu'à ce que son seuil soit atteint: elle est alors écartée par
+    l'UPDATE ... WHERE active.
+    """
+
+    def __init__(self, db, PriceAlert):
+        self.db = db
+        self.PriceAlert = PriceAlert
+        self._symbols = {}
+        self._max_id = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(index) for index in self._symbols.values())
+
+    def _load(self, after_id):
+        """Alertes actives d'id > after_id: (plus grand id lu, {symbole: {côté: [(seuil, id)]}})"""
+        PriceAlert = self.PriceAlert
+        query = (select(PriceAlert.id, PriceAlert.symbol, PriceAlert.kind,
+                        PriceAlert.threshold, PriceAlert.reference_price)
+                 .where(PriceAlert.active.is_(True), PriceAlert.id > after_id)
+                 .order_by(PriceAlert.id)
+                 .execution_options(yield_per=LOAD_CHUNK_SIZE))
+        levels = {}
+        max_id = after_id
+        # Lecture par la couche Core: pas de traitement ORM par ligne
+        rows = self.db.session.connection().execute(query)
+        for alert_id, symbol, kind, threshold, reference_price in rows:
+            sides = levels.setdefault(symbol.upper(), {'above': [], 'below': []})
+            for side, level in alert_levels(kind, threshold, reference_price):
+                sides[side].append((level, alert_id))
+            max_id = alert_id
+        return max_id, levels
+
+    def refresh(self):
+        """Charge les nouvelles alertes (toutes au premier appel), retourne le nombre de symboles lus"""
+        with self._lock:
+            if self._max_id is None:
+                max_id, levels = self._load(0)
+                self._symbols = {symbol: SymbolIndex(sides['above'], sides['below'])
+                                 for symbol, sides in levels.items()}
+                self._max_id = max_id
+                return len(levels)
+
+            max_id, levels = self._load(self._max_id)
+            for symbol, sides in levels.items():
+                index = self._symbols.setdefault(symbol, SymbolIndex())
+                for side in ('above', 'below'):
+                    for level, alert_id in sides[side]:
+                        index.add(side, level, alert_id)
+            self._max_id = max_id
+            return len(levels)
+
+    def symbols(self):
+        """Symboles ayant au moins une alerte indexée (prix à surveiller)"""
+        with self._lock:
+            return sorted(symbol for symbol, index in self._symbols.items() if len(index))
+
+    def reset(self):
+        """Force le rechargement complet au prochain refresh()"""
+        with self._lock:
+            self._symbols = {}
+            self._max_id = None
+
+    def match(self, prices):
+        """Retire de l'index les alertes déclenchées par des prix: {id: (symbole, prix)}"""
+        triggered = {}
+        with self._lock:
+            for symbol, info in prices.items():
+                price = info.get('price')
+                index = self._symbols.get(symbol.upper())
+                if not price or index is None:
+                    continue
+                for alert_id in index.pop_triggered(price):
+                    triggered[alert_id] = (symbol.upper(), price)
+        return triggered
+
+
+class AlertEngine:
+    """Évalue les alertes à chaque rafraîchissement des prix et notifie les déclenchements"""
+
+    def __init__(self, db, PriceAlert, notifiers=(), logger=None):
+        self.db = db
+        self.PriceAlert = PriceAlert
+        self.index = AlertIndex(db, PriceAlert)
+        self.notifiers = list(notifiers)
+        self.logger = logger
+
+    def add_notifier(self, notifier):
+        self.notifiers.append(notifier)
+
+    def watched_symbols(self):
+        """Symboles des alertes actives, à rafraîchir même si personne ne les détient"""
+        self.index.refresh()
+        return self.index.symbols()
+
+    def claim(self, triggered):
+        """Désactive en base les alertes encore actives, retourne leurs AlertEvent
+
+        L'écriture utilise sa propre transaction.
+        """
+        table = self.PriceAlert.__table__
+        now = datetime.now()
+        by_symbol = {}
+        for alert_id, (symbol, price) in triggered.items():
+            by_symbol.setdefault((symbol, price), []).append(alert_id)
+        # Une seule requête compilée, la liste d'ids est développée à l'exécution
+        statement = (table.update()
+                     .where(table.c.id.in_(bindparam('ids', expanding=True)), table.c.active.is_(True))
+                     .values(active=False, triggered_at=bindparam('now'), triggered_price=bindparam('at_price'))
+                     .returning(table.c.id, table.c.user_id, table.c.kind, table.c.threshold))
+        events = []
+        with self.db.engine.begin() as connection:
+            for (symbol, price), ids in by_symbol.items():
+                ids.sort()
+                for start in range(0, len(ids), CLAIM_CHUNK_SIZE):
+                    rows = connection.execute(statement, {'ids': ids[start:start + CLAIM_CHUNK_SIZE],
+                                                          'now': now, 'at_price': price})
+                    events.extend(AlertEvent(alert_id, user_id, symbol, kind, threshold, price, now)
+                                  for alert_id, user_id, kind, threshold in rows)
+        return events
+
+    def notify(self, events):
+        for notifier in self.notifiers:
+            try:
+                notifier.notify(events)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Erreur notification alertes ({type(notifier).__name__}): {e}")
+
+    def evaluate(self, prices):
+        """Déclenche les alertes atteintes par des prix (dict symbole -> {'price', ...})
+
+        Retourne la liste des AlertEvent notifiés.
+        """
+        self.index.refresh()
+        triggered = self.index.match(prices)
+        if not triggered:
+            return []
+        try:
+            events = self.claim(triggered)
+        except Exception:
+            # Les alertes retirées de l'index n'ont pas été désactivées
+            self.index.reset()
+            raise
+        if events:
+            self.notify(events)
+        return events
+
+
+# --- Notificateurs: objets avec une méthode notify(events) ---
+
+class DatabaseNotifier:
+    """File in-app: une notification par alerte déclenchée, lue par l'utilisateur"""
+
+    def __init__(self, db, AlertNotification):
+        self.db = db
+        self.AlertNotification = AlertNotification
+
+    def notify(self, events):
+        with self.db.engine.begin() as connection:
+            connection.execute(self.AlertNotification.__table__.insert(), [{
+                'user_id': event.user_id,
+                'alert_id': event.alert_id,
+                'symbol': event.symbol,
+                'kind': event.kind,
+                'threshold': event.threshold,
+                'price': event.price,
+                'created_at': event.triggered_at
+            } for event in events])
+
+    def pop(self, user_id, limit=50):
+        """Notifications non lues d'un utilisateur, marquées comme lues"""
+        AlertNotification = self.AlertNotification
+        notifications = (AlertNotification.query
+                         .filter_by(user_id=user_id, read_at=None)
+                         .order_by(AlertNotification.id)
+                         .limit(limit)
+                         .all())
+        now = datetime.now()
+        for notification in notifications:
+            notification.read_at = now
+        self.db.session.commit()
+        return notifications
+
+
+class WebhookNotifier:
+    """POST JSON des alertes déclenchées vers une URL, depuis un thread dédié
+
+    L'évaluation ne bloque jamais sur le webhook: les déclenchements de
+    chaque évaluation sont mis en file puis envoyés dans l'ordre, par lots
+    de batch_size alertes; ils sont abandonnés (et journalisés) si la file
+    est pleine ou si l'appel échoue.
+    """
+
+    def __init__(self, url, timeout=5, batch_size=500, max_pending=100, logger=None, session=None):
+        self.url = url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.logger = logger
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.session = session
+        self._queue = queue.Queue(max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def notify(self, events):
+        self.start()
+        try:
+            self._queue.put_nowait(events)
+        except queue.Full:
+            if self.logger:
+                self.logger.warning(f"Webhook alertes: file pleine, {len(events)} alertes abandonnées")
+
+    def send(self, events):
+        for start in range(0, len(events), self.batch_size):
+            batch = [dict(event._asdict(), triggered_at=event.triggered_at.isoformat())
+                     for event in events[start:start + self.batch_size]]
+            response = self.session.post(self.url, json={'alerts': batch}, timeout=self.timeout)
+            response.raise_for_status()
+
+    def _loop(self):
+        while True:
+            events = self._queue.get()
+            try:
+                self.send(events)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Erreur webhook alertes: {e}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Attend l'envoi des lots en file"""
+        self._queue.join()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='alert-webhook', daemon=True)
+                self._thread.start()
@@ -1,11 +1,31 @@
+import io
 import os
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
+from jinja2 import pass_context
 from models import create_models
-import requests
+import db_engine
+from price_worker import PriceIngestionWorker, store_prices
+from cache import create_cache, FRESH
+from rate_limiter import create_rate_limiter
+from coingecko import CoinGeckoClient, CoinGeckoError, RateLimitedError
+from coin_directory import CoinDirectory
+from portfolio import portfolio_rows, summarize
+from cost_basis import CostBasisEngine, InsufficientQuantityError
+from migrations import upgrade_schema
+from price_history import PriceHistory, INTERVALS, parse_duration, bounded_interval
+from portfolio_history import PortfolioHistory
+from price_stream import PricePublisher
+from market_snapshot import MarketData
+from risk import RiskEngine
+from metrics import Metrics
+from fx import FxRates, QUOTE_CURRENCY, CURRENCIES, convert_rows, convert_amounts, format_money
+from alerts import AlertEngine, DatabaseNotifier, WebhookNotifier, validate_alert
+from response_cache import ResponseCache, PriceEpoch
+from portfolio_io import PortfolioImporter, export_rows, generate_export, detect_format, FORMATS
 import json
-import time
+import threading
 from datetime import datetime
 
 # Initialiser Flask
@@ -13,13 +33,93 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'crypto_portfolio_mobile_2025_secret_key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///crypto_portfolio.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Moteur de la base: profil 'sqlite', 'postgres' ou 'serverless' (déduit de l'URL
+# par défaut) et réglages qui remplacent ceux du profil (voir db_engine.py)
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE')
+for name in ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_POOL_TIMEOUT', 'DB_POOL_RECYCLE',
+             'DB_CONNECT_TIMEOUT', 'DB_STATEMENT_TIMEOUT', 'DB_BUSY_TIMEOUT'):
+    app.config[name] = int(os.environ[name]) if os.environ.get(name) else None
+# Création des tables et migrations par create_app() (sinon: python init_db.py migrate)
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', '0') == '1'
 app.config['JSON_SORT_KEYS'] = False
+# Source des prix: 'inline' (appel API dans la requête), 'thread' (worker
+# intégré à l'application) ou 'external' (worker lancé via price_worker.py)
+app.config['PRICE_INGESTION_MODE'] = os.environ.get('PRICE_INGESTION_MODE', 'inline')
+app.config['PRICE_WORKER_INTERVAL'] = int(os.environ.get('PRICE_WORKER_INTERVAL', 60))
+# Cache des prix: 'memory' (LRU par processus) ou 'sqlite' (partagé entre workers)
+app.config['PRICE_CACHE_BACKEND'] = os.environ.get('PRICE_CACHE_BACKEND', 'memory')
+app.config['PRICE_CACHE_PATH'] = os.environ.get('PRICE_CACHE_PATH',
+                                                os.path.join(app.instance_path, 'price_cache.db'))
+app.config['PRICE_CACHE_SIZE'] = int(os.environ.get('PRICE_CACHE_SIZE', 4096))
+# Durée pendant laquelle un prix expiré reste servi pendant son rafraîchissement
+app.config['PRICE_CACHE_STALE'] = int(os.environ.get('PRICE_CACHE_STALE', 3600))
+# Budgets d'appels CoinGecko par endpoint ('appels/secondes'), partagés entre
+# workers avec le backend 'sqlite'
+app.config['RATE_LIMITS'] = os.environ.get('RATE_LIMITS', 'default=30/60')
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+app.config['RATE_LIMIT_PATH'] = os.environ.get('RATE_LIMIT_PATH',
+                                               os.path.join(app.instance_path, 'rate_limit.db'))
+# Attente maximale pour un jeton avant d'abandonner l'appel (secondes)
+app.config['RATE_LIMIT_MAX_WAIT'] = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 5))
+# Client HTTP CoinGecko (timeouts en secondes, nouvelles tentatives sur 429/5xx)
+app.config['COINGECKO_API_URL'] = os.environ.get('COINGECKO_API_URL', 'https://api.coingecko.com/api/v3')
+app.config['COINGECKO_API_KEY'] = os.environ.get('COINGECKO_API_KEY')
+app.config['COINGECKO_TIMEOUT'] = float(os.environ.get('COINGECKO_TIMEOUT', 10))
+app.config['COINGECKO_RETRIES'] = int(os.environ.get('COINGECKO_RETRIES', 2))
+app.config['COINGECKO_POOL_SIZE'] = int(os.environ.get('COINGECKO_POOL_SIZE', 10))
+# Annuaire local des coins: rechargement depuis CoinGecko par le worker (secondes)
+app.config['COIN_DIRECTORY_REFRESH'] = int(os.environ.get('COIN_DIRECTORY_REFRESH', 24 * 3600))
+# Méthode de prix de revient des nouvelles positions: 'average', 'fifo' ou 'lifo'
+app.config['COST_BASIS_METHOD'] = os.environ.get('COST_BASIS_METHOD', 'average')
+# Historique des prix: jours conservés en échantillons bruts avant compactage horaire
+app.config['PRICE_HISTORY_RAW_DAYS'] = int(os.environ.get('PRICE_HISTORY_RAW_DAYS', 7))
+# Durée de cache des courbes de valeur du portefeuille (secondes)
+app.config['PORTFOLIO_HISTORY_TTL'] = int(os.environ.get('PORTFOLIO_HISTORY_TTL', 300))
+# Instantané du marché: taille du top (par capitalisation) et fréquence de rafraîchissement (secondes)
+app.config['MARKET_TOP_N'] = int(os.environ.get('MARKET_TOP_N', 250))
+app.config['MARKET_REFRESH'] = int(os.environ.get('MARKET_REFRESH', 300))
+# Flux SSE des prix: intervalle de l'éditeur et durée maximale d'une connexion (secondes)
+app.config['PRICE_STREAM_INTERVAL'] = int(os.environ.get('PRICE_STREAM_INTERVAL', 30))
+app.config['PRICE_STREAM_MAX_DURATION'] = int(os.environ.get('PRICE_STREAM_MAX_DURATION', 300))
+# Taux sans risque annuel utilisé pour le ratio de Sharpe (0.04 = 4%)
+app.config['RISK_FREE_RATE'] = float(os.environ.get('RISK_FREE_RATE', 0))
+# Instrumentation: en-tête Server-Timing sur chaque réponse, jeton optionnel pour /metrics
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Taux de change (devise d'affichage des utilisateurs): durée de fraîcheur (secondes)
+app.config['FX_RATES_TTL'] = int(os.environ.get('FX_RATES_TTL', 3600))
+# Alertes de prix: webhook optionnel appelé à chaque déclenchement (timeout en secondes)
+app.config['ALERT_WEBHOOK_URL'] = os.environ.get('ALERT_WEBHOOK_URL')
+app.config['ALERT_WEBHOOK_TIMEOUT'] = float(os.environ.get('ALERT_WEBHOOK_TIMEOUT', 5))
+# Cache des pages rendues: 'memory' (LRU par processus) ou 'sqlite' (partagé entre
+# workers, nécessaire avec un worker de prix externe), nombre de réponses et
+# durée maximale de service d'une réponse en cache (secondes)
+app.config['RESPONSE_CACHE'] = os.environ.get('RESPONSE_CACHE', '1') == '1'
+app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND',
+                                                      app.config['PRICE_CACHE_BACKEND'])
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
 
-# Initialiser SQLAlchemy
+# Réglages relus pendant l'exécution, remplaçables par create_app(config); les
+# autres réglages de ce module construisent à l'import le moteur de la base,
+# les caches et les clients: ils ne se changent que par l'environnement
+RUNTIME_CONFIG = frozenset({'AUTO_MIGRATE', 'PRICE_INGESTION_MODE', 'PRICE_STREAM_MAX_DURATION',
+                            'METRICS_TOKEN', 'PRICE_HISTORY_RAW_DAYS'})
+FIXED_CONFIG = (frozenset(app.config) - frozenset(Flask.default_config) - RUNTIME_CONFIG
+                | {'SQLALCHEMY_ENGINE_OPTIONS'})
+
+# Initialiser SQLAlchemy avec les options du profil de base
+db_engine.configure(app, app.config['DB_PROFILE'])
 db = SQLAlchemy(app)
+db_engine.init_app(app, db)
+
+# Latences, caches, appels amont et requêtes SQL exposés sur /metrics
+metrics = Metrics()
+metrics.init_app(app, db, server_timing=app.config['SERVER_TIMING'])
 
 # Créer les modèles avec l'instance db
-User, Crypto = create_models(db)
+(User, Asset, Holding, Coin, Transaction, PricePoint, MarketSnapshot,
+ PriceAlert, AlertNotification) = create_models(db)
 
 # Configuration Flask-Login
 login_manager = LoginManager()
@@ -28,6 +128,9 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
 login_manager.login_message_category = 'info'
 
+# Moteur de prix de revient (lots d'achat, ventes, P&L réalisé)
+cost_basis = CostBasisEngine(db, Holding, Asset, Transaction, default_method=app.config['COST_BASIS_METHOD'])
+
 # Rendre current_user disponible dans tous les templates
 @login_manager.user_loader
 def load_user(user_id):
@@ -39,18 +142,21 @@ def inject_current_user():
     from flask_login import current_user
     return dict(current_user=current_user)
 
-# Initialisation automatique de la base de données
-def init_database():
-    """Créer toutes les tables si elles n'existent pas"""
+def migrate_database():
+    """Crée les tables manquantes et applique les migrations du schéma
+
+    Étape explicite (python init_db.py migrate, create_app() avec
+    AUTO_MIGRATE, serveur de développement): l'import de ce module ne
+    touche jamais à la base.
+    """
     try:
         with app.app_context():
             db.create_all()
+            upgrade_schema(db, cost_basis)
             print("Base de donnees initialisee avec succes!")
     except Exception as e:
         print(f"Erreur lors de l'initialisation de la base: {e}")
 
-# Initialiser la base de données au démarrage
-init_database()
 # Routes d'authentification
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -131,7 +237,7 @@ def profile():
     return render_template('profile.html')
 
 # API simple CoinGecko
-COINGECKO_API = "https://api.coingecko.com/api/v3"
+COINGECKO_API = app.config['COINGECKO_API_URL']
 
 # Mapping des symboles vers les IDs CoinGecko
 SYMBOL_TO_ID = {
@@ -158,116 +264,345 @@ SYMBOL_TO_ID = {
 }
 
 # Cache pour éviter trop d'appels API
-price_cache = {}
 CACHE_DURATION = 300  # 5 minutes
+price_cache = metrics.instrument_cache('price', create_cache(app.config['PRICE_CACHE_BACKEND'],
+                                                            path=app.config['PRICE_CACHE_PATH'],
+                                                            max_size=app.config['PRICE_CACHE_SIZE'],
+                                                            ttl=CACHE_DURATION,
+                                                            stale_ttl=app.config['PRICE_CACHE_STALE']))
 
 # Contrôle de rate limiting
-last_api_call = 0
-MIN_API_INTERVAL = 1.1  # Minimum 1.1 secondes entre les appels
-
-def rate_limit():
-    """Respecte le rate limiting de l'API"""
-    global last_api_call
-    now = time.time()
-    elapsed = now - last_api_call
-    if elapsed < MIN_API_INTERVAL:
-        time.sleep(MIN_API_INTERVAL - elapsed)
-    last_api_call = time.time()
+rate_limiter = create_rate_limiter(app.config['RATE_LIMITS'],
+                                   backend=app.config['RATE_LIMIT_BACKEND'],
+                                   path=app.config['RATE_LIMIT_PATH'])
+metrics.register_rate_limiter(rate_limiter)
+
+# Client partagé: connexions persistantes et appels simultanés coalescés
+coingecko = CoinGeckoClient(COINGECKO_API,
+                            read_timeout=app.config['COINGECKO_TIMEOUT'],
+                            retries=app.config['COINGECKO_RETRIES'],
+                            pool_size=app.config['COINGECKO_POOL_SIZE'],
+                            rate_limiter=rate_limiter,
+                            max_wait=app.config['RATE_LIMIT_MAX_WAIT'],
+                            api_key=app.config['COINGECKO_API_KEY'],
+                            metrics=metrics)
+
+# Taux de change de toutes les devises en un appel /exchange_rates, partagés
+# entre workers avec le backend 'sqlite'
+fx_rates = FxRates(coingecko.exchange_rates,
+                   cache=metrics.instrument_cache('fx_rates', create_cache(
+                       app.config['PRICE_CACHE_BACKEND'],
+                       path=app.config['PRICE_CACHE_PATH'],
+                       max_size=16,
+                       ttl=app.config['FX_RATES_TTL'],
+                       stale_ttl=app.config['PRICE_CACHE_STALE'],
+                       table='fx_rates')),
+                   logger=app.logger)
+
+def user_currency():
+    """Devise d'affichage de l'utilisateur connecté (avec son taux depuis la devise de cotation)"""
+    if current_user.is_authenticated:
+        return fx_rates.currency(current_user.base_currency)
+    return fx_rates.currency(QUOTE_CURRENCY)
+
+@app.context_processor
+def inject_currency():
+    """Devise d'affichage et devises proposées, disponibles dans tous les templates"""
+    return dict(currency=user_currency(), currencies=CURRENCIES)
+
+@app.template_filter('money')
+@pass_context
+def money_filter(context, value, decimals=None):
+    """{{ montant|money }}: montant (déjà converti) formaté dans la devise du template"""
+    return format_money(value, context['currency'], decimals)
 
 def get_cached_price(symbol):
     """Récupère le prix avec cache pour optimiser les performances"""
-    now = datetime.now()
-    if symbol in price_cache:
-        cached_data, timestamp = price_cache[symbol]
-        if (now - timestamp).seconds < CACHE_DURATION:
-            return cached_data
+    cached = price_cache.get(symbol)
+    if cached and cached[1] == FRESH:
+        return cached[0]
     
     return None
 
 def set_cached_price(symbol, price_data):
     """Met en cache les données de prix"""
-    price_cache[symbol] = (price_data, datetime.now())
+    price_cache.set(symbol, price_data)
 
-def get_crypto_price_simple(symbol):
-    """Récupère le prix via l'API simple CoinGecko avec rate limiting"""
+def revalidate_prices(symbols):
+    """Rafraîchit en arrière-plan des prix servis périmés depuis le cache"""
+    def refresh():
+        with app.app_context():
+            get_crypto_prices(symbols, use_cache=False)
+    
+    thread = threading.Thread(target=refresh, daemon=True)
+    thread.start()
+    return thread
+
+# Historique des prix (un échantillon par symbole et par rafraîchissement)
+price_history = PriceHistory(db, PricePoint)
+
+# Alertes de prix, évaluées après chaque récupération effective des prix
+alert_notifications = DatabaseNotifier(db, AlertNotification)
+alert_engine = AlertEngine(db, PriceAlert, notifiers=[alert_notifications], logger=app.logger)
+if app.config['ALERT_WEBHOOK_URL']:
+    alert_engine.add_notifier(WebhookNotifier(app.config['ALERT_WEBHOOK_URL'],
+                                              timeout=app.config['ALERT_WEBHOOK_TIMEOUT'],
+                                              logger=app.logger))
+
+# Pages rendues en cache par (route, utilisateur, version du portefeuille,
+# devise, époque des prix); l'époque change à chaque rafraîchissement des prix
+price_epoch = PriceEpoch(create_cache(app.config['RESPONSE_CACHE_BACKEND'],
+                                      path=app.config['PRICE_CACHE_PATH'],
+                                      max_size=16,
+                                      ttl=app.config['RESPONSE_CACHE_TTL'],
+                                      table='response_epoch'))
+
+def response_cache_vary():
+    """Éléments de clé propres à l'utilisateur connecté"""
+    if not current_user.is_authenticated:
+        return None
+    return (current_user.id, current_user.portfolio_version or 0, current_user.base_currency or QUOTE_CURRENCY)
+
+response_cache = ResponseCache(metrics.instrument_cache('response', create_cache(
+                                   app.config['RESPONSE_CACHE_BACKEND'],
+                                   path=app.config['PRICE_CACHE_PATH'],
+                                   max_size=app.config['RESPONSE_CACHE_SIZE'],
+                                   ttl=app.config['RESPONSE_CACHE_TTL'],
+                                   table='response_cache')),
+                               price_epoch, response_cache_vary,
+                               enabled=app.config['RESPONSE_CACHE'])
+
+def record_prices(prices):
+    """Enregistre les prix fraîchement récupérés (table asset et historique),
+    évalue les alertes et invalide les pages en cache
+    
+    Appelé une fois par récupération effective, jamais à la lecture d'une page.
+    Retourne le nombre de prix enregistrés dans la table asset.
+    """
+    stored = 0
+    try:
+        stored = store_prices(db, Asset, prices)
+    except Exception as e:
+        app.logger.error(f"Erreur enregistrement des prix: {e}")
     try:
+        price_history.append(prices)
+    except Exception as e:
+        app.logger.error(f"Erreur historique des prix: {e}")
+    try:
+        alert_engine.evaluate(prices)
+    except Exception as e:
+        app.logger.error(f"Erreur évaluation des alertes: {e}")
+    price_epoch.bump()
+    return stored
+
+# Courbes de valeur du portefeuille, en cache par (utilisateur, version, plage)
+portfolio_history = PortfolioHistory(db, Holding, Asset, Transaction, price_history,
+                                     cache=metrics.instrument_cache('portfolio_history', create_cache(
+                                         app.config['PRICE_CACHE_BACKEND'],
+                                         path=app.config['PRICE_CACHE_PATH'],
+                                         max_size=app.config['PRICE_CACHE_SIZE'],
+                                         ttl=app.config['PORTFOLIO_HISTORY_TTL'],
+                                         table='portfolio_history')))
+
+# Indicateurs de risque (prix journaliers), en cache par (utilisateur, version, fenêtre)
+risk_engine = RiskEngine(db, Holding, Asset, price_history,
+                         cache=metrics.instrument_cache('portfolio_risk', create_cache(
+                             app.config['PRICE_CACHE_BACKEND'],
+                             path=app.config['PRICE_CACHE_PATH'],
+                             max_size=app.config['PRICE_CACHE_SIZE'],
+                             ttl=app.config['PORTFOLIO_HISTORY_TTL'],
+                             table='portfolio_risk')),
+                         risk_free_rate=app.config['RISK_FREE_RATE'])
+
+def touch_portfolio(user):
+    """Signale une modification des positions (invalide les courbes et les pages en cache)"""
+    user.portfolio_version = (user.portfolio_version or 0) + 1
+
+def user_symbols(user_id):
+    """Symboles des actifs détenus par un utilisateur"""
+    return [symbol for symbol, in db.session.query(Asset.symbol)
+            .join(Holding, Holding.asset_id == Asset.id)
+            .filter(Holding.user_id == user_id)]
+
+def get_or_create_asset(symbol, name, price_info):
+    """Actif d'un symbole, créé avec son prix actuel s'il n'existe pas encore"""
+    asset = Asset.query.filter_by(symbol=symbol).first()
+    if asset is None:
+        asset = Asset(symbol=symbol,
+                      current_price=price_info['price'],
+                      price_change_24h=price_info['change_24h'],
+                      updated_at=datetime.now())
+        db.session.add(asset)
+    if not asset.name:
+        asset.name = name
+    return asset
+
+# Annuaire local des coins (recherche et résolution sans appel réseau)
+coin_directory = CoinDirectory(db, Coin)
+
+# Nombre maximum d'ids acceptés par /simple/price dans une seule requête
+MAX_IDS_PER_REQUEST = 250
+
+EMPTY_PRICE = {'price': 0, 'change_24h': 0}
+
+def resolve_coin_id(symbol):
+    """Convertit un symbole en ID CoinGecko (mapping local, annuaire puis recherche)"""
+    coin_id = SYMBOL_TO_ID.get(symbol.upper()) or coin_directory.resolve(symbol)
+    if coin_id:
+        return coin_id
+    
+    # Essaie de rechercher par nom
+    try:
+        search_data = coingecko.search(symbol)
+    except RateLimitedError:
+        app.logger.warning(f"Rate limit hit for search: {symbol}")
+        return None
+    
+    if not search_data.get('coins'):
+        return None
+    
+    coin_id = search_data['coins'][0]['id']
+    coin_directory.remember(symbol, coin_id)
+    return coin_id
+
+def fetch_simple_prices(coin_ids):
+    """Récupère les prix d'une liste d'IDs en un seul appel /simple/price"""
+    return coingecko.simple_price(coin_ids)
+
+def get_crypto_prices(symbols, use_cache=True, with_count=False):
+    """Récupère les prix de plusieurs cryptos en regroupant les appels API
+    
+    Les symboles absents du cache sont récupérés ensemble via /simple/price
+    (par paquets de MAX_IDS_PER_REQUEST ids, dans l'ordre reçu). Un prix
+    périmé est servi immédiatement et rafraîchi en arrière-plan par un seul
+    appelant. Retourne un dict symbole -> prix, et avec with_count le nombre
+    de prix récupérés et enregistrés par cet appel (les prix servis par le
+    cache sont déjà en base).
+    """
+    results = {}
+    missing = {}  # coin_id -> symboles demandés
+    stale = []
+    
+    for symbol in dict.fromkeys(s.upper() for s in symbols):
         # Vérifie le cache d'abord
-        cached = get_cached_price(symbol)
+        cached = price_cache.get(symbol) if use_cache else None
         if cached:
-            return cached
-        
-        # Rate limiting
-        rate_limit()
-        
-        # Convertit le symbole en ID CoinGecko
-        coin_id = SYMBOL_TO_ID.get(symbol.upper())
-        if not coin_id:
-            # Essaie de rechercher par nom
-            search_url = f"{COINGECKO_API}/search"
-            rate_limit()  # Rate limiting pour la recherche aussi
-            search_response = requests.get(search_url, params={'query': symbol}, timeout=5)
-            
-            if search_response.status_code == 429:
-                app.logger.warning(f"Rate limit hit for search: {symbol}")
-                return {'price': 0, 'change_24h': 0}
-                
-            search_data = search_response.json()
-            
-            if not search_data.get('coins'):
-                return {'price': 0, 'change_24h': 0}
-            
-            coin_id = search_data['coins'][0]['id']
-        
-        # Récupère le prix simple
-        price_url = f"{COINGECKO_API}/simple/price"
-        params = {
-            'ids': coin_id,
-            'vs_currencies': 'usd',
-            'include_24hr_change': 'true'
-        }
-        
-        response = requests.get(price_url, params=params, timeout=10)
-        
-        if response.status_code == 429:
-            app.logger.warning(f"Rate limit hit for price: {symbol}")
-            return {'price': 0, 'change_24h': 0}
-            
-        response.raise_for_status()
-        data = response.json()
-        
-        price_info = {
-            'price': data.get(coin_id, {}).get('usd', 0),
-            'change_24h': data.get(coin_id, {}).get('usd_24h_change', 0)
-        }
+            results[symbol] = cached[0]
+            if cached[1] != FRESH and price_cache.claim_refresh(symbol):
+                stale.append(symbol)
+            continue
         
-        # Met en cache
-        set_cached_price(symbol, price_info)
-        return price_info
+        try:
+            coin_id = resolve_coin_id(symbol)
+        except Exception as e:
+            app.logger.error(f"Erreur recherche id pour {symbol}: {e}")
+            coin_id = None
         
-    except requests.exceptions.RequestException as e:
-        if e.response and e.response.status_code == 429:
-            app.logger.warning(f"Rate limit API pour {symbol}: {e}")
+        if coin_id:
+            missing.setdefault(coin_id, []).append(symbol)
         else:
-            app.logger.error(f"Erreur réseau pour {symbol}: {e}")
-        return {'price': 0, 'change_24h': 0}
+            results[symbol] = dict(EMPTY_PRICE)
+    
+    if missing and not prices_from_store():
+        # Mode inline (pas de worker): les symboles des alertes actives dont le
+        # prix a expiré sont récupérés avec ceux de la page, dans les mêmes appels
+        add_alert_symbols(missing, results)
+    
+    coin_ids = list(missing)
+    fetched = {}
+    for start in range(0, len(coin_ids), MAX_IDS_PER_REQUEST):
+        chunk = coin_ids[start:start + MAX_IDS_PER_REQUEST]
+        try:
+            data = fetch_simple_prices(chunk)
+        except RateLimitedError as e:
+            app.logger.warning(f"Rate limit API pour {','.join(chunk)}: {e}")
+            data = {}
+        except CoinGeckoError as e:
+            app.logger.error(f"Erreur réseau pour {','.join(chunk)}: {e}")
+            data = {}
+        except Exception as e:
+            app.logger.error(f"Erreur prix {','.join(chunk)}: {e}")
+            data = {}
+        
+        for coin_id in chunk:
+            coin_data = data.get(coin_id)
+            for symbol in missing[coin_id]:
+                if coin_data is None:
+                    results[symbol] = dict(EMPTY_PRICE)
+                    continue
+                
+                price_info = {
+                    'price': coin_data.get('usd', 0),
+                    'change_24h': coin_data.get('usd_24h_change', 0)
+                }
+                
+                # Met en cache
+                set_cached_price(symbol, price_info)
+                results[symbol] = price_info
+                fetched[symbol] = price_info
+    
+    stored = record_prices(fetched) if fetched else 0
+    
+    if stale:
+        revalidate_prices(stale)
+    
+    return (results, stored) if with_count else results
+
+def add_alert_symbols(missing, results):
+    """Ajoute à missing (coin_id -> symboles) les symboles d'alertes sans prix frais"""
+    try:
+        symbols = alert_engine.watched_symbols()
     except Exception as e:
-        app.logger.error(f"Erreur prix {symbol}: {e}")
-        return {'price': 0, 'change_24h': 0}
+        app.logger.error(f"Erreur lecture des alertes: {e}")
+        return
+    requested = {symbol for symbols in missing.values() for symbol in symbols}
+    for symbol in symbols:
+        if symbol in results or symbol in requested or get_cached_price(symbol):
+            continue
+        # Pas de recherche réseau ici: l'alerte a été créée sur un symbole connu
+        coin_id = SYMBOL_TO_ID.get(symbol) or coin_directory.resolve(symbol)
+        if coin_id:
+            missing.setdefault(coin_id, []).append(symbol)
+
+def get_crypto_price_simple(symbol):
+    """Récupère le prix d'une seule crypto (délègue à get_crypto_prices)"""
+    return get_crypto_prices([symbol])[symbol.upper()]
+
+def prices_from_store():
+    """Indique si les prix sont alimentés par le worker d'ingestion"""
+    return app.config['PRICE_INGESTION_MODE'] in ('thread', 'external')
+
+def get_stored_prices(symbols):
+    """Lit les derniers prix enregistrés en base pour une liste de symboles"""
+    symbols = [s.upper() for s in symbols]
+    if not symbols:
+        return {}
+    
+    rows = (db.session.query(Asset.symbol, Asset.current_price, Asset.price_change_24h)
+            .filter(Asset.symbol.in_(symbols), Asset.current_price > 0))
+    
+    return {symbol: {'price': price, 'change_24h': change_24h or 0}
+            for symbol, price, change_24h in rows}
+
+def get_portfolio_prices(symbols):
+    """Prix à utiliser dans les routes: stockés si le worker tourne, sinon via l'API
+    
+    Un symbole encore jamais ingéré (aucune ligne en base) est récupéré
+    directement, le worker le prendra en charge au cycle suivant.
+    """
+    if not prices_from_store():
+        return get_crypto_prices(symbols)
+    
+    results = get_stored_prices(symbols)
+    missing = [s.upper() for s in symbols if s.upper() not in results]
+    if missing:
+        results.update(get_crypto_prices(missing))
+    return results
 
 def search_crypto_coinGecko(query):
     """Recherche de cryptomonnaies via l'API CoinGecko avec rate limiting"""
     try:
-        rate_limit()  # Rate limiting
-        
-        url = f"{COINGECKO_API}/search"
-        response = requests.get(url, params={'query': query}, timeout=5)
-        
-        if response.status_code == 429:
-            app.logger.warning(f"Rate limit hit for search: {query}")
-            return []
-            
-        response.raise_for_status()
-        data = response.json()
+        data = coingecko.search(query)
         
         results = []
         for coin in data.get('coins', [])[:10]:
@@ -278,42 +613,33 @@ def search_crypto_coinGecko(query):
                 'image': coin.get('thumb', '')
             })
         return results
+    except RateLimitedError:
+        app.logger.warning(f"Rate limit hit for search: {query}")
+        return []
     except Exception as e:
         app.logger.error(f"Erreur recherche crypto: {e}")
         return []
 
 @app.route('/')
 @login_required
+@response_cache.cached
 def index():
-    """Page d'accueil - Tableau de bord principal"""
-    cryptos = Crypto.query.filter_by(user_id=current_user.id).all()
-    total_portfolio_value = 0
-    total_profit_loss = 0
-    total_invested = 0
-    
-    # Calcule les valeurs sans les stocker dans la base
-    for crypto in cryptos:
-        # Récupère les prix actuels
-        price_info = get_crypto_price_simple(crypto.symbol)
-        current_price = price_info['price']
-        change_24h = price_info['change_24h']
-        
-        # Met à jour la base de données seulement avec les champs stockés
-        crypto.current_price = current_price
-        crypto.price_change_24h = change_24h
-        crypto.last_updated = datetime.now()
-        
-        # Calcule les valeurs (propriétés calculées)
-        crypto_value = crypto.current_value  # Utilise la propriété calculée
-        crypto_profit_loss = crypto.profit_loss  # Utilise la propriété calculée
-        crypto_invested = crypto.quantity * crypto.purchase_price  # Calcul direct
-        
-        total_portfolio_value += crypto_value
-        total_profit_loss += crypto_profit_loss
-        total_invested += crypto_invested
+    """Page d'accueil - Tableau de bord principal
     
-    # Sauvegarde des mises à jour
-    db.session.commit()
+    Lecture seule: les prix viennent de la table asset, jointe au
+    portefeuille par la requête d'agrégation.
+    """
+    if not prices_from_store():
+        # Sans worker, récupère d'un seul appel les prix absents du cache
+        # (enregistrés une fois par cycle de cache, pas à chaque affichage)
+        get_crypto_prices(user_symbols(current_user.id))
+    
+    # Montants convertis dans la devise de l'utilisateur en une opération
+    currency = user_currency()
+    cryptos = convert_rows(portfolio_rows(db, Holding, Asset, current_user.id), currency.rate)
+    summary = summarize(cryptos)
+    total_portfolio_value = summary.total_value
+    total_profit_loss = summary.total_profit_loss
     
     total_profit_loss_percentage = (total_profit_loss/total_portfolio_value*100) if total_portfolio_value > 0 else 0
     
@@ -322,7 +648,8 @@ def index():
                          total_portfolio_value=total_portfolio_value,
                          total_profit_loss=total_profit_loss,
                          total_profit_loss_percentage=total_profit_loss_percentage,
-                         total_invested=total_invested)
+                         total_invested=summary.total_invested,
+                         currency=currency)
 
 @app.route('/search_crypto', methods=['POST'])
 def search_crypto():
@@ -331,15 +658,84 @@ def search_crypto():
     if not query or len(query) < 2:
         return jsonify({'results': []})
     
-    results = search_crypto_coinGecko(query)
+    # Annuaire local d'abord, API distante seulement s'il n'est pas chargé
+    results = coin_directory.search(query)
+    if not results and not len(coin_directory.index()):
+        results = search_crypto_coinGecko(query)
     return jsonify({'results': results})
 
 @app.route('/api/crypto_price/<symbol>')
 def api_crypto_price(symbol):
     """API pour obtenir le prix d'une crypto"""
-    price_info = get_crypto_price_simple(symbol)
+    price_info = get_portfolio_prices([symbol])[symbol.upper()]
     return jsonify(price_info)
 
+@app.route('/api/price_history/<symbol>')
+def api_price_history(symbol):
+    """API pour l'historique d'une crypto (?range=30d&interval=1h)"""
+    try:
+        duration = parse_duration(request.args.get('range', '7d'))
+        interval = bounded_interval(duration, request.args.get('interval'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    start = int(datetime.now().timestamp()) - duration
+    series = price_history.downsample([symbol], start, bucket=INTERVALS[interval])
+    return jsonify({
+        'symbol': symbol.upper(),
+        'interval': interval,
+        'points': series.get(symbol.upper(), [])
+    })
+
+@app.route('/api/portfolio_history')
+@login_required
+def api_portfolio_history():
+    """API pour la courbe de valeur et de P&L du portefeuille (?range=90d)"""
+    range_name = request.args.get('range', '30d')
+    try:
+        duration = parse_duration(range_name)
+        interval = bounded_interval(duration, request.args.get('interval'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    history = portfolio_history.get(current_user.id, current_user.portfolio_version,
+                                    range_name, duration, INTERVALS[interval])
+    # Courbes en cache dans la devise de cotation, converties à la lecture
+    currency = user_currency()
+    converted = {key: convert_amounts(history[key], currency.rate) for key in ('value', 'invested', 'profit_loss')}
+    return jsonify(dict(history, range=range_name, interval=interval, currency=currency.code, **converted))
+
+@app.route('/api/portfolio_risk')
+@login_required
+def api_portfolio_risk():
+    """API pour les indicateurs de risque du portefeuille (?window=365d&confidence=0.95)"""
+    window_name = request.args.get('window', '365d')
+    try:
+        window = parse_duration(window_name)
+        confidence = float(request.args.get('confidence', 0.95))
+        if not 0.5 <= confidence < 1:
+            raise ValueError(f"Niveau de confiance invalide: {confidence}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    risk = risk_engine.get(current_user.id, current_user.portfolio_version,
+                           window_name, window, confidence)
+    # Montants en cache dans la devise de cotation, convertis à la lecture
+    currency = user_currency()
+    amounts = [key for key in ('portfolio_value', 'var_historical', 'var_parametric') if key in risk]
+    converted = dict(zip(amounts, convert_amounts([risk[key] for key in amounts], currency.rate)))
+    return jsonify(dict(risk, window=window_name, currency=currency.code, **converted))
+
+@app.route('/api/stream/prices')
+@login_required
+def api_stream_prices():
+    """Flux SSE des prix des cryptos détenues par l'utilisateur et de l'instantané du marché"""
+    stream = price_publisher.stream(user_symbols(current_user.id), max_duration=app.config['PRICE_STREAM_MAX_DURATION'])
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/add', methods=['GET', 'POST'])
 @login_required
 def add_crypto():
@@ -352,37 +748,34 @@ def add_crypto():
             purchase_price = float(request.form['purchase_price'])
             
             # Vérifier si la crypto existe déjà pour cet utilisateur
-            existing_crypto = Crypto.query.filter_by(
-                user_id=current_user.id,
-                symbol=symbol
-            ).first()
+            existing_crypto = (Holding.query.join(Asset, Asset.id == Holding.asset_id)
+                               .filter(Holding.user_id == current_user.id, Asset.symbol == symbol)
+                               .first())
             
             if existing_crypto:
-                # Mettre à jour la quantité existante
-                existing_crypto.quantity += quantity
-                existing_crypto.purchase_price = (existing_crypto.purchase_price + purchase_price) / 2
+                # Ajoute un lot: quantité et coût moyen pondéré mis à jour
+                cost_basis.buy(existing_crypto, quantity, purchase_price)
                 existing_crypto.last_updated = datetime.now()
                 flash(f'{name} mise à jour avec succès! Quantité totale: {existing_crypto.quantity}', 'success')
             else:
-                # Récupère le prix actuel automatiquement
-                price_info = get_crypto_price_simple(symbol)
+                # Récupère le prix actuel automatiquement (enregistré dans asset)
+                price_info = get_portfolio_prices([symbol])[symbol]
                 current_price = price_info['price']
                 
-                # Créer la nouvelle cryptomonnaie
-                new_crypto = Crypto(
-                    name=name,
-                    symbol=symbol,
-                    quantity=quantity,
-                    purchase_price=purchase_price,
-                    current_price=current_price,
-                    price_change_24h=price_info['change_24h'],
+                # Nouvelle position sur l'actif partagé du symbole
+                new_crypto = Holding(
+                    asset=get_or_create_asset(symbol, name, price_info),
+                    quantity=0,
+                    purchase_price=0,
                     last_updated=datetime.now(),
                     user_id=current_user.id
                 )
                 
                 db.session.add(new_crypto)
+                cost_basis.buy(new_crypto, quantity, purchase_price)
                 flash(f'{name} ajoutée avec succès! Prix actuel: ${current_price:.2f}', 'success')
             
+            touch_portfolio(current_user)
             db.session.commit()
             return redirect(url_for('index'))
             
@@ -403,11 +796,13 @@ def edit_crypto(crypto_id):
 @login_required
 def delete_crypto(crypto_id):
     """Supprimer une cryptomonnaie"""
-    crypto = Crypto.query.filter_by(id=crypto_id, user_id=current_user.id).first_or_404()
+    crypto = Holding.query.filter_by(id=crypto_id, user_id=current_user.id).first_or_404()
     crypto_name = crypto.name
     
     try:
+        cost_basis.close_position(crypto)
         db.session.delete(crypto)
+        touch_portfolio(current_user)
         db.session.commit()
         flash(f'{crypto_name} supprimée avec succès!', 'success')
     except Exception as e:
@@ -420,17 +815,8 @@ def delete_crypto(crypto_id):
 def refresh_prices():
     """Rafraîchir tous les prix"""
     try:
-        cryptos = Crypto.query.filter_by(user_id=current_user.id).all()
-        updated_count = 0
-        
-        for crypto in cryptos:
-            price_info = get_crypto_price_simple(crypto.symbol)
-            crypto.current_price = price_info['price']
-            crypto.price_change_24h = price_info['change_24h']
-            crypto.last_updated = datetime.now()
-            updated_count += 1
-        
-        db.session.commit()
+        # Les prix récupérés sont enregistrés une seule fois par record_prices
+        _, updated_count = get_crypto_prices(user_symbols(current_user.id), with_count=True)
         flash(f'{updated_count} prix mis à jour avec succès!', 'success')
         
     except Exception as e:
@@ -440,13 +826,17 @@ def refresh_prices():
 
 @app.route('/api/portfolio_stats')
 @login_required
+@response_cache.cached
 def api_portfolio_stats():
     """API pour les statistiques du portefeuille"""
     try:
-        cryptos = Crypto.query.filter_by(user_id=current_user.id).all()
+        currency = user_currency()
+        summary = summarize(convert_rows(
+            portfolio_rows(db, Holding, Asset, current_user.id, performers_only=True), currency.rate))
         
-        if not cryptos:
+        if not summary.holdings:
             return jsonify({
+                'currency': currency.code,
                 'total_value': 0,
                 'total_profit_loss': 0,
                 'total_invested': 0,
@@ -454,37 +844,26 @@ def api_portfolio_stats():
                 'worst_performer': None
             })
         
-        total_value = sum(c.current_value for c in cryptos)
-        total_invested = sum(c.quantity * c.purchase_price for c in cryptos)
-        total_profit_loss = total_value - total_invested
-        
-        # Trouve les meilleures et pires performances
-        performers = []
-        for crypto in cryptos:
-            if crypto.purchase_price > 0:
-                performance = crypto.profit_loss_percentage
-                performers.append((crypto, performance))
-        
-        if performers:
-            best_performer = max(performers, key=lambda x: x[1])
-            worst_performer = min(performers, key=lambda x: x[1])
-        else:
-            best_performer = worst_performer = None
+        best_performer = summary.best_performer
+        worst_performer = summary.worst_performer
         
         return jsonify({
-            'total_value': round(total_value, 2),
-            'total_profit_loss': round(total_profit_loss, 2),
-            'total_invested': round(total_invested, 2),
-            'profit_loss_percentage': round((total_profit_loss/total_invested*100) if total_invested > 0 else 0, 2),
+            'currency': currency.code,
+            'total_value': round(summary.total_value, 2),
+            'total_profit_loss': round(summary.total_profit_loss, 2),
+            'total_invested': round(summary.total_invested, 2),
+            'profit_loss_percentage': round(summary.profit_loss_percentage, 2),
+            'realized_profit_loss': round(cost_basis.realized_pnl(current_user.id) * currency.rate, 2),
+            'unrealized_profit_loss': round(summary.total_profit_loss, 2),
             'best_performer': {
-                'name': best_performer[0].name,
-                'symbol': best_performer[0].symbol,
-                'performance': round(best_performer[1], 2)
+                'name': best_performer.name,
+                'symbol': best_performer.symbol,
+                'performance': round(best_performer.profit_loss_percentage, 2)
             } if best_performer else None,
             'worst_performer': {
-                'name': worst_performer[0].name,
-                'symbol': worst_performer[0].symbol,
-                'performance': round(worst_performer[1], 2)
+                'name': worst_performer.name,
+                'symbol': worst_performer.symbol,
+                'performance': round(worst_performer.profit_loss_percentage, 2)
             } if worst_performer else None
         })
         
@@ -493,58 +872,143 @@ def api_portfolio_stats():
 
 @app.route('/api/market_data')
 def api_market_data():
-    """API pour les données du marché (top cryptos) avec rate limiting"""
+    """API pour les données du marché (top N), servies depuis l'instantané stocké"""
     try:
-        rate_limit()  # Rate limiting
-        
-        # Top cryptos populaires
-        popular_ids = ['bitcoin', 'ethereum', 'cardano', 'polkadot', 'chainlink', 
-                      'litecoin', 'ripple', 'binancecoin', 'dogecoin', 'solana']
-        
-        url = f"{COINGECKO_API}/simple/price"
-        params = {
-            'ids': ','.join(popular_ids),
-            'vs_currencies': 'usd',
-            'include_24hr_change': 'true'
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 429:
-            app.logger.warning("Rate limit hit for market data")
-            return jsonify({
-                'market_data': [
-                    {'name': 'Bitcoin', 'symbol': 'BTC', 'current_price': 45000, 'price_change_24h': 2.5},
-                    {'name': 'Ethereum', 'symbol': 'ETH', 'current_price': 2800, 'price_change_24h': 1.8}
-                ]
-            })
-            
-        response.raise_for_status()
-        data = response.json()
-        
-        market_data = []
-        for coin_id, info in data.items():
-            # Mapping inverse pour obtenir le nom
-            coin_name = coin_id.replace('-', ' ').title()
-            market_data.append({
-                'name': coin_name,
-                'symbol': coin_id.upper(),
-                'current_price': info['usd'],
-                'price_change_24h': info.get('usd_24h_change', 0),
-                'image': f"https://assets.coingecko.com/coins/images/1/large/{coin_id}.png"
-            })
-        
-        return jsonify({'market_data': market_data})
-        
+        # Sans worker, l'instantané est rafraîchi par la requête qui le trouve périmé
+        snapshot = market_data.current(refresh_if_stale=not prices_from_store())
     except Exception as e:
         app.logger.error(f"Erreur market_data: {e}")
-        # Retourne des données par défaut en cas d'erreur
-        return jsonify({
-            'market_data': [
-                {'name': 'Bitcoin', 'symbol': 'BTC', 'current_price': 45000, 'price_change_24h': 2.5},
-                {'name': 'Ethereum', 'symbol': 'ETH', 'current_price': 2800, 'price_change_24h': 1.8}
-            ]
-        })
+        snapshot = market_data.current()
+    
+    if snapshot is None:
+        return jsonify({'market_data': [], 'error': 'Données du marché indisponibles'}), 503
+    
+    response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.last_modified = snapshot.modified_at
+    response.cache_control.public = True
+    response.cache_control.max_age = max(int(market_data.refresh_interval - snapshot.age()), 0)
+    # 304 sans corps si le client a déjà cette version
+    return response.make_conditional(request)
+
+def alert_to_dict(alert):
+    return {
+        'id': alert.id,
+        'symbol': alert.symbol,
+        'kind': alert.kind,
+        'threshold': alert.threshold,
+        'reference_price': alert.reference_price,
+        'active': alert.active,
+        'created_at': alert.created_at.isoformat(),
+        'triggered_at': alert.triggered_at.isoformat() if alert.triggered_at else None,
+        'triggered_price': alert.triggered_price
+    }
+
+@app.route('/api/alerts', methods=['GET', 'POST'])
+@login_required
+def api_alerts():
+    """API des alertes de prix: liste (GET) ou création (POST {symbol, kind, threshold})"""
+    if request.method == 'GET':
+        alerts = (PriceAlert.query.filter_by(user_id=current_user.id)
+                  .order_by(PriceAlert.active.desc(), PriceAlert.id.desc()))
+        return jsonify({'alerts': [alert_to_dict(alert) for alert in alerts]})
+    
+    data = request.get_json(silent=True) or {}
+    symbol = str(data.get('symbol', '')).strip().upper()
+    kind = data.get('kind')
+    try:
+        threshold = float(data.get('threshold'))
+        validate_alert(kind, threshold)
+        if not symbol:
+            raise ValueError("Symbole requis")
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Symbole résolu en id CoinGecko: son prix sera rafraîchi pour l'évaluer
+    try:
+        coin_id = resolve_coin_id(symbol)
+    except Exception as e:
+        app.logger.error(f"Erreur recherche id pour {symbol}: {e}")
+        return jsonify({'error': f"Symbole non vérifiable pour le moment: {symbol}"}), 503
+    if not coin_id:
+        return jsonify({'error': f"Symbole inconnu: {symbol}"}), 400
+    
+    # Prix de référence: point de départ des alertes de variation
+    price = get_portfolio_prices([symbol])[symbol]['price']
+    if kind == 'move' and not price:
+        return jsonify({'error': f"Prix indisponible pour {symbol}"}), 400
+    
+    alert = PriceAlert(user_id=current_user.id, symbol=symbol, kind=kind,
+                       threshold=threshold, reference_price=price or None)
+    db.session.add(alert)
+    db.session.commit()
+    return jsonify(alert_to_dict(alert)), 201
+
+@app.route('/api/alerts/<int:alert_id>', methods=['DELETE'])
+@login_required
+def api_delete_alert(alert_id):
+    """API de suppression d'une alerte"""
+    alert = PriceAlert.query.filter_by(id=alert_id, user_id=current_user.id).first()
+    if alert is None:
+        return jsonify({'error': 'Alerte introuvable'}), 404
+    db.session.delete(alert)
+    db.session.commit()
+    return '', 204
+
+@app.route('/api/alerts/notifications')
+@login_required
+def api_alert_notifications():
+    """API des alertes déclenchées non lues (marquées comme lues)"""
+    notifications = alert_notifications.pop(current_user.id)
+    return jsonify({'notifications': [{
+        'alert_id': notification.alert_id,
+        'symbol': notification.symbol,
+        'kind': notification.kind,
+        'threshold': notification.threshold,
+        'price': notification.price,
+        'created_at': notification.created_at.isoformat()
+    } for notification in notifications]})
+
+@app.route('/api/portfolio_import', methods=['POST'])
+@login_required
+def api_portfolio_import():
+    """API d'import en masse (fichier CSV ou JSON d'un exchange, champ 'file')"""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'Aucun fichier reçu'}), 400
+    
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    file_format = request.form.get('format') or detect_format(upload.filename)
+    try:
+        result = portfolio_importer.import_file(current_user.id, stream, file_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    touch_portfolio(current_user)
+    db.session.commit()
+    return jsonify(result._asdict())
+
+@app.route('/api/portfolio_export')
+@login_required
+def api_portfolio_export():
+    """API d'export des positions (?format=csv|json), générée au fil de l'eau"""
+    file_format = request.args.get('format', 'csv')
+    if file_format not in FORMATS:
+        return jsonify({'error': f"Format inconnu: {file_format}"}), 400
+    
+    filename = f"portefeuille-{datetime.now().strftime('%Y-%m-%d')}.{file_format}"
+    rows = export_rows(db, Holding, Asset, current_user.id)
+    mimetype = 'application/json' if file_format == 'json' else 'text/csv'
+    return Response(stream_with_context(generate_export(rows, file_format)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Mesures de l'application au format Prometheus (par processus)"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Non autorisé\n', status=401)
+    return metrics.response()
 
 @app.route('/settings')
 @login_required
@@ -552,11 +1016,29 @@ def settings():
     """Page des paramètres"""
     return render_template('settings.html')
 
+@app.route('/api/settings/currency', methods=['POST'])
+@login_required
+def api_settings_currency():
+    """API de changement de la devise d'affichage ({currency: 'EUR'})"""
+    code = str((request.get_json(silent=True) or {}).get('currency', '')).upper()
+    if code not in CURRENCIES:
+        return jsonify({'error': f"Devise non supportée: {code}"}), 400
+    
+    current_user.base_currency = code
+    db.session.commit()
+    currency = fx_rates.currency(code)
+    if currency.code != code:
+        return jsonify({'currency': code, 'warning': 'Taux de change indisponible, montants affichés en '
+                                                      f'{currency.code}'})
+    return jsonify({'currency': code, 'rate': currency.rate})
+
 @app.route('/analytics')
 @login_required
+@response_cache.cached
 def portfolio_analytics():
     """Page d'analytics du portefeuille"""
-    cryptos = Crypto.query.filter_by(user_id=current_user.id).all()
+    currency = user_currency()
+    cryptos = convert_rows(portfolio_rows(db, Holding, Asset, current_user.id), currency.rate)
     
     if not cryptos:
         return render_template('analytics.html',
@@ -566,30 +1048,22 @@ def portfolio_analytics():
                              best_performer=None,
                              worst_performer=None)
     
-    total_portfolio_value = sum(c.current_value for c in cryptos)
-    total_invested = sum(c.quantity * c.purchase_price for c in cryptos)
-    total_profit_loss = total_portfolio_value - total_invested
-    
-    # Trouve les meilleures et pires performances
-    performers = []
-    for crypto in cryptos:
-        if crypto.purchase_price > 0:
-            performance = crypto.profit_loss_percentage
-            performers.append((crypto, performance))
-    
-    best_performer = max(performers, key=lambda x: x[1]) if performers else None
-    worst_performer = min(performers, key=lambda x: x[1]) if performers else None
+    # Totaux et meilleures/pires performances calculés par la base
+    summary = summarize(cryptos)
+    best_performer = summary.best_performer
+    worst_performer = summary.worst_performer
     
     return render_template('analytics.html',
                          has_data=True,
                          cryptos=cryptos,
-                         total_portfolio_value=total_portfolio_value,
-                         total_profit_loss=total_profit_loss,
-                         total_invested=total_invested,
-                         best_performer=best_performer[0] if best_performer else None,
-                         worst_performer=worst_performer[0] if worst_performer else None,
-                         best_performance=best_performer[1] if best_performer else 0,
-                         worst_performance=worst_performer[1] if worst_performer else 0)
+                         total_portfolio_value=summary.total_value,
+                         total_profit_loss=summary.total_profit_loss,
+                         total_invested=summary.total_invested,
+                         best_performer=best_performer,
+                         worst_performer=worst_performer,
+                         best_performance=best_performer.profit_loss_percentage if best_performer else 0,
+                         worst_performance=worst_performer.profit_loss_percentage if worst_performer else 0,
+                         currency=currency)
 
 @app.route('/market')
 @login_required
@@ -599,42 +1073,38 @@ def market_overview():
 
 @app.route('/withdraw', methods=['GET', 'POST'])
 @login_required
+@response_cache.cached
 def withdraw_crypto():
     """Page de retrait/vente de cryptomonnaies"""
-    cryptos = Crypto.query.filter_by(user_id=current_user.id).all()
-    
-    # Calculer les statistiques du portefeuille
-    total_portfolio_value = sum(c.current_value for c in cryptos) if cryptos else 0
-    total_invested = sum(c.quantity * c.purchase_price for c in cryptos) if cryptos else 0
-    total_profit_loss = total_portfolio_value - total_invested if cryptos else 0
-    total_profit_loss_percentage = (total_profit_loss/total_invested*100) if total_invested > 0 else 0
-    
     if request.method == 'POST':
         try:
             crypto_id = request.form['crypto_id']
             quantity_to_withdraw = float(request.form['quantity'])
             current_price = float(request.form['current_price'])
             
-            crypto = Crypto.query.filter_by(id=crypto_id, user_id=current_user.id).first_or_404()
-            
-            if quantity_to_withdraw > crypto.quantity:
-                flash('Quantité insuffisante dans le portefeuille', 'error')
-                return redirect(url_for('withdraw_crypto'))
+            crypto = Holding.query.filter_by(id=crypto_id, user_id=current_user.id).first_or_404()
             
             # Calculer la valeur du retrait
             withdraw_value = quantity_to_withdraw * current_price
             
-            # Mettre à jour la quantité
-            crypto.quantity -= quantity_to_withdraw
+            # Mettre à jour la quantité et le P&L réalisé
+            try:
+                sale = cost_basis.sell(crypto, quantity_to_withdraw, current_price)
+            except InsufficientQuantityError:
+                flash('Quantité insuffisante dans le portefeuille', 'error')
+                return redirect(url_for('withdraw_crypto'))
             crypto.last_updated = datetime.now()
             
             # Si quantité devient 0, supprimer la crypto
             if crypto.quantity <= 0.001:
+                cost_basis.close_position(crypto)
                 db.session.delete(crypto)
                 flash(f'{crypto.name} retirée complètement du portefeuille', 'success')
             else:
-                flash(f'Retrait de {quantity_to_withdraw} {crypto.symbol} effectué. Valeur: ${withdraw_value:.2f}', 'success')
+                flash(f'Retrait de {quantity_to_withdraw} {crypto.symbol} effectué. Valeur: ${withdraw_value:.2f} '
+                      f'(P&L réalisé: ${sale.realized_pnl:.2f})', 'success')
             
+            touch_portfolio(current_user)
             db.session.commit()
             return redirect(url_for('index'))
             
@@ -642,11 +1112,115 @@ def withdraw_crypto():
             flash(f'Erreur lors du retrait: {str(e)}', 'error')
             return redirect(url_for('withdraw_crypto'))
     
+    # Calculer les statistiques du portefeuille (agrégées par la base)
+    cryptos = portfolio_rows(db, Holding, Asset, current_user.id)
+    summary = summarize(cryptos)
+    
+    # Prix de vente saisi et enregistré dans la devise de cotation
     return render_template('withdraw.html',
+                         currency=fx_rates.currency(QUOTE_CURRENCY),
                          cryptos=cryptos,
-                         total_value=total_portfolio_value,
-                         total_profit_loss=total_profit_loss,
-                         total_profit_loss_percentage=total_profit_loss_percentage)
+                         total_value=summary.total_value,
+                         total_profit_loss=summary.total_profit_loss,
+                         total_profit_loss_percentage=summary.profit_loss_percentage)
+
+# Import en masse: symboles résolus dans l'annuaire, prix récupérés en un appel
+portfolio_importer = PortfolioImporter(cost_basis, coin_directory, fetch_prices=get_crypto_prices)
+
+# Instantané du top N du marché, rafraîchi par le worker
+market_data = MarketData(db, MarketSnapshot, coingecko,
+                         top_n=app.config['MARKET_TOP_N'],
+                         refresh_interval=app.config['MARKET_REFRESH'])
+
+def stream_market():
+    """(ETag, entrées) de l'instantané du marché diffusé par les flux SSE, ou None"""
+    try:
+        # Sans worker, l'éditeur rafraîchit l'instantané périmé à la place des pages
+        snapshot = market_data.current(refresh_if_stale=not prices_from_store())
+    except Exception as e:
+        app.logger.error(f"Erreur market_data: {e}")
+        snapshot = market_data.current()
+    if snapshot is None:
+        return None
+    return snapshot.etag, json.loads(snapshot.body)['market_data']
+
+# Éditeur unique des flux SSE: une lecture groupée des prix par cycle, plus
+# l'instantané du marché quand il change
+price_publisher = PricePublisher(app, get_portfolio_prices,
+                                 interval=app.config['PRICE_STREAM_INTERVAL'],
+                                 fetch_market=stream_market)
+
+# Worker d'ingestion des prix intégré à l'application
+price_worker = PriceIngestionWorker(app, db, Holding, Asset, get_crypto_prices,
+                                    interval=app.config['PRICE_WORKER_INTERVAL'],
+                                    on_update=price_publisher.publish,
+                                    extra_symbols=alert_engine.watched_symbols)
+price_worker.add_task('market_snapshot', market_data.refresh, app.config['MARKET_REFRESH'])
+def refresh_fx_rates():
+    """Rafraîchit les taux de change (les montants en cache sont convertis avec les anciens)"""
+    rates = fx_rates.refresh()
+    price_epoch.bump()
+    return rates
+
+price_worker.add_task('fx_rates', refresh_fx_rates, app.config['FX_RATES_TTL'])
+# Rangs tirés de l'instantané du marché (absents de /coins/list)
+price_worker.add_task('coin_directory', lambda: coin_directory.refresh(coingecko, market_data.entries()),
+                      app.config['COIN_DIRECTORY_REFRESH'])
+
+def compact_price_history():
+    """Compacte en moyennes horaires les échantillons bruts trop anciens"""
+    before = int(datetime.now().timestamp()) - app.config['PRICE_HISTORY_RAW_DAYS'] * 86400
+    return price_history.compact(before, bucket=INTERVALS['1h'], since=before - 3 * 86400)
+
+price_worker.add_task('price_history_compaction', compact_price_history, 24 * 3600)
+
+def start_background():
+    """Charge l'index des alertes et démarre les threads de fond du processus courant
+
+    À appeler dans chaque processus qui sert des requêtes, après le fork
+    des workers gunicorn (les threads ne survivent pas au fork).
+    """
+    # Index des alertes construit au démarrage, pas pendant la première requête
+    try:
+        with app.app_context():
+            alert_engine.index.refresh()
+    except Exception as e:
+        app.logger.error(f"Erreur chargement des alertes: {e}")
+    if app.config['PRICE_INGESTION_MODE'] == 'thread':
+        price_worker.start()
+
+def preload_dependencies():
+    """Importe les dépendances chargées à la demande (numpy, requests)
+
+    Appelée avant le fork avec gunicorn --preload: les workers partagent
+    alors ces modules en copie sur écriture au lieu de les importer chacun.
+    """
+    import numpy
+    import requests
+    return numpy, requests
+
+def create_app(config=None):
+    """Point d'entrée de l'application: gunicorn 'app:create_app()'
+
+    config: valeurs qui remplacent l'environnement, limitées aux réglages
+    relus pendant l'exécution (RUNTIME_CONFIG) et aux réglages de Flask
+    (SECRET_KEY, TESTING...). Un réglage lu à l'import (FIXED_CONFIG: base,
+    caches, clients, limites de débit...) lève ValueError: le définir dans
+    l'environnement. Sans AUTO_MIGRATE, create_app n'envoie aucune requête
+    à la base.
+    """
+    fixed = sorted(FIXED_CONFIG.intersection(config or ()))
+    if fixed:
+        raise ValueError(f"Réglages fixés à l'import, à définir dans l'environnement: {', '.join(fixed)}")
+    if config:
+        app.config.update(config)
+    if app.config['AUTO_MIGRATE']:
+        migrate_database()
+    return app
 
 if __name__ == '__main__':
-    app.run(host='127.0.0.1', port=8080, debug=True, use_reloader=False)
\ No newline at end of file
+    # Serveur de développement; en production: gunicorn 'app:create_app()' -c gunicorn.conf.py
+    migrate_database()
+    start_background()
+    app.run(host='127.0.0.1', port=8080, debug=os.environ.get('FLASK_DEBUG', '1') == '1',
+            use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Cache à durée de vie pour l'application Portefeuille Crypto
+
+Deux backends interchangeables:
+- LRUCache: cache en mémoire, propre à un processus
+- SQLiteCache: cache partagé entre tous les workers via un fichier SQLite
+
+Chaque entrée a une durée de fraîcheur (ttl) puis une fenêtre pendant
+laquelle elle reste servie comme périmée (stale_ttl) le temps qu'un seul
+appelant la rafraîchisse en arrière-plan (stale-while-revalidate).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+
+class LRUCache:
+    """Cache en mémoire borné, éviction du moins récemment utilisé"""
+
+    def __init__(self, max_size=1024, ttl=300, stale_ttl=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # clé -> (valeur, expire_a, perime_a)
+        self._refreshing = {}  # clé -> fin du bail de rafraîchissement
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retourne (valeur, FRESH|STALE) ou None si absente ou trop ancienne"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, stale_until = entry
+            if now >= stale_until:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value, FRESH if now < expires_at else STALE
+
+    def set(self, key, value, ttl=None):
+        """Enregistre une valeur avec un ttl propre à l'entrée"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (value, now + ttl, now + ttl + self.stale_ttl)
+            self._entries.move_to_end(key)
+            self._refreshing.pop(key, None)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def claim_refresh(self, key, lease=30):
+        """Réserve le rafraîchissement d'une entrée, True pour un seul appelant"""
+        now = time.time()
+        with self._lock:
+            if self._refreshing.get(key, 0) > now:
+                return False
+            self._refreshing[key] = now + lease
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._refreshing.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._refreshing.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Cache partagé entre processus, stocké dans un fichier SQLite
+
+    Les valeurs sont sérialisées en JSON. Quand la taille maximale est
+    dépassée, les entrées qui expirent le plus tôt sont supprimées.
+    """
+
+    def __init__(self, path, max_size=4096, ttl=300, stale_ttl=0, table='cache'):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.table = table
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.table} (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            stale_until REAL NOT NULL,
+            refreshing_until REAL NOT NULL DEFAULT 0
+        )''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.table}_stale_until '
+                     f'ON {self.table} (stale_until)')
+
+    def _connect(self):
+        # Une connexion par thread, jamais héritée d'un processus parent (fork gunicorn)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Retourne (valeur, FRESH|STALE) ou None si absente ou trop ancienne"""
+        now = time.time()
+        row = self._connect().execute(
+            f'SELECT value, expires_at, stale_until FROM {self.table} WHERE key = ?',
+            (key,)).fetchone()
+        if row is None or now >= row[2]:
+            return None
+        return json.loads(row[0]), FRESH if now < row[1] else STALE
+
+    def set(self, key, value, ttl=None):
+        """Enregistre une valeur avec un ttl propre à l'entrée"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        conn = self._connect()
+        conn.execute(
+            f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, stale_until) '
+            f'VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now + ttl, now + ttl + self.stale_ttl))
+        self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute(f'DELETE FROM {self.table} WHERE stale_until <= ?', (now,))
+        excess = conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0] - self.max_size
+        if excess > 0:
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f'SELECT key FROM {self.table} ORDER BY stale_until LIMIT ?)', (excess,))
+
+    def claim_refresh(self, key, lease=30):
+        """Réserve le rafraîchissement d'une entrée, True pour un seul processus"""
+        now = time.time()
+        cursor = self._connect().execute(
+            f'UPDATE {self.table} SET refreshing_until = ? '
+            f'WHERE key = ? AND refreshing_until <= ?', (now + lease, key, now))
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self._connect().execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute(f'DELETE FROM {self.table}')
+
+    def __len__(self):
+        return self._connect().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+
+def create_cache(backend='memory', path=None, max_size=1024, ttl=300, stale_ttl=0, table='cache'):
+    """Construit le backend de cache demandé ('memory' ou 'sqlite')"""
+    if backend == 'memory':
+        return LRUCache(max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("Le backend 'sqlite' nécessite un chemin de fichier")
+        return SQLiteCache(path, max_size=max_size, ttl=ttl, stale_ttl=stale_ttl, table=table)
+    raise ValueError(f"Backend de cache inconnu: {backend}")
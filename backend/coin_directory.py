@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Annuaire local des coins pour l'application Portefeuille Crypto
+
+Les coins (id, symbole, nom, vignette) sont stockés dans la table coin,
+chargés en masse depuis un export /coins/list ou /coins/markets, puis servis
+depuis un index en mémoire:
+- index de préfixes (liste triée + bisect) sur les symboles et les noms
+- index de trigrammes pour les recherches approximatives
+
+La recherche et la résolution symbole -> id ne font alors aucun appel réseau.
+/coins/list ne donne pas de rang: les rangs viennent de l'instantané du
+marché (/coins/markets). Un symbole porté par plusieurs coins dont le
+meilleur n'est pas classé n'est pas résolu localement mais via /search.
+"""
+
+import sys
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from datetime import datetime
+
+# Taille des paquets pour l'insertion en masse
+BULK_CHUNK_SIZE = 2000
+# Nombre maximum de candidats examinés pour un préfixe
+MAX_CANDIDATES = 500
+
+
+def trigrams(text):
+    """Ensemble des trigrammes d'un texte (avec bordures)"""
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def normalize_coin(raw):
+    """Convertit une entrée d'export CoinGecko en ligne de la table coin"""
+    return {
+        'id': raw['id'],
+        'symbol': (raw.get('symbol') or '').upper(),
+        'name': raw.get('name') or raw['id'],
+        'thumb': raw.get('thumb') or raw.get('image') or None,
+        'market_cap_rank': raw.get('market_cap_rank')
+    }
+
+
+class CoinIndex:
+    """Index en mémoire des coins: préfixes et trigrammes"""
+
+    def __init__(self, coins):
+        self.coins = list(coins)
+        self.by_symbol = {}
+        keys = []
+        self.trigram_index = {}
+
+        for position, coin in enumerate(self.coins):
+            symbol = coin['symbol'].lower()
+            name = coin['name'].lower()
+            self.by_symbol.setdefault(coin['symbol'], []).append(position)
+            keys.append((symbol, position))
+            if name != symbol:
+                keys.append((name, position))
+            for gram in trigrams(symbol) | trigrams(name):
+                self.trigram_index.setdefault(gram, set()).add(position)
+
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.positions = [position for _, position in keys]
+
+        # Pour chaque symbole, le coin le mieux classé
+        for symbol, positions in self.by_symbol.items():
+            positions.sort(key=self._rank_key)
+
+    def __len__(self):
+        return len(self.coins)
+
+    def _rank_key(self, position):
+        coin = self.coins[position]
+        rank = coin.get('market_cap_rank')
+        return (rank is None, rank or 0, len(coin['name']))
+
+    def __contains__(self, symbol):
+        return symbol.upper() in self.by_symbol
+
+    def resolve(self, symbol):
+        """ID du coin le mieux classé portant ce symbole, ou None (inconnu ou ambigu)"""
+        positions = self.by_symbol.get(symbol.upper())
+        if not positions:
+            return None
+        best = self.coins[positions[0]]
+        # Plusieurs coins sans rang (copies d'un ticker connu): pas de choix arbitraire
+        if len(positions) > 1 and best.get('market_cap_rank') is None:
+            return None
+        return best['id']
+
+    def _prefix_matches(self, query):
+        matches = []
+        start = bisect_left(self.keys, query)
+        for i in range(start, len(self.keys)):
+            if not self.keys[i].startswith(query) or len(matches) >= MAX_CANDIDATES:
+                break
+            matches.append(self.positions[i])
+        return matches
+
+    def _trigram_matches(self, query):
+        scores = {}
+        for gram in trigrams(query):
+            for position in self.trigram_index.get(gram, ()):
+                scores[position] = scores.get(position, 0) + 1
+        if not scores:
+            return []
+        threshold = max(2, len(trigrams(query)) // 2)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:MAX_CANDIDATES]
+        return [position for position, score in best if score >= threshold]
+
+    def search(self, query, limit=10):
+        """Recherche par préfixe de symbole/nom, puis approximative par trigrammes"""
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        candidates = self._prefix_matches(query)
+        if len(candidates) < limit and len(query) >= 3:
+            seen = set(candidates)
+            candidates += [p for p in self._trigram_matches(query) if p not in seen]
+
+        def relevance(position):
+            coin = self.coins[position]
+            symbol = coin['symbol'].lower()
+            name = coin['name'].lower()
+            if symbol == query or name == query:
+                exactness = 0
+            elif symbol.startswith(query) or name.startswith(query):
+                exactness = 1
+            else:
+                exactness = 2
+            return (exactness,) + self._rank_key(position)
+
+        results = []
+        for position in sorted(set(candidates), key=relevance)[:limit]:
+            coin = self.coins[position]
+            results.append({
+                'id': coin['id'],
+                'name': coin['name'],
+                'symbol': coin['symbol'],
+                'image': coin.get('thumb') or ''
+            })
+        return results
+
+
+class CoinDirectory:
+    """Annuaire des coins stocké en base et servi depuis un CoinIndex"""
+
+    def __init__(self, db, Coin, max_age=3600):
+        self.db = db
+        self.Coin = Coin
+        self.max_age = max_age
+        self._index = None
+        self._loaded_at = 0
+        self._resolved = {}  # symboles résolus hors annuaire (via /search)
+        self._lock = threading.Lock()
+
+    def index(self):
+        """Index courant, rechargé depuis la base s'il est trop ancien"""
+        if self._index is None or time.time() - self._loaded_at > self.max_age:
+            with self._lock:
+                if self._index is None or time.time() - self._loaded_at > self.max_age:
+                    self.reload()
+        return self._index
+
+    def reload(self):
+        """Reconstruit l'index en mémoire à partir de la table coin"""
+        Coin = self.Coin
+        rows = self.db.session.query(Coin.id, Coin.symbol, Coin.name, Coin.thumb,
+                                     Coin.market_cap_rank).all()
+        self._index = CoinIndex({
+            'id': row.id, 'symbol': row.symbol, 'name': row.name,
+            'thumb': row.thumb, 'market_cap_rank': row.market_cap_rank
+        } for row in rows)
+        self._loaded_at = time.time()
+        return len(self._index)
+
+    def search(self, query, limit=10):
+        return self.index().search(query, limit)
+
+    def resolve(self, symbol):
+        """Résout un symbole en ID CoinGecko sans appel réseau, ou None
+
+        None pour un symbole inconnu ou ambigu: l'appelant se rabat sur /search.
+        """
+        symbol = symbol.upper()
+        return self._resolved.get(symbol) or self.index().resolve(symbol)
+
+    def knows(self, symbol):
+        """Indique si au moins un coin de l'annuaire porte ce symbole"""
+        return symbol.upper() in self._resolved or symbol in self.index()
+
+    def remember(self, symbol, coin_id):
+        """Retient un ID résolu par l'API pour ne plus le rechercher"""
+        self._resolved[symbol.upper()] = coin_id
+
+    def load(self, coins):
+        """Remplace le contenu de l'annuaire par une liste d'entrées CoinGecko
+
+        Les vignettes et rangs déjà connus sont conservés quand l'export
+        n'en fournit pas (cas de /coins/list).
+        """
+        Coin = self.Coin
+        known = {row.id: (row.thumb, row.market_cap_rank)
+                 for row in self.db.session.query(Coin.id, Coin.thumb, Coin.market_cap_rank)}
+        now = datetime.utcnow()
+
+        rows = {}
+        for raw in coins:
+            if not raw.get('id'):
+                continue
+            row = normalize_coin(raw)
+            thumb, rank = known.get(row['id'], (None, None))
+            row['thumb'] = row['thumb'] or thumb
+            row['market_cap_rank'] = row['market_cap_rank'] or rank
+            row['updated_at'] = now
+            rows[row['id']] = row
+
+        self.db.session.query(Coin).delete(synchronize_session=False)
+        mappings = list(rows.values())
+        for start in range(0, len(mappings), BULK_CHUNK_SIZE):
+            self.db.session.bulk_insert_mappings(Coin, mappings[start:start + BULK_CHUNK_SIZE])
+        self.db.session.commit()
+        self.reload()
+        return len(mappings)
+
+    def load_file(self, path):
+        """Charge un export JSON (liste de coins) depuis un fichier"""
+        with open(path, encoding='utf-8') as f:
+            return self.load(json.load(f))
+
+    def refresh(self, client, ranked=()):
+        """Recharge l'annuaire depuis /coins/list
+
+        ranked: entrées de l'instantané du marché (id, rang, image) qui
+        apportent les rangs absents de /coins/list.
+        """
+        coins = client.get('/coins/list')
+        ranked = {entry['id']: entry for entry in ranked}
+        for coin in coins:
+            entry = ranked.get(coin.get('id'))
+            if entry:
+                coin['market_cap_rank'] = entry.get('rank')
+                coin.setdefault('image', entry.get('image'))
+        return self.load(coins)
+
+
+if __name__ == '__main__':
+    # Ajouter le repertoire courant au path pour les imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from app import app, coin_directory, coingecko, market_data
+
+    with app.app_context():
+        if len(sys.argv) > 2 and sys.argv[1].lower() == 'load':
+            print(f"{coin_directory.load_file(sys.argv[2])} coins charges")
+        elif len(sys.argv) > 1 and sys.argv[1].lower() == 'refresh':
+            print(f"{coin_directory.refresh(coingecko, market_data.entries())} coins charges")
+        elif len(sys.argv) > 2 and sys.argv[1].lower() == 'search':
+            for coin in coin_directory.search(' '.join(sys.argv[2:])):
+                print(f"   - {coin['symbol']:<8} {coin['name']} ({coin['id']})")
+        else:
+            print("Usage:")
+            print("  python coin_directory.py load <fichier.json>  - Charger un export de coins")
+            print("  python coin_directory.py refresh              - Recharger depuis CoinGecko")
+            print("  python coin_directory.py search <texte>       - Rechercher un coin")
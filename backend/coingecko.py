@@ -0,0 +1,310 @@
+"""
+Client CoinGecko pour l'application Portefeuille Crypto
+
+- connexions HTTP persistantes et mutualisées (keep-alive)
+- timeouts configurables, nouvelles tentatives avec backoff aléatoire
+  sur les réponses 429/5xx et les erreurs réseau
+- coalescence (single-flight): des appels simultanés pour la même
+  requête partagent un seul appel amont
+- variante asyncio (nécessite aiohttp)
+
+requests et aiohttp sont importés à la première utilisation: importer ce
+module (et donc l'application) ne les charge pas.
+
+L'URL de base est configurable, ce qui permet de tester le client contre
+un serveur HTTP local.
+"""
+
+import time
+import random
+import asyncio
+import threading
+
+DEFAULT_BASE_URL = "https://api.coingecko.com/api/v3"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CoinGeckoError(Exception):
+    """Erreur lors d'un appel à l'API CoinGecko"""
+
+
+class RateLimitedError(CoinGeckoError):
+    """Quota d'appels épuisé (429 amont ou budget local)"""
+
+
+def endpoint_name(path):
+    """'/simple/price' -> 'simple/price', utilisé comme clé de budget"""
+    return path.strip('/')
+
+
+def request_key(path, params):
+    """Clé de coalescence d'une requête: chemin et paramètres triés"""
+    return (path, tuple(sorted((params or {}).items())))
+
+
+def backoff_delay(attempt, base, maximum, retry_after=None):
+    """Délai avant la tentative suivante (backoff exponentiel, jitter complet)"""
+    if retry_after:
+        try:
+            return min(float(retry_after), maximum)
+        except ValueError:
+            pass
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def simple_price_params(ids, vs_currencies, include_24hr_change):
+    return {
+        'ids': ','.join(sorted(ids)),
+        'vs_currencies': vs_currencies,
+        'include_24hr_change': 'true' if include_24hr_change else 'false'
+    }
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Fait partager un seul appel aux appelants simultanés d'une même clé"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class CoinGeckoClient:
+    """Client synchrone avec pool de connexions persistantes"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, connect_timeout=3.05, read_timeout=10,
+                 retries=3, backoff=0.5, max_backoff=8, pool_size=10,
+                 rate_limiter=None, max_wait=None, api_key=None, metrics=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter
+        self.max_wait = max_wait
+        self.metrics = metrics  # observe_upstream(endpoint, statut, durée) après chaque tentative
+        self.single_flight = SingleFlight()
+        self.pool_size = pool_size
+        self.api_key = api_key
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Session HTTP persistante, créée au premier appel"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers['Accept'] = 'application/json'
+                    if self.api_key:
+                        session.headers['x-cg-demo-api-key'] = self.api_key
+                    self._session = session
+        return self._session
+
+    def get(self, path, params=None):
+        """GET JSON sur l'API, coalescé avec les appels identiques en cours"""
+        return self.single_flight.do(request_key(path, params),
+                                     lambda: self._request(path, params))
+
+    def _request(self, path, params):
+        import requests
+
+        endpoint = endpoint_name(path)
+        url = f"{self.base_url}/{endpoint}"
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            if self.rate_limiter and not self.rate_limiter.acquire(endpoint, timeout=self.max_wait):
+                raise RateLimitedError(f"Budget d'appels épuisé pour {endpoint}")
+
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._observe(endpoint, 'error', started)
+                if last_attempt:
+                    raise CoinGeckoError(f"Erreur réseau pour {endpoint}: {e}") from e
+                time.sleep(backoff_delay(attempt, self.backoff, self.max_backoff))
+                continue
+            self._observe(endpoint, response.status_code, started)
+
+            if response.status_code in RETRY_STATUSES:
+                if last_attempt:
+                    if response.status_code == 429:
+                        raise RateLimitedError(f"Rate limit hit for {endpoint}")
+                    raise CoinGeckoError(f"Erreur {response.status_code} pour {endpoint}")
+                time.sleep(backoff_delay(attempt, self.backoff, self.max_backoff,
+                                         response.headers.get('Retry-After')))
+                continue
+
+            try:
+                response.raise_for_status()
+                return response.json()
+            except (requests.RequestException, ValueError) as e:
+                raise CoinGeckoError(f"Réponse invalide pour {endpoint}: {e}") from e
+
+    def _observe(self, endpoint, status, started):
+        if self.metrics is not None:
+            self.metrics.observe_upstream(endpoint, status, time.perf_counter() - started)
+
+    def simple_price(self, ids, vs_currencies='usd', include_24hr_change=True):
+        """Prix de plusieurs coins en un appel /simple/price"""
+        return self.get('/simple/price', simple_price_params(ids, vs_currencies, include_24hr_change))
+
+    def search(self, query):
+        """Recherche de coins via /search"""
+        return self.get('/search', {'query': query})
+
+    def exchange_rates(self):
+        """Valeur d'un BTC dans chaque devise via /exchange_rates"""
+        return self.get('/exchange_rates')
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class AsyncCoinGeckoClient:
+    """Client asyncio (aiohttp) avec pool de connexions et coalescence"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, connect_timeout=3.05, read_timeout=10,
+                 retries=3, backoff=0.5, max_backoff=8, pool_size=100,
+                 rate_limiter=None, max_wait=None, api_key=None, metrics=None):
+        try:
+            import aiohttp
+        except ImportError:  # Dépendance optionnelle, seulement pour le client async
+            raise RuntimeError("Le client async nécessite le paquet aiohttp")
+        self.base_url = base_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self.headers = {'Accept': 'application/json'}
+        if api_key:
+            self.headers['x-cg-demo-api-key'] = api_key
+        self._session = None
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def _get_session(self):
+        # La session est liée à la boucle d'événements: créée au premier appel
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                  headers=self.headers)
+        return self._session
+
+    async def get(self, path, params=None):
+        """GET JSON sur l'API, coalescé avec les appels identiques en cours"""
+        key = request_key(path, params)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._request(path, params))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _request(self, path, params):
+        import aiohttp
+
+        endpoint = endpoint_name(path)
+        url = f"{self.base_url}/{endpoint}"
+        session = await self._get_session()
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            if self.rate_limiter and not await self.rate_limiter.acquire_async(
+                    endpoint, timeout=self.max_wait):
+                raise RateLimitedError(f"Budget d'appels épuisé pour {endpoint}")
+
+            started = time.perf_counter()
+            try:
+                async with session.get(url, params=params) as response:
+                    self._observe(endpoint, response.status, started)
+                    if response.status in RETRY_STATUSES:
+                        if last_attempt:
+                            if response.status == 429:
+                                raise RateLimitedError(f"Rate limit hit for {endpoint}")
+                            raise CoinGeckoError(f"Erreur {response.status} pour {endpoint}")
+                        await asyncio.sleep(backoff_delay(attempt, self.backoff, self.max_backoff,
+                                                          response.headers.get('Retry-After')))
+                        continue
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._observe(endpoint, 'error', started)
+                if last_attempt:
+                    raise CoinGeckoError(f"Erreur réseau pour {endpoint}: {e}") from e
+                await asyncio.sleep(backoff_delay(attempt, self.backoff, self.max_backoff))
+            except (aiohttp.ClientError, ValueError) as e:
+                raise CoinGeckoError(f"Réponse invalide pour {endpoint}: {e}") from e
+
+    def _observe(self, endpoint, status, started):
+        if self.metrics is not None:
+            self.metrics.observe_upstream(endpoint, status, time.perf_counter() - started)
+
+    async def simple_price(self, ids, vs_currencies='usd', include_24hr_change=True):
+        """Prix de plusieurs coins en un appel /simple/price"""
+        return await self.get('/simple/price',
+                              simple_price_params(ids, vs_currencies, include_24hr_change))
+
+    async def search(self, query):
+        """Recherche de coins via /search"""
+        return await self.get('/search', {'query': query})
+
+    async def exchange_rates(self):
+        """Valeur d'un BTC dans chaque devise via /exchange_rates"""
+        return await self.get('/exchange_rates')
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Moteur de prix de revient pour l'application Portefeuille Crypto
+
+Chaque achat crée un lot dans la table crypto_transaction, chaque vente
+consomme des lots selon la méthode de la position (FIFO, LIFO ou coût
+moyen pondéré). Les agrégats de la position (quantité, coût moyen restant,
+P&L réalisé) sont mis à jour de façon incrémentale à chaque opération:
+leur lecture ne rejoue jamais l'historique.
+"""
+
+import sys
+import os
+from datetime import datetime
+
+from sqlalchemy import select, func, literal
+
+COST_METHODS = ('average', 'fifo', 'lifo')
+# En dessous de ce seuil une quantité est considérée comme nulle
+EPSILON = 1e-9
+
+
+class InsufficientQuantityError(ValueError):
+    """Vente supérieure à la quantité détenue"""
+
+
+class CostBasisEngine:
+    """Enregistre les achats/ventes et maintient les agrégats des positions"""
+
+    def __init__(self, db, Holding, Asset, Transaction, default_method='average'):
+        if default_method not in COST_METHODS:
+            raise ValueError(f"Méthode de prix de revient inconnue: {default_method}")
+        self.db = db
+        self.Holding = Holding
+        self.Asset = Asset
+        self.Transaction = Transaction
+        self.default_method = default_method
+
+    def buy(self, holding, quantity, price, when=None):
+        """Ajoute un lot d'achat et met à jour le coût moyen de la position"""
+        if quantity <= 0:
+            raise ValueError("La quantité achetée doit être positive")
+        if not holding.cost_method:
+            holding.cost_method = self.default_method
+        if holding.id is None:
+            self.db.session.flush()
+
+        current_quantity = holding.quantity or 0
+        cost = (holding.purchase_price or 0) * current_quantity + quantity * price
+        holding.quantity = current_quantity + quantity
+        holding.purchase_price = cost / holding.quantity
+        holding.realized_pnl = holding.realized_pnl or 0
+
+        transaction = self.Transaction(
+            user_id=holding.user_id,
+            holding_id=holding.id,
+            symbol=holding.symbol,
+            side='buy',
+            quantity=quantity,
+            price=price,
+            remaining_quantity=quantity,
+            created_at=when or datetime.utcnow()
+        )
+        self.db.session.add(transaction)
+        return transaction
+
+    def _open_lots(self, holding, method):
+        Transaction = self.Transaction
+        order = Transaction.id.desc() if method == 'lifo' else Transaction.id.asc()
+        return (Transaction.query
+                .filter(Transaction.holding_id == holding.id,
+                        Transaction.side == 'buy',
+                        Transaction.remaining_quantity > EPSILON)
+                .order_by(order))
+
+    def _unlotted(self, holding, average_cost):
+        """Quantité sans lot (antérieure au registre) et son prix de revient unitaire"""
+        Transaction = self.Transaction
+        open_quantity, open_cost = (self.db.session.query(
+            func.coalesce(func.sum(Transaction.remaining_quantity), 0),
+            func.coalesce(func.sum(Transaction.remaining_quantity * Transaction.price), 0))
+            .filter(Transaction.holding_id == holding.id,
+                    Transaction.side == 'buy',
+                    Transaction.remaining_quantity > EPSILON)
+            .one())
+        unlotted = holding.quantity - open_quantity
+        if unlotted <= EPSILON:
+            return 0, 0
+        return unlotted, max(average_cost * holding.quantity - open_cost, 0) / unlotted
+
+    def sell(self, holding, quantity, price, when=None):
+        """Enregistre une vente, retourne la transaction avec son P&L réalisé
+
+        Seuls les lots consommés par la vente sont lus. La quantité sans lot
+        (position antérieure au registre, non reprise par backfill) est la
+        plus ancienne: consommée en premier en FIFO, en dernier en LIFO.
+        """
+        if quantity <= 0:
+            raise ValueError("La quantité vendue doit être positive")
+        if quantity > holding.quantity + EPSILON:
+            raise InsufficientQuantityError("Quantité insuffisante dans le portefeuille")
+
+        method = holding.cost_method or self.default_method
+        average_cost = holding.purchase_price or 0
+
+        # Consomme les lots ouverts (FIFO ou LIFO; FIFO pour garder les lots
+        # cohérents avec la quantité en méthode du coût moyen)
+        unlotted, unlotted_price = self._unlotted(holding, average_cost)
+        lots_cost = 0
+        to_consume = quantity
+        if method != 'lifo' and unlotted:
+            taken = min(unlotted, to_consume)
+            lots_cost += taken * unlotted_price
+            to_consume -= taken
+        for lot in self._open_lots(holding, 'lifo' if method == 'lifo' else 'fifo'):
+            if to_consume <= EPSILON:
+                break
+            taken = min(lot.remaining_quantity, to_consume)
+            lot.remaining_quantity -= taken
+            lots_cost += taken * lot.price
+            to_consume -= taken
+        # LIFO: le reste vient de la quantité sans lot
+        lots_cost += max(to_consume, 0) * (unlotted_price if unlotted else average_cost)
+
+        cost = average_cost * quantity if method == 'average' else lots_cost
+        realized = quantity * price - cost
+
+        remaining_quantity = holding.quantity - quantity
+        remaining_cost = average_cost * holding.quantity - cost
+        holding.quantity = remaining_quantity
+        holding.purchase_price = remaining_cost / remaining_quantity if remaining_quantity > EPSILON else 0
+        holding.realized_pnl = (holding.realized_pnl or 0) + realized
+
+        transaction = self.Transaction(
+            user_id=holding.user_id,
+            holding_id=holding.id,
+            symbol=holding.symbol,
+            side='sell',
+            quantity=quantity,
+            price=price,
+            remaining_quantity=0,
+            realized_pnl=realized,
+            created_at=when or datetime.utcnow()
+        )
+        self.db.session.add(transaction)
+        return transaction
+
+    def close_position(self, holding):
+        """Détache l'historique d'une position supprimée
+
+        Les transactions sont conservées (P&L réalisé) mais leurs lots sont
+        fermés, pour qu'une future position ne les consomme pas si la base
+        réutilise l'identifiant.
+        """
+        self.db.session.query(self.Transaction).filter(
+            self.Transaction.holding_id == holding.id
+        ).update({
+            self.Transaction.holding_id: None,
+            self.Transaction.remaining_quantity: 0
+        }, synchronize_session=False)
+
+    def realized_pnl(self, user_id):
+        """P&L réalisé total d'un utilisateur, positions fermées comprises"""
+        total = (self.db.session.query(func.coalesce(func.sum(self.Transaction.realized_pnl), 0))
+                 .filter(self.Transaction.user_id == user_id,
+                         self.Transaction.side == 'sell')
+                 .scalar())
+        return total or 0
+
+    def backfill(self):
+        """Crée en une requête un lot d'ouverture pour chaque position sans transaction
+
+        Le lot est daté de la création de la position. Appelé par
+        upgrade_schema: une position qui a déjà une transaction est ignorée.
+        """
+        Holding = self.Holding
+        Asset = self.Asset
+        Transaction = self.Transaction
+        has_transaction = select(Transaction.id).where(Transaction.holding_id == Holding.id).exists()
+        rows = select(
+            Holding.user_id,
+            Holding.id,
+            Asset.symbol,
+            literal('buy'),
+            Holding.quantity,
+            Holding.purchase_price,
+            Holding.quantity,
+            literal(0.0),
+            func.coalesce(Holding.created_at, Holding.last_updated, literal(datetime.utcnow()))
+        ).join(Asset, Asset.id == Holding.asset_id).where(~has_transaction, Holding.quantity > 0)
+
+        result = self.db.session.execute(Transaction.__table__.insert().from_select(
+            ['user_id', 'holding_id', 'symbol', 'side', 'quantity', 'price',
+             'remaining_quantity', 'realized_pnl', 'created_at'], rows))
+        self.db.session.query(Holding).filter(Holding.realized_pnl.is_(None)).update(
+            {Holding.realized_pnl: 0}, synchronize_session=False)
+        self.db.session.query(Holding).filter(Holding.cost_method.is_(None)).update(
+            {Holding.cost_method: self.default_method}, synchronize_session=False)
+        self.db.session.commit()
+        return result.rowcount
+
+
+if __name__ == '__main__':
+    # Ajouter le repertoire courant au path pour les imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from app import app, cost_basis
+
+    if len(sys.argv) > 1 and sys.argv[1].lower() == 'backfill':
+        with app.app_context():
+            print(f"{cost_basis.backfill()} lots d'ouverture crees")
+    else:
+        print("Usage:")
+        print("  python cost_basis.py backfill   - Creer les lots des positions existantes")
@@ -0,0 +1,132 @@
+"""
+Profils du moteur de base de données pour l'application Portefeuille Crypto
+
+Le profil est lu dans DB_PROFILE ou déduit de l'URL de la base:
+- 'sqlite': base locale, journal WAL (les lectures ne bloquent plus
+  l'écriture) et pragmas appliqués à chaque nouvelle connexion; une
+  écriture concurrente attend busy_timeout au lieu d'échouer
+- 'postgres': pool de connexions persistantes réutilisées d'une requête
+  à l'autre (taille, débordement, recyclage), pre-ping, timeouts de
+  connexion et de requête, keepalives TCP
+- 'serverless': point d'accès poolé (Neon '-pooler', PgBouncer en mode
+  transaction): petit pool LIFO recyclé avant que le pooler ou la mise en
+  veille du calcul ne coupe les connexions inactives, pre-ping pour
+  écarter une connexion coupée, pas de paramètre de session (refusés par
+  le pooler)
+
+Chaque option se remplace par l'environnement (DB_POOL_SIZE, ...).
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+PROFILES = ('sqlite', 'postgres', 'serverless')
+
+# Valeurs par profil: (taille du pool, débordement, attente d'une connexion,
+# recyclage en secondes)
+POOL_DEFAULTS = {
+    'postgres': (5, 10, 30, 1800),
+    'serverless': (2, 3, 10, 240),
+}
+# Pilotes qui acceptent les paramètres libpq (keepalives, options)
+LIBPQ_DRIVERS = ('psycopg2', 'psycopg')
+APPLICATION_NAME = 'crypto-portfolio'
+
+
+def normalize_url(url):
+    """URL acceptée par SQLAlchemy ('postgres://' des hébergeurs -> 'postgresql://')"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def detect_profile(url, profile=None):
+    """Profil demandé, sinon déduit de l'URL (hôte '-pooler' de Neon: serverless)"""
+    if profile:
+        if profile not in PROFILES:
+            raise ValueError(f"Profil de base inconnu: {profile} ({', '.join(PROFILES)})")
+        return profile
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite':
+        return 'sqlite'
+    if '-pooler' in (parsed.host or '') or parsed.port == 6432:
+        return 'serverless'
+    return 'postgres'
+
+
+def _setting(config, name, default):
+    value = config.get(name)
+    return default if value is None else value
+
+
+def engine_options(profile, url, config):
+    """Options de create_engine (SQLALCHEMY_ENGINE_OPTIONS) d'un profil"""
+    if profile == 'sqlite':
+        # Attente côté pilote, en plus du pragma busy_timeout
+        return {'connect_args': {'timeout': _setting(config, 'DB_BUSY_TIMEOUT', 5000) / 1000}}
+
+    pool_size, max_overflow, pool_timeout, pool_recycle = POOL_DEFAULTS[profile]
+    options = {
+        'pool_size': _setting(config, 'DB_POOL_SIZE', pool_size),
+        'max_overflow': _setting(config, 'DB_MAX_OVERFLOW', max_overflow),
+        'pool_timeout': _setting(config, 'DB_POOL_TIMEOUT', pool_timeout),
+        'pool_recycle': _setting(config, 'DB_POOL_RECYCLE', pool_recycle),
+        'pool_pre_ping': True,
+        # Les connexions les plus récentes d'abord: celles en trop restent
+        # inactives et sont recyclées au lieu d'être coupées par le pooler
+        'pool_use_lifo': profile == 'serverless',
+    }
+    if make_url(url).get_driver_name() in LIBPQ_DRIVERS:
+        connect_args = {
+            'connect_timeout': _setting(config, 'DB_CONNECT_TIMEOUT', 10),
+            'application_name': APPLICATION_NAME,
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10,
+            'keepalives_count': 3,
+        }
+        statement_timeout = _setting(config, 'DB_STATEMENT_TIMEOUT', 30000)
+        if profile == 'postgres' and statement_timeout:
+            connect_args['options'] = f'-c statement_timeout={int(statement_timeout)}'
+        options['connect_args'] = connect_args
+    return options
+
+
+def sqlite_pragmas(busy_timeout=5000, memory=False):
+    """Pragmas appliqués à chaque connexion SQLite"""
+    pragmas = [
+        f'PRAGMA busy_timeout={int(busy_timeout)}',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA cache_size=-16000',  # 16 Mo
+    ]
+    if not memory:
+        pragmas.insert(0, 'PRAGMA journal_mode=WAL')
+    return pragmas
+
+
+def configure(app, profile=None):
+    """Renseigne le profil et les options du moteur (avant SQLAlchemy(app))"""
+    url = normalize_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    profile = detect_profile(url, profile)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['DB_PROFILE'] = profile
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(profile, url, app.config)
+    return profile
+
+
+def init_app(app, db):
+    """Applique les réglages par connexion du profil (pragmas SQLite)"""
+    if app.config['DB_PROFILE'] != 'sqlite':
+        return
+    with app.app_context():
+        engine = db.engine
+        memory = engine.url.database in (None, '', ':memory:')
+        pragmas = sqlite_pragmas(_setting(app.config, 'DB_BUSY_TIMEOUT', 5000), memory)
+
+        @event.listens_for(engine, 'connect')
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
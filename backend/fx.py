@@ -0,0 +1,198 @@
+"""
+Conversion des montants dans la devise de l'utilisateur
+
+Les prix sont récupérés et stockés dans une seule devise de cotation
+(QUOTE_CURRENCY) quel que soit le nombre de devises proposées. Un seul
+appel /exchange_rates (valeur d'un BTC dans chaque devise) donne la
+matrice des taux de change entre toutes les devises, gardée en cache:
+ajouter une devise ne crée aucun appel amont supplémentaire. Les montants
+d'un portefeuille sont convertis d'une seule multiplication NumPy (importé
+à la première conversion: les utilisateurs en USD ne le chargent jamais).
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from cache import FRESH
+
+QUOTE_CURRENCY = 'USD'
+# Devise -> (symbole, décimales, symbole avant le montant, libellé)
+CURRENCIES = {
+    'USD': ('$', 2, True, 'Dollar américain'),
+    'EUR': ('€', 2, False, 'Euro'),
+    'GBP': ('£', 2, True, 'Livre sterling'),
+    'CAD': ('CA$', 2, True, 'Dollar canadien'),
+    'CHF': ('CHF', 2, False, 'Franc suisse'),
+    'JPY': ('¥', 0, True, 'Yen japonais'),
+    'NGN': ('₦', 2, True, 'Naira nigérian'),
+    'XOF': ('FCFA', 0, False, 'Franc CFA (UEMOA)'),
+    'XAF': ('FCFA', 0, False, 'Franc CFA (CEMAC)'),
+}
+# Devises absentes de /exchange_rates, à parité fixe avec une autre devise
+PEGGED = {
+    'XOF': ('EUR', 655.957),
+    'XAF': ('EUR', 655.957),
+}
+# Colonnes monétaires des lignes de portfolio_rows()
+MONEY_FIELDS = ('purchase_price', 'current_price', 'current_value', 'invested_amount',
+                'profit_loss', 'total_value', 'total_invested')
+CACHE_KEY = 'exchange_rates'
+# Délai avant une nouvelle tentative après un échec de /exchange_rates (secondes)
+FAILURE_BACKOFF = 60
+
+Currency = namedtuple('Currency', 'code symbol decimals prefix rate')
+
+_row_types = {}
+
+
+def parse_rates(body, currencies=CURRENCIES):
+    """Réponse /exchange_rates -> {devise: valeur d'un BTC} pour les devises supportées"""
+    rates = {}
+    for code, info in (body.get('rates') or {}).items():
+        code = code.upper()
+        if code in currencies and info.get('value'):
+            rates[code] = float(info['value'])
+    for code, (base, parity) in PEGGED.items():
+        if code in currencies and code not in rates and base in rates:
+            rates[code] = rates[base] * parity
+    if QUOTE_CURRENCY not in rates:
+        raise ValueError(f"Taux {QUOTE_CURRENCY} absent de /exchange_rates")
+    return rates
+
+
+def rate_matrix(rates):
+    """(devises, matrice) où matrice[i, j] convertit un montant de la devise i en devise j"""
+    import numpy as np
+
+    codes = tuple(sorted(rates))
+    values = np.array([rates[code] for code in codes], dtype=float)
+    return codes, np.outer(1 / values, values)
+
+
+def format_money(value, currency, decimals=None):
+    """Montant formaté avec le symbole de la devise: '$12.50', '-1250 FCFA'"""
+    symbol, places, prefix = currency.symbol, currency.decimals, currency.prefix
+    if decimals is not None:
+        places = min(places, decimals)
+    amount = f"{abs(value or 0):.{places}f}"
+    sign = '-' if (value or 0) < 0 and float(amount) != 0 else ''
+    return f"{sign}{symbol}{amount}" if prefix else f"{sign}{amount} {symbol}"
+
+
+def convert_rows(rows, rate):
+    """Convertit les colonnes monétaires de lignes de portfolio_rows() en une multiplication
+
+    Retourne des namedtuples avec les mêmes champs que les lignes reçues.
+    """
+    if not rows or rate == 1:
+        return rows
+    import numpy as np
+
+    fields = tuple(rows[0]._fields)
+    row_type = _row_types.get(fields)
+    if row_type is None:
+        row_type = _row_types[fields] = namedtuple('PortfolioRow', fields)
+    columns = [index for index, field in enumerate(fields) if field in MONEY_FIELDS]
+    amounts = np.array([[row[index] or 0 for index in columns] for row in rows], dtype=float) * rate
+
+    converted = []
+    for row, values in zip(rows, amounts.tolist()):
+        data = list(row)
+        for index, value in zip(columns, values):
+            data[index] = value
+        converted.append(row_type._make(data))
+    return converted
+
+
+def convert_amounts(values, rate, decimals=2):
+    """Convertit une série de montants (liste) en une multiplication"""
+    if rate == 1:
+        return values
+    import numpy as np
+
+    return np.round(np.asarray(values, dtype=float) * rate, decimals).tolist()
+
+
+class FxRates:
+    """Taux de change en cache, tirés d'un seul appel /exchange_rates"""
+
+    def __init__(self, fetch_rates, cache, currencies=CURRENCIES, logger=None, backoff=FAILURE_BACKOFF):
+        self.fetch_rates = fetch_rates
+        self.cache = cache
+        self.currencies = currencies
+        self.logger = logger
+        self.backoff = backoff
+        self._rates = None
+        self._matrix = None
+        self._retry_at = 0
+        self._failing = False
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Récupère et met en cache les taux, retourne {devise: valeur d'un BTC}"""
+        rates = parse_rates(self.fetch_rates(), self.currencies)
+        self.cache.set(CACHE_KEY, rates)
+        return rates
+
+    def rates(self):
+        """Derniers taux connus (rafraîchis s'ils sont périmés), ou None
+
+        Après un échec, l'API n'est plus appelée pendant backoff secondes
+        (None: montants affichés dans la devise de cotation) et l'erreur
+        n'est journalisée qu'une fois jusqu'au prochain succès. Un seul
+        appelant du processus interroge l'API à la fois.
+        """
+        cached = self.cache.get(CACHE_KEY)
+        if cached and cached[1] == FRESH:
+            return cached[0]
+        fallback = cached[0] if cached else None
+        if time.time() < self._retry_at:
+            return fallback
+        if cached is not None and not self.cache.claim_refresh(CACHE_KEY):
+            return fallback
+        if not self._lock.acquire(blocking=False):
+            return fallback
+        try:
+            rates = self.refresh()
+            self._failing = False
+            return rates
+        except Exception as e:
+            self._retry_at = time.time() + self.backoff
+            if self.logger and not self._failing:
+                self.logger.error(f"Erreur taux de change (nouvel essai dans {self.backoff}s): {e}")
+            self._failing = True
+            return fallback
+        finally:
+            self._lock.release()
+
+    def matrix(self):
+        """(devises, matrice des taux), reconstruite seulement si les taux changent"""
+        rates = self.rates()
+        if not rates:
+            return None
+        if rates != self._rates:
+            self._matrix = rate_matrix(rates)
+            self._rates = rates
+        return self._matrix
+
+    def rate(self, target, source=QUOTE_CURRENCY):
+        """Taux de conversion de source vers target, ou None s'il est inconnu"""
+        if target == source:
+            return 1.0
+        matrix = self.matrix()
+        if matrix is None:
+            return None
+        codes, values = matrix
+        if source not in codes or target not in codes:
+            return None
+        return float(values[codes.index(source), codes.index(target)])
+
+    def currency(self, code):
+        """Devise d'affichage avec son taux; la devise de cotation si le taux est inconnu"""
+        code = (code or QUOTE_CURRENCY).upper()
+        rate = self.rate(code) if code in self.currencies else None
+        if rate is None:
+            code, rate = QUOTE_CURRENCY, 1.0
+        symbol, decimals, prefix, _ = self.currencies[code]
+        return Currency(code, symbol, decimals, prefix, rate)
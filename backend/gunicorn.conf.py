@@ -0,0 +1,84 @@
+"""
+Configuration gunicorn de production
+
+Les routes de l'application attendent surtout des E/S (API CoinGecko, base
+de données, flux SSE). Avec des workers gevent, une requête qui attend
+CoinGecko cède la main aux autres au lieu de bloquer un worker: chaque
+worker sert des centaines de connexions simultanées.
+
+L'application est chargée une fois par le processus maître (preload_app)
+puis les workers sont forkés: démarrer ou recycler un worker ne réimporte
+rien et les modules sont partagés en copie sur écriture.
+
+Usage (depuis backend/):
+    gunicorn 'app:create_app()' -c gunicorn.conf.py
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# Un worker par cœur suffit: la concurrence vient des greenlets
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Application chargée par le maître avant le fork des workers
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+if preload_app and worker_class == 'gevent':
+    # L'application crée des verrous et des sockets à l'import: avec le
+    # préchargement, gevent doit être appliqué avant, dans le maître
+    from gevent import monkey
+    monkey.patch_all()
+
+# Un appel CoinGecko peut prendre jusqu'à COINGECKO_TIMEOUT secondes par tentative
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle périodiquement les workers (fuites mémoire éventuelles)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    """Maître prêt: charge les dépendances paresseuses et gèle le tas avant les forks"""
+    webapp = sys.modules.get('app')
+    if webapp is None:
+        return
+    webapp.preload_dependencies()
+    # Les objets du maître ne sont plus parcourus par le ramasse-miettes des
+    # workers: leurs pages mémoire restent partagées
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Connexions héritées du maître abandonnées; psycopg2 coopératif avec gevent"""
+    webapp = sys.modules.get('app')
+    if webapp is not None:
+        # Le pool du maître ne doit pas être utilisé par plusieurs processus
+        with webapp.app.app_context():
+            webapp.db.engine.dispose(close=False)
+
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
+    server.log.info("psycopg2 patché pour gevent")
+
+
+def post_worker_init(worker):
+    """Threads de fond (worker de prix) démarrés dans chaque worker, après le fork"""
+    from app import start_background
+    start_background()
@@ -10,19 +10,17 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from app import app, db
-    from models import User, Crypto
+    from app import app, db, User, Holding, Asset, Transaction, migrate_database
+    from reports import table_counts, holdings_per_user
     
     def init_database():
         """Initialise la base de donnees et cree toutes les tables"""
         print("Initialisation de la base de donnees...")
         
+        migrate_database()
+        
         with app.app_context():
             try:
-                # Creer toutes les tables
-                db.create_all()
-                print("Tables creees avec succes!")
-                
                 # Verifier si des utilisateurs existent deja
                 user_count = User.query.count()
                 print(f"Nombre d'utilisateurs existants: {user_count}")
@@ -36,18 +34,19 @@ try:
         """Affiche les informations de la base de donnees"""
         with app.app_context():
             try:
-                user_count = User.query.count()
-                crypto_count = Crypto.query.count()
+                counts = table_counts(db, User, Asset, Holding, Transaction)
                 
                 print("Informations de la base de donnees:")
-                print(f"   - Utilisateurs: {user_count}")
-                print(f"   - Cryptomonnaies: {crypto_count}")
+                print(f"   - Utilisateurs: {counts['user']}")
+                print(f"   - Actifs: {counts['asset']}")
+                print(f"   - Positions: {counts['holding']}")
+                print(f"   - Transactions: {counts['crypto_transaction']}")
                 
-                if user_count > 0:
+                if counts['user'] > 0:
+                    # Une seule requete groupee, lue par paquets
                     print("\nUtilisateurs existants:")
-                    for user in User.query.all():
-                        crypto_count_for_user = Crypto.query.filter_by(user_id=user.id).count()
-                        print(f"   - {user.username} ({user.email}) - {crypto_count_for_user} cryptos")
+                    for user in holdings_per_user(db, User, Holding, Asset):
+                        print(f"   - {user.username} ({user.email}) - {user.holdings} cryptos")
                         
             except Exception as e:
                 print(f"Erreur lors de l'acces aux donnees: {e}")
@@ -58,13 +57,16 @@ try:
             
             if command == 'init':
                 init_database()
+            elif command == 'migrate':
+                migrate_database()
             elif command == 'info':
                 show_database_info()
             else:
-                print("Commande inconnue. Utilisez: init, ou info")
+                print("Commande inconnue. Utilisez: init, migrate ou info")
         else:
             print("Usage:")
             print("  python init_db.py init    - Initialiser la base de donnees")
+            print("  python init_db.py migrate - Creer les tables manquantes et migrer le schema")
             print("  python init_db.py info    - Afficher les informations de la base")
     
 except ImportError as e:
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Instantané du marché pour l'application Portefeuille Crypto
+
+Le top N des cryptomonnaies par capitalisation est récupéré périodiquement
+(par pages de /coins/markets), sérialisé une seule fois et stocké en base
+avec son ETag. Les requêtes servent ces octets tels quels; un client qui a
+déjà la version courante reçoit un 304 sans corps. En cas d'échec, le
+dernier instantané valide reste servi.
+"""
+
+import sys
+import os
+import json
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+# Taille maximale d'une page /coins/markets
+MAX_PER_PAGE = 250
+
+
+def market_entry(coin):
+    """Entrée de l'instantané à partir d'une ligne /coins/markets"""
+    return {
+        'rank': coin.get('market_cap_rank'),
+        'id': coin['id'],
+        'name': coin.get('name') or coin['id'],
+        'symbol': (coin.get('symbol') or '').upper(),
+        'image': coin.get('image') or '',
+        'current_price': coin.get('current_price') or 0,
+        'price_change_24h': coin.get('price_change_percentage_24h') or 0,
+        'market_cap': coin.get('market_cap') or 0,
+        'volume_24h': coin.get('total_volume') or 0
+    }
+
+
+class Snapshot:
+    """Instantané sérialisé prêt à être servi"""
+
+    def __init__(self, body, etag, modified_at, fetched_at):
+        self.body = body
+        self.etag = etag
+        self.modified_at = modified_at
+        self.fetched_at = fetched_at
+
+    def age(self):
+        return (datetime.utcnow() - self.fetched_at).total_seconds()
+
+
+class MarketData:
+    """Rafraîchit, stocke et sert l'instantané du marché"""
+
+    def __init__(self, db, MarketSnapshot, client, top_n=250, vs_currency='usd',
+                 refresh_interval=300, reload_interval=30):
+        self.db = db
+        self.MarketSnapshot = MarketSnapshot
+        self.client = client
+        self.top_n = top_n
+        self.vs_currency = vs_currency
+        self.refresh_interval = refresh_interval
+        # Fréquence de relecture en base (instantané écrit par un autre processus)
+        self.reload_interval = reload_interval
+        self._snapshot = None
+        self._loaded_at = 0
+        self._retry_at = 0  # après un échec, pas de nouvel essai avant cette date
+        self._lock = threading.Lock()
+
+    def fetch(self):
+        """Récupère le top N par pages, retourne la liste des entrées"""
+        per_page = min(self.top_n, MAX_PER_PAGE)
+        pages = (self.top_n + per_page - 1) // per_page
+        entries = []
+        for page in range(1, pages + 1):
+            coins = self.client.get('/coins/markets', {
+                'vs_currency': self.vs_currency,
+                'order': 'market_cap_desc',
+                'per_page': per_page,
+                'page': page,
+                'price_change_percentage': '24h'
+            })
+            entries += [market_entry(coin) for coin in coins if coin.get('id')]
+            if len(coins) < per_page:
+                break
+        return entries[:self.top_n]
+
+    def refresh(self):
+        """Récupère et enregistre un nouvel instantané, retourne le nombre d'entrées
+
+        Une erreur de l'API est propagée sans toucher à l'instantané stocké.
+        """
+        entries = self.fetch()
+        if not entries:
+            raise ValueError("Instantané du marché vide")
+
+        now = datetime.utcnow()
+        market_data = json.dumps(entries, separators=(',', ':'))
+        etag = hashlib.sha1(market_data.encode()).hexdigest()
+        body = json.dumps({
+            'market_data': entries,
+            'vs_currency': self.vs_currency,
+            'updated_at': now.isoformat() + 'Z'
+        }, separators=(',', ':')).encode()
+
+        record = self.db.session.get(self.MarketSnapshot, self.vs_currency)
+        if record is None:
+            record = self.MarketSnapshot(vs_currency=self.vs_currency)
+            self.db.session.add(record)
+        if record.etag != etag:
+            # Contenu modifié: nouvelles données et nouveau Last-Modified
+            record.body = body
+            record.etag = etag
+            record.modified_at = now
+        record.fetched_at = now
+        self.db.session.commit()
+
+        self._set(record)
+        return len(entries)
+
+    def _set(self, record):
+        self._snapshot = Snapshot(record.body, record.etag, record.modified_at, record.fetched_at)
+        self._loaded_at = time.time()
+
+    def reload(self):
+        """Relit l'instantané stocké en base"""
+        record = self.db.session.get(self.MarketSnapshot, self.vs_currency)
+        if record is not None:
+            self._set(record)
+        else:
+            self._loaded_at = time.time()
+        return self._snapshot
+
+    def entries(self):
+        """Entrées de l'instantané courant (rang, id, symbole...), [] sans instantané"""
+        snapshot = self.current()
+        return json.loads(snapshot.body)['market_data'] if snapshot else []
+
+    def current(self, refresh_if_stale=False):
+        """Instantané courant (ou None), relu en base au plus toutes les reload_interval secondes
+
+        Avec refresh_if_stale (pas de worker), l'appelant qui trouve un
+        instantané trop ancien le rafraîchit; les autres servent l'ancien.
+        """
+        if self._snapshot is None or time.time() - self._loaded_at > self.reload_interval:
+            with self._lock:
+                if self._snapshot is None or time.time() - self._loaded_at > self.reload_interval:
+                    self.reload()
+
+        snapshot = self._snapshot
+        if (refresh_if_stale and time.time() >= self._retry_at
+                and (snapshot is None or snapshot.age() > self.refresh_interval)):
+            # Premier instantané: tout le monde attend; sinon un seul rafraîchit
+            if self._lock.acquire(blocking=snapshot is None):
+                try:
+                    if self._snapshot is snapshot and time.time() >= self._retry_at:
+                        self.refresh()
+                except Exception:
+                    self._retry_at = time.time() + self.reload_interval
+                    raise
+                finally:
+                    self._lock.release()
+        return self._snapshot
+
+
+if __name__ == '__main__':
+    # Ajouter le repertoire courant au path pour les imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from app import app, market_data
+
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1].lower() == 'refresh':
+            print(f"{market_data.refresh()} cryptos dans l'instantane du marche")
+        else:
+            print("Usage:")
+            print("  python market_snapshot.py refresh   - Rafraichir l'instantane du marche")
@@ -0,0 +1,322 @@
+"""
+Instrumentation de l'application Portefeuille Crypto
+
+Mesures collectées par processus et exposées au format texte Prometheus
+(/metrics):
+- latence des requêtes par route (histogramme)
+- succès/échecs des caches
+- appels à l'API CoinGecko: nombre par statut, latence, réponses 429
+- temps passé à attendre le limiteur de débit, refus du limiteur
+- nombre et durée des requêtes SQL, au total et par requête HTTP
+- pool de connexions à la base: ouvertures (et leur durée), emprunts,
+  invalidations, connexions en cours d'utilisation
+
+Chaque requête HTTP peut aussi recevoir un en-tête Server-Timing (temps
+total, SQL, CoinGecko) lisible dans les outils de développement du
+navigateur, pour voir où un tableau de bord lent passe son temps.
+
+Avec plusieurs workers gunicorn, chaque processus expose ses propres
+mesures.
+"""
+
+import time
+import threading
+
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+
+from cache import FRESH
+
+# Limites des histogrammes de durée (secondes)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Limites de l'histogramme du nombre de requêtes SQL par requête HTTP
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Compteur monotone, avec étiquettes optionnelles"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Histogramme cumulatif (seaux, somme, nombre d'observations)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}  # étiquettes -> [compte par seau, somme]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * len(self.buckets), 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[labels] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (f"{self.name}_bucket{_labels(self.label_names, labels, ('le', _number(bound)))} "
+                       f"{cumulative}")
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class InstrumentedCache:
+    """Cache qui compte ses lectures (fraîches, périmées, absentes)"""
+
+    def __init__(self, cache, name, counter):
+        self._cache = cache
+        self._name = name
+        self._counter = counter
+
+    def get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            result = 'miss'
+        else:
+            result = 'hit' if entry[1] == FRESH else 'stale'
+        self._counter.inc(self._name, result)
+        return entry
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class Metrics:
+    """Registre des mesures de l'application"""
+
+    def __init__(self):
+        self.http_requests = Histogram(
+            'http_request_duration_seconds', "Durée des requêtes HTTP par route",
+            ('method', 'route', 'status'))
+        self.cache_requests = Counter(
+            'cache_requests_total', "Lectures de cache par résultat (hit, stale, miss)",
+            ('cache', 'result'))
+        self.upstream_requests = Counter(
+            'upstream_requests_total', "Appels à l'API CoinGecko par statut",
+            ('endpoint', 'status'))
+        self.upstream_duration = Histogram(
+            'upstream_request_duration_seconds', "Durée des appels à l'API CoinGecko",
+            ('endpoint',))
+        self.upstream_rate_limited = Counter(
+            'upstream_rate_limited_total', "Réponses 429 de l'API CoinGecko",
+            ('endpoint',))
+        self.db_queries = Counter(
+            'db_queries_total', "Requêtes SQL exécutées")
+        self.db_query_seconds = Counter(
+            'db_query_seconds_total', "Temps total passé dans les requêtes SQL")
+        self.request_db_queries = Histogram(
+            'http_request_db_queries', "Nombre de requêtes SQL par requête HTTP",
+            ('route',), buckets=COUNT_BUCKETS)
+        self.request_db_seconds = Histogram(
+            'http_request_db_seconds', "Temps SQL par requête HTTP",
+            ('route',))
+        self.db_connections = Counter(
+            'db_pool_connections_total', "Connexions ouvertes vers la base par le pool")
+        self.db_connect_duration = Histogram(
+            'db_pool_connect_seconds', "Durée d'ouverture d'une connexion à la base")
+        self.db_checkouts = Counter(
+            'db_pool_checkouts_total', "Connexions empruntées au pool")
+        self.db_invalidated = Counter(
+            'db_pool_invalidated_total', "Connexions invalidées (coupées, pre-ping en échec, recyclées)")
+        self._metrics = [self.http_requests, self.cache_requests, self.upstream_requests,
+                         self.upstream_duration, self.upstream_rate_limited, self.db_queries,
+                         self.db_query_seconds, self.request_db_queries, self.request_db_seconds,
+                         self.db_connections, self.db_connect_duration, self.db_checkouts,
+                         self.db_invalidated]
+        self._rate_limiters = []
+        self._engines = []
+        self.server_timing = False
+
+    # --- Sources de mesures ---
+
+    def instrument_cache(self, name, cache):
+        """Enveloppe un cache pour compter ses lectures"""
+        return InstrumentedCache(cache, name, self.cache_requests)
+
+    def observe_upstream(self, endpoint, status, duration):
+        """Appelée par le client CoinGecko après chaque tentative (status: code HTTP ou 'error')"""
+        self.upstream_requests.inc(endpoint, str(status))
+        self.upstream_duration.observe(duration, endpoint)
+        if status == 429:
+            self.upstream_rate_limited.inc(endpoint)
+        if has_request_context():
+            g.metrics_upstream_time = g.get('metrics_upstream_time', 0) + duration
+            g.metrics_upstream_calls = g.get('metrics_upstream_calls', 0) + 1
+
+    def register_rate_limiter(self, rate_limiter):
+        """Expose l'attente cumulée et les refus d'un limiteur (lus à chaque collecte)"""
+        self._rate_limiters.append(rate_limiter)
+
+    def _before_connect(self, dialect, connection_record, cargs, cparams):
+        connection_record.info['metrics_connect_start'] = time.perf_counter()
+
+    def _after_connect(self, dbapi_connection, connection_record):
+        start = connection_record.info.pop('metrics_connect_start', None)
+        self.db_connections.inc()
+        if start is not None:
+            self.db_connect_duration.observe(time.perf_counter() - start)
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.db_checkouts.inc()
+
+    def _invalidate(self, dbapi_connection, connection_record, exception):
+        self.db_invalidated.inc()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        self.db_queries.inc()
+        self.db_query_seconds.inc(amount=elapsed)
+        if has_request_context():
+            g.metrics_db_queries = g.get('metrics_db_queries', 0) + 1
+            g.metrics_db_time = g.get('metrics_db_time', 0) + elapsed
+
+    # --- Intégration Flask ---
+
+    def init_app(self, app, db=None, server_timing=False):
+        """Mesure les requêtes de l'application (et les requêtes SQL de db)"""
+        self.server_timing = server_timing
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if db is not None:
+            with app.app_context():
+                event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+                event.listen(db.engine, 'do_connect', self._before_connect)
+                event.listen(db.engine, 'connect', self._after_connect)
+                event.listen(db.engine, 'checkout', self._checkout)
+                event.listen(db.engine, 'invalidate', self._invalidate)
+                self._engines.append(db.engine)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def _after_request(self, response):
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        db_queries = g.get('metrics_db_queries', 0)
+        db_time = g.get('metrics_db_time', 0)
+        upstream_time = g.get('metrics_upstream_time', 0)
+
+        self.http_requests.observe(elapsed, request.method, route, str(response.status_code))
+        self.request_db_queries.observe(db_queries, route)
+        self.request_db_seconds.observe(db_time, route)
+
+        if self.server_timing:
+            timings = [f'app;dur={elapsed * 1000:.1f}',
+                       f'db;dur={db_time * 1000:.1f};desc="{db_queries} requetes SQL"']
+            if upstream_time:
+                timings.append(f'upstream;dur={upstream_time * 1000:.1f};'
+                               f'desc="{g.get("metrics_upstream_calls", 0)} appels CoinGecko"')
+            response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    # --- Exposition ---
+
+    def _rate_limiter_lines(self):
+        waits, acquired, rejected = [], [], []
+        for rate_limiter in self._rate_limiters:
+            for endpoint, stats in sorted(rate_limiter.stats().items()):
+                labels = _labels(('endpoint',), (endpoint,))
+                waits.append(f"rate_limiter_wait_seconds_total{labels} {_number(stats['wait_seconds'])}")
+                acquired.append(f"rate_limiter_acquired_total{labels} {stats['acquired']}")
+                rejected.append(f"rate_limiter_rejected_total{labels} {stats['rejected']}")
+        for name, documentation, lines in (
+                ('rate_limiter_wait_seconds_total', "Temps passé à attendre un jeton du limiteur", waits),
+                ('rate_limiter_acquired_total', "Jetons obtenus du limiteur", acquired),
+                ('rate_limiter_rejected_total', "Appels refusés par le limiteur (budget épuisé)", rejected)):
+            yield f"# HELP {name} {documentation}"
+            yield f"# TYPE {name} counter"
+            yield from lines
+
+    def _pool_lines(self):
+        # Lu à chaque collecte sur le pool courant (remplacé par engine.dispose())
+        pools = [engine.pool for engine in self._engines]
+        for name, documentation, method in (
+                ('db_pool_size', "Taille du pool de connexions", 'size'),
+                ('db_pool_checked_out', "Connexions en cours d'utilisation", 'checkedout'),
+                ('db_pool_checked_in', "Connexions inactives dans le pool", 'checkedin'),
+                ('db_pool_overflow', "Connexions ouvertes au-delà de la taille du pool", 'overflow')):
+            # overflow() est négatif tant que le pool n'est pas plein
+            values = [max(getattr(pool, method)(), 0) for pool in pools if hasattr(pool, method)]
+            yield f"# HELP {name} {documentation}"
+            yield f"# TYPE {name} gauge"
+            if values:
+                yield f"{name} {_number(sum(values))}"
+
+    def render(self):
+        """Mesures au format texte Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        lines.extend(self._rate_limiter_lines())
+        lines.extend(self._pool_lines())
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), mimetype=None, content_type=CONTENT_TYPE)
@@ -0,0 +1,142 @@
+"""
+Mises à jour du schéma pour les bases créées par des versions antérieures
+
+db.create_all() crée les tables manquantes mais n'ajoute pas de colonnes
+aux tables existantes: les colonnes ajoutées depuis sont créées ici, ainsi
+que les données des nouvelles tables tirées des anciennes.
+"""
+
+from sqlalchemy import inspect, text
+
+# table -> [(colonne, définition SQL)]
+ADDED_COLUMNS = {
+    'user': [
+        ('portfolio_version', 'INTEGER NOT NULL DEFAULT 0'),
+        ('base_currency', "VARCHAR(3) NOT NULL DEFAULT 'USD'"),
+    ],
+    'crypto': [
+        ('realized_pnl', 'FLOAT DEFAULT 0'),
+        ('cost_method', "VARCHAR(10) DEFAULT 'average'"),
+    ],
+    'asset': [
+        ('name', 'VARCHAR(100)'),
+        ('coin_id', 'VARCHAR(100)'),
+    ],
+    'crypto_transaction': [
+        ('holding_id', 'INTEGER'),
+    ],
+}
+
+
+def add_missing_columns(db, table, columns):
+    """Ajoute les colonnes absentes d'une table, retourne leurs noms"""
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table):
+        return []
+    existing = {column['name'] for column in inspector.get_columns(table)}
+    added = []
+    for name, definition in columns:
+        if name not in existing:
+            db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {definition}'))
+            added.append(name)
+    db.session.commit()
+    return added
+
+
+# Ancienne table crypto (nom, symbole et prix recopiés sur chaque position),
+# renommée une fois ses données migrées vers asset et holding
+LEGACY_CRYPTO_TABLE = 'legacy_crypto'
+
+# Un actif par symbole, avec le dernier prix connu dans la table crypto
+MIGRATE_ASSETS = """
+INSERT INTO asset (symbol, name, current_price, price_change_24h, updated_at)
+SELECT symbol, name, current_price, price_change_24h, last_updated FROM (
+    SELECT UPPER(symbol) AS symbol, name, current_price, price_change_24h, last_updated,
+           ROW_NUMBER() OVER (PARTITION BY UPPER(symbol)
+                              ORDER BY CASE WHEN current_price > 0 THEN 0 ELSE 1 END,
+                                       last_updated DESC) AS position
+    FROM crypto
+) latest
+WHERE position = 1 AND symbol NOT IN (SELECT symbol FROM asset)
+"""
+
+MIGRATE_ASSET_NAMES = """
+UPDATE asset SET name = (SELECT MAX(crypto.name) FROM crypto WHERE UPPER(crypto.symbol) = asset.symbol)
+WHERE name IS NULL
+"""
+
+# Une position par (utilisateur, actif); les doublons éventuels sont fusionnés
+MIGRATE_HOLDINGS = """
+INSERT INTO holding (user_id, asset_id, quantity, purchase_price, realized_pnl, cost_method,
+                     created_at, last_updated)
+SELECT crypto.user_id, asset.id, SUM(crypto.quantity),
+       CASE WHEN SUM(crypto.quantity) > 0
+            THEN SUM(crypto.quantity * crypto.purchase_price) / SUM(crypto.quantity)
+            ELSE MAX(crypto.purchase_price) END,
+       SUM(COALESCE(crypto.realized_pnl, 0)), MAX(COALESCE(crypto.cost_method, 'average')),
+       MIN(crypto.last_updated), MAX(crypto.last_updated)
+FROM crypto JOIN asset ON asset.symbol = UPPER(crypto.symbol)
+GROUP BY crypto.user_id, asset.id
+"""
+
+MIGRATE_TRANSACTIONS = """
+UPDATE crypto_transaction SET holding_id = (
+    SELECT holding.id FROM crypto
+    JOIN asset ON asset.symbol = UPPER(crypto.symbol)
+    JOIN holding ON holding.user_id = crypto.user_id AND holding.asset_id = asset.id
+    WHERE crypto.id = crypto_transaction.crypto_id)
+WHERE holding_id IS NULL AND crypto_id IS NOT NULL
+"""
+
+
+def migrate_holdings(db):
+    """Migre la table crypto vers asset + holding, retourne le nombre de positions
+
+    La table crypto est ensuite renommée en legacy_crypto: la migration ne
+    s'exécute qu'une fois.
+    """
+    inspector = inspect(db.engine)
+    if not inspector.has_table('crypto') or inspector.has_table(LEGACY_CRYPTO_TABLE):
+        return 0
+
+    db.session.execute(text(MIGRATE_ASSETS))
+    db.session.execute(text(MIGRATE_ASSET_NAMES))
+    count = db.session.execute(text(MIGRATE_HOLDINGS)).rowcount
+    transaction_columns = {column['name'] for column in inspector.get_columns('crypto_transaction')}
+    if 'crypto_id' in transaction_columns:
+        db.session.execute(text(MIGRATE_TRANSACTIONS))
+    db.session.execute(text(f'ALTER TABLE crypto RENAME TO {LEGACY_CRYPTO_TABLE}'))
+    db.session.commit()
+    return count
+
+
+def create_missing_indexes(db):
+    """Crée les index déclarés par les modèles absents des tables existantes"""
+    created = []
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
+def upgrade_schema(db, cost_basis=None):
+    """Applique toutes les mises à jour de colonnes, d'index et de données connues
+
+    Avec cost_basis, les positions sans transaction reçoivent leur lot
+    d'ouverture (sans effet sur les positions qui en ont déjà un).
+    """
+    added = []
+    for table, columns in ADDED_COLUMNS.items():
+        added += [f'{table}.{name}' for name in add_missing_columns(db, table, columns)]
+    added += create_missing_indexes(db)
+    if migrate_holdings(db):
+        added.append('holding')
+    if cost_basis is not None and cost_basis.backfill():
+        added.append('crypto_transaction.lots')
+    return added
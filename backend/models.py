@@ -15,9 +15,13 @@ def create_models(db):
         email = db.Column(db.String(120), unique=True, nullable=False)
         password_hash = db.Column(db.String(128), nullable=False)
         created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        # Incrémenté à chaque modification des positions (invalide les caches)
+        portfolio_version = db.Column(db.Integer, nullable=False, default=0)
+        # Devise d'affichage des montants (prix stockés dans la devise de cotation)
+        base_currency = db.Column(db.String(3), nullable=False, default='USD')
         
         # Relations
-        cryptos = db.relationship('Crypto', backref='owner', lazy=True, cascade='all, delete-orphan')
+        holdings = db.relationship('Holding', backref='owner', lazy=True, cascade='all, delete-orphan')
         
         def set_password(self, password):
             """Hachage du mot de passe"""
@@ -30,21 +34,73 @@ def create_models(db):
         def __repr__(self):
             return f'<User {self.username}>'
 
-    class Crypto(db.Model):
-        """Modèle de cryptomonnaie associé à un utilisateur"""
-        __tablename__ = 'crypto'
+    class Coin(db.Model):
+        """Annuaire local des coins CoinGecko (recherche et résolution des symboles)"""
+        __tablename__ = 'coin'
+        
+        id = db.Column(db.String(100), primary_key=True)  # ID CoinGecko
+        symbol = db.Column(db.String(30), nullable=False, index=True)
+        name = db.Column(db.String(200), nullable=False)
+        thumb = db.Column(db.String(300), nullable=True)
+        market_cap_rank = db.Column(db.Integer, nullable=True)
+        updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+        
+        def __repr__(self):
+            return f'<Coin {self.id}>'
+
+    class Asset(db.Model):
+        """Actif (un par symbole) et son dernier prix connu, partagé par tous les utilisateurs"""
+        __tablename__ = 'asset'
         
         id = db.Column(db.Integer, primary_key=True)
-        name = db.Column(db.String(50), nullable=False)
-        symbol = db.Column(db.String(10), nullable=False)
-        quantity = db.Column(db.Float, nullable=False)
-        purchase_price = db.Column(db.Float, nullable=False)
+        symbol = db.Column(db.String(10), unique=True, nullable=False, index=True)
+        name = db.Column(db.String(100), nullable=True)
+        coin_id = db.Column(db.String(100), nullable=True)  # ID CoinGecko
         current_price = db.Column(db.Float, nullable=True, default=0)
         price_change_24h = db.Column(db.Float, nullable=True, default=0)
-        last_updated = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+        updated_at = db.Column(db.DateTime, nullable=True)
+        
+        def __repr__(self):
+            return f'<Asset {self.symbol}>'
+
+    class Holding(db.Model):
+        """Position d'un utilisateur sur un actif (nom, symbole et prix dans asset)"""
+        __tablename__ = 'holding'
+        __table_args__ = (
+            # Une position par actif et par utilisateur; sert aussi d'index sur user_id
+            db.UniqueConstraint('user_id', 'asset_id', name='uq_holding_user_asset'),
+            db.Index('ix_holding_asset', 'asset_id'),
+        )
         
-        # Clé étrangère vers l'utilisateur
+        id = db.Column(db.Integer, primary_key=True)
         user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=False)
+        quantity = db.Column(db.Float, nullable=False)
+        purchase_price = db.Column(db.Float, nullable=False)
+        # Agrégats du moteur de prix de revient (purchase_price = coût moyen restant)
+        realized_pnl = db.Column(db.Float, nullable=True, default=0)
+        cost_method = db.Column(db.String(10), nullable=True, default='average')
+        created_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+        last_updated = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+        
+        asset = db.relationship('Asset', lazy='joined')
+        
+        # Attributs de l'actif
+        @property
+        def name(self):
+            return self.asset.name or self.asset.symbol
+        
+        @property
+        def symbol(self):
+            return self.asset.symbol
+        
+        @property
+        def current_price(self):
+            return self.asset.current_price
+        
+        @property
+        def price_change_24h(self):
+            return self.asset.price_change_24h
         
         # Champs calculés (non stockés en base)
         @property
@@ -65,6 +121,10 @@ def create_models(db):
         def invested_amount(self):
             return self.quantity * self.purchase_price
         
+        @property
+        def unrealized_pnl(self):
+            return self.profit_loss
+        
         @property
         def current_value_rounded(self):
             return round(self.current_value, 2)
@@ -78,6 +138,102 @@ def create_models(db):
             return round(self.profit_loss_percentage, 2)
 
         def __repr__(self):
-            return f'<Crypto {self.name}>'
+            return f'<Holding {self.user_id} {self.asset_id}>'
+
+    class Transaction(db.Model):
+        """Achat (lot) ou vente d'une cryptomonnaie"""
+        __tablename__ = 'crypto_transaction'
+        __table_args__ = (
+            db.Index('ix_crypto_transaction_user_symbol', 'user_id', 'symbol'),
+            db.Index('ix_crypto_transaction_holding_lots', 'holding_id', 'side', 'remaining_quantity'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        holding_id = db.Column(db.Integer, db.ForeignKey('holding.id', ondelete='SET NULL'), nullable=True)
+        symbol = db.Column(db.String(10), nullable=False)
+        side = db.Column(db.String(4), nullable=False)  # 'buy' ou 'sell'
+        quantity = db.Column(db.Float, nullable=False)
+        price = db.Column(db.Float, nullable=False)
+        # Quantité encore ouverte d'un lot d'achat (FIFO/LIFO)
+        remaining_quantity = db.Column(db.Float, nullable=False, default=0)
+        # P&L réalisé par une vente
+        realized_pnl = db.Column(db.Float, nullable=False, default=0)
+        created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+        
+        def __repr__(self):
+            return f'<Transaction {self.side} {self.quantity} {self.symbol}>'
+
+    class PricePoint(db.Model):
+        """Échantillon de prix d'un symbole (série temporelle)"""
+        __tablename__ = 'price_history'
+        # Sous SQLite, la table est stockée dans l'ordre de sa clé primaire
+        __table_args__ = {'sqlite_with_rowid': False}
+        
+        # Clé primaire composite: les requêtes par plage de temps d'un
+        # symbole lisent directement l'index
+        symbol = db.Column(db.String(10), primary_key=True)
+        ts = db.Column(db.Integer, primary_key=True)  # timestamp epoch (secondes)
+        price = db.Column(db.Float, nullable=False)
+        
+        def __repr__(self):
+            return f'<PricePoint {self.symbol} {self.ts}>'
+
+    class MarketSnapshot(db.Model):
+        """Dernier instantané valide du marché, déjà sérialisé en JSON"""
+        __tablename__ = 'market_snapshot'
+        
+        vs_currency = db.Column(db.String(10), primary_key=True)
+        body = db.Column(db.LargeBinary, nullable=False)
+        etag = db.Column(db.String(64), nullable=False)
+        # Date du dernier changement de contenu (Last-Modified)
+        modified_at = db.Column(db.DateTime, nullable=False)
+        # Date du dernier rafraîchissement réussi
+        fetched_at = db.Column(db.DateTime, nullable=False)
+        
+        def __repr__(self):
+            return f'<MarketSnapshot {self.vs_currency} {self.fetched_at}>'
+
+    class PriceAlert(db.Model):
+        """Alerte de prix d'un utilisateur sur un symbole (déclenchée une seule fois)"""
+        __tablename__ = 'price_alert'
+        __table_args__ = (
+            db.Index('ix_price_alert_user', 'user_id'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+        symbol = db.Column(db.String(10), nullable=False)
+        # 'above' / 'below': seuil de prix; 'move': variation en % depuis reference_price
+        kind = db.Column(db.String(5), nullable=False)
+        threshold = db.Column(db.Float, nullable=False)
+        reference_price = db.Column(db.Float, nullable=True)
+        active = db.Column(db.Boolean, nullable=False, default=True)
+        created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+        triggered_at = db.Column(db.DateTime, nullable=True)
+        triggered_price = db.Column(db.Float, nullable=True)
+        
+        def __repr__(self):
+            return f'<PriceAlert {self.symbol} {self.kind} {self.threshold}>'
+
+    class AlertNotification(db.Model):
+        """File des notifications in-app des alertes déclenchées"""
+        __tablename__ = 'alert_notification'
+        __table_args__ = (
+            db.Index('ix_alert_notification_unread', 'user_id', 'read_at'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+        alert_id = db.Column(db.Integer, nullable=False)
+        symbol = db.Column(db.String(10), nullable=False)
+        kind = db.Column(db.String(5), nullable=False)
+        threshold = db.Column(db.Float, nullable=False)
+        price = db.Column(db.Float, nullable=False)
+        created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+        read_at = db.Column(db.DateTime, nullable=True)
+        
+        def __repr__(self):
+            return f'<AlertNotification {self.symbol} {self.price}>'
 
-    return User, Crypto
\ No newline at end of file
+    return User, Asset, Holding, Coin, Transaction, PricePoint, MarketSnapshot, PriceAlert, AlertNotification
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Agrégation du portefeuille côté SQL
+
+Les totaux (valeur, investi, P&L) et la meilleure/pire performance sont
+calculés par la base en une seule requête avec des fonctions de fenêtre
+(SQLite >= 3.25 et PostgreSQL), qui retourne des lignes légères au lieu
+d'objets ORM. Nom, symbole et prix viennent de la table asset (un prix par
+symbole), jointe au moment de la lecture.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import select, case, func, or_
+
+PortfolioSummary = namedtuple('PortfolioSummary', [
+    'holdings', 'total_value', 'total_invested', 'total_profit_loss',
+    'profit_loss_percentage', 'best_performer', 'worst_performer'
+])
+
+EMPTY_SUMMARY = PortfolioSummary(0, 0, 0, 0, 0, None, None)
+
+
+def portfolio_rows(db, Holding, Asset, user_id, performers_only=False):
+    """Lignes du portefeuille avec valeurs calculées et totaux par fenêtre
+
+    Chaque ligne expose les mêmes noms que les propriétés du modèle Holding
+    (current_value, profit_loss, ...) plus total_value, total_invested,
+    holdings, best_rank et worst_rank. Avec performers_only, seules la
+    meilleure et la pire ligne sont retournées.
+    """
+    # Prix partagé du symbole
+    price = func.coalesce(Asset.current_price, 0)
+    current_value = price * Holding.quantity
+    invested_amount = Holding.quantity * Holding.purchase_price
+    has_performance = case((Holding.purchase_price > 0, 1), else_=0)
+    performance = case(
+        (Holding.purchase_price > 0, (price - Holding.purchase_price) / Holding.purchase_price * 100),
+        else_=0)
+
+    rows = select(
+        Holding.id,
+        func.coalesce(Asset.name, Asset.symbol).label('name'),
+        Asset.symbol,
+        Holding.quantity,
+        Holding.purchase_price,
+        price.label('current_price'),
+        func.coalesce(Asset.price_change_24h, 0).label('price_change_24h'),
+        current_value.label('current_value'),
+        invested_amount.label('invested_amount'),
+        ((price - Holding.purchase_price) * Holding.quantity).label('profit_loss'),
+        performance.label('profit_loss_percentage'),
+        has_performance.label('has_performance'),
+        func.count().over().label('holdings'),
+        func.sum(current_value).over().label('total_value'),
+        func.sum(invested_amount).over().label('total_invested'),
+        func.row_number().over(order_by=(has_performance.desc(), performance.desc())).label('best_rank'),
+        func.row_number().over(order_by=(has_performance.desc(), performance.asc())).label('worst_rank')
+    ).select_from(Holding).join(Asset, Asset.id == Holding.asset_id).where(
+        Holding.user_id == user_id).subquery()
+
+    query = select(rows).order_by(rows.c.id)
+    if performers_only:
+        query = query.where(or_(rows.c.best_rank == 1, rows.c.worst_rank == 1))
+    return db.session.execute(query).all()
+
+
+def summarize(rows):
+    """Construit le résumé du portefeuille à partir de portfolio_rows()"""
+    if not rows:
+        return EMPTY_SUMMARY
+
+    first = rows[0]
+    total_value = first.total_value or 0
+    total_invested = first.total_invested or 0
+    total_profit_loss = total_value - total_invested
+
+    best = worst = None
+    for row in rows:
+        if not row.has_performance:
+            continue
+        if row.best_rank == 1:
+            best = row
+        if row.worst_rank == 1:
+            worst = row
+
+    return PortfolioSummary(
+        holdings=first.holdings,
+        total_value=total_value,
+        total_invested=total_invested,
+        total_profit_loss=total_profit_loss,
+        profit_loss_percentage=(total_profit_loss / total_invested * 100) if total_invested > 0 else 0,
+        best_performer=best,
+        worst_performer=worst
+    )
+
+
+def portfolio_summary(db, Holding, Asset, user_id):
+    """Résumé du portefeuille d'un utilisateur (au plus deux lignes lues)"""
+    return summarize(portfolio_rows(db, Holding, Asset, user_id, performers_only=True))
@@ -0,0 +1,171 @@
+"""
+Historique de la valeur du portefeuille
+
+La courbe de valeur et de P&L d'un utilisateur est reconstruite en alignant,
+sur une même grille de temps, la quantité détenue de chaque actif (registre
+des transactions) et son prix (historique des prix), puis en sommant tous
+les actifs en une seule opération NumPy.
+"""
+
+from datetime import datetime, timezone
+
+from cost_basis import EPSILON
+from price_history import MAX_POINTS
+
+
+def _epoch(when):
+    """Timestamp epoch d'une date UTC naïve du registre (0 sans date)"""
+    return int(when.replace(tzinfo=timezone.utc).timestamp()) if when else 0
+
+
+def step_values(event_ts, cumulative, grid):
+    """Valeur d'une fonction en escalier (cumul d'événements) sur la grille"""
+    import numpy as np
+
+    if len(event_ts) == 0:
+        return np.zeros(len(grid))
+    idx = np.searchsorted(event_ts, grid, side='right') - 1
+    return np.where(idx >= 0, cumulative[np.clip(idx, 0, None)], 0.0)
+
+
+def align_prices(samples, grid):
+    """Prix alignés sur la grille (dernier prix connu, premier prix avant le début)"""
+    import numpy as np
+
+    if not samples:
+        return np.zeros(len(grid))
+    ts = np.fromiter((t for t, _ in samples), dtype=np.int64, count=len(samples))
+    prices = np.fromiter((p for _, p in samples), dtype=np.float64, count=len(samples))
+    idx = np.searchsorted(ts, grid, side='right') - 1
+    return prices[np.clip(idx, 0, None)]
+
+
+class PortfolioHistory:
+    """Calcule la valeur et le P&L d'un portefeuille dans le temps"""
+
+    def __init__(self, db, Holding, Asset, Transaction, price_history, cache=None):
+        self.db = db
+        self.Holding = Holding
+        self.Asset = Asset
+        self.Transaction = Transaction
+        self.price_history = price_history
+        self.cache = cache
+
+    def _positions(self, user_id):
+        """Événements par symbole: [(ts, delta quantité, delta flux de trésorerie)]
+
+        Tout le registre de l'utilisateur est rejoué par symbole, positions
+        retirées ou supprimées comprises (close_position détache leurs
+        transactions de la table holding). La quantité d'une position actuelle
+        absente du registre (antérieure au registre) entre à la création de
+        la position, avant ses transactions, au prix de revient des unités
+        sans lot; le reliquat d'une position supprimée sans vente sort à sa
+        dernière transaction, à son coût moyen.
+        """
+        Transaction = self.Transaction
+        Holding = self.Holding
+        Asset = self.Asset
+        events = {}
+        ledger = {}  # holding_id -> [premier ts, quantité nette, quantité et coût des lots ouverts]
+
+        rows = (self.db.session.query(Transaction.holding_id, Transaction.side, Transaction.quantity,
+                                      Transaction.price, Transaction.remaining_quantity,
+                                      Transaction.created_at, Transaction.symbol)
+                .filter(Transaction.user_id == user_id)
+                .order_by(Transaction.created_at, Transaction.id))
+        for holding_id, side, quantity, price, remaining, created_at, symbol in rows:
+            sign = 1 if side == 'buy' else -1
+            # Dates du registre en UTC naïf, timestamps de l'historique en epoch
+            ts = _epoch(created_at)
+            # Achat: le montant investi augmente; vente: il diminue
+            events.setdefault(symbol.upper(), []).append((ts, sign * quantity, sign * quantity * price))
+            if holding_id is not None:
+                entry = ledger.setdefault(holding_id, [ts, 0, 0, 0])
+                entry[1] += sign * quantity
+                if side == 'buy':
+                    entry[2] += remaining
+                    entry[3] += remaining * price
+
+        held = set()
+        holdings = (self.db.session.query(Holding.id, Asset.symbol, Holding.quantity, Holding.purchase_price,
+                                          Holding.created_at)
+                    .join(Asset, Asset.id == Holding.asset_id)
+                    .filter(Holding.user_id == user_id))
+        for holding_id, symbol, quantity, purchase_price, created_at in holdings:
+            held.add(symbol)
+            first_ts, net, open_quantity, open_cost = ledger.get(holding_id, (None, 0, 0, 0))
+            opening = quantity - net
+            if abs(opening) <= EPSILON:
+                continue
+            price = purchase_price or 0
+            unlotted = quantity - open_quantity
+            if unlotted > EPSILON:
+                price = max(price * quantity - open_cost, 0) / unlotted
+            ts = _epoch(created_at)
+            if first_ts is not None:
+                ts = min(ts, first_ts)
+            # Tri stable: l'ouverture passe avant les transactions de même date
+            events[symbol] = sorted([(ts, opening, opening * price)] + events.get(symbol, []),
+                                    key=lambda event: event[0])
+
+        for symbol, symbol_events in events.items():
+            if symbol in held:
+                continue
+            remaining = sum(event[1] for event in symbol_events)
+            if remaining > EPSILON:
+                bought = [event for event in symbol_events if event[1] > 0]
+                average = sum(event[2] for event in bought) / sum(event[1] for event in bought)
+                symbol_events.append((symbol_events[-1][0], -remaining, -remaining * average))
+        return events
+
+    def compute(self, user_id, start, end, bucket):
+        """Séries alignées: timestamps, valeur, montant investi net et P&L"""
+        import numpy as np
+
+        if (end - start) // bucket > MAX_POINTS:
+            raise ValueError(f"Trop de points demandés: {(end - start) // bucket} (maximum {MAX_POINTS})")
+        # Débuts de seaux, puis l'instant présent comme dernier point
+        grid = np.append(np.arange(start - start % bucket, end, bucket, dtype=np.int64), end)
+        events = self._positions(user_id)
+        if not events:
+            zeros = [0.0] * len(grid)
+            return {'timestamps': grid.tolist(), 'value': zeros, 'invested': zeros, 'profit_loss': zeros}
+
+        symbols = sorted(events)
+        # Prix depuis un seau avant le début pour initialiser la série
+        prices = self.price_history.downsample(symbols, int(grid[0]) - bucket, end, bucket=bucket)
+
+        quantities = np.empty((len(symbols), len(grid)))
+        price_matrix = np.empty((len(symbols), len(grid)))
+        invested = np.zeros(len(grid))
+        for row, symbol in enumerate(symbols):
+            symbol_events = np.array(events[symbol], dtype=np.float64)
+            event_ts = symbol_events[:, 0].astype(np.int64)
+            quantities[row] = step_values(event_ts, np.cumsum(symbol_events[:, 1]), grid)
+            invested += step_values(event_ts, np.cumsum(symbol_events[:, 2]), grid)
+            price_matrix[row] = align_prices(prices.get(symbol.upper(), []), grid)
+
+        # Somme de tous les actifs en une seule passe vectorisée
+        value = np.einsum('ij,ij->j', quantities, price_matrix)
+        profit_loss = value - invested
+
+        return {
+            'timestamps': grid.tolist(),
+            'value': np.round(value, 2).tolist(),
+            'invested': np.round(invested, 2).tolist(),
+            'profit_loss': np.round(profit_loss, 2).tolist()
+        }
+
+    def get(self, user_id, version, range_name, duration, bucket):
+        """Historique mis en cache par (utilisateur, plage, version du portefeuille)"""
+        key = f"{user_id}:{version}:{range_name}:{bucket}"
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached:
+                return cached[0]
+
+        end = int(datetime.now(timezone.utc).timestamp())
+        result = self.compute(user_id, end - duration, end, bucket)
+        if self.cache is not None:
+            self.cache.set(key, result)
+        return result
@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""
+Import et export en masse du portefeuille (CSV ou JSON)
+
+Les exports d'exchanges sont lus ligne par ligne (CSV, tableau JSON ou JSON
+Lines) sans que le fichier soit chargé en mémoire; seules les lignes
+normalisées sont gardées, pour être appliquées dans l'ordre chronologique
+(beaucoup d'exchanges exportent les plus récentes d'abord). Chaque ligne
+devient une transaction d'achat ou de vente: les lots et les agrégats des positions sont calculés en
+mémoire selon la méthode de prix de revient de la position (comme le moteur
+de prix de revient), les transactions sont insérées par paquets avec
+bulk_insert_mappings et les positions mises à jour en une fois à la fin.
+Les symboles sont résolus dans l'annuaire local; les prix sont récupérés en
+un seul appel groupé après l'import.
+
+L'export parcourt les positions par paquets et produit le fichier au fil de
+l'eau (réponse générée), sans construire le fichier en mémoire.
+"""
+
+import sys
+import os
+import io
+import csv
+import json
+import re
+from collections import namedtuple, deque
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func
+
+from cost_basis import EPSILON, InsufficientQuantityError
+
+# Nombre de transactions insérées par paquet
+IMPORT_CHUNK_SIZE = 5000
+# Nombre de positions lues par paquet à l'export
+EXPORT_CHUNK_SIZE = 1000
+# Taille des blocs lus dans un fichier JSON
+JSON_READ_SIZE = 64 * 1024
+# Nombre maximum d'erreurs détaillées dans le résultat d'un import
+MAX_REPORTED_ERRORS = 20
+# Longueur maximale d'un symbole (colonnes symbol des tables)
+MAX_SYMBOL_LENGTH = 10
+
+FORMATS = ('csv', 'json')
+EXPORT_FIELDS = ['symbol', 'name', 'quantity', 'price', 'current_price', 'realized_pnl', 'cost_method']
+
+# Noms de colonnes acceptés (en minuscules) pour chaque champ
+FIELD_ALIASES = {
+    'symbol': ('symbol', 'asset', 'coin', 'currency', 'ticker'),
+    'name': ('name',),
+    'quantity': ('quantity', 'amount', 'qty', 'size'),
+    'price': ('price', 'purchase_price', 'unit_price', 'rate'),
+    'side': ('side', 'type'),
+    'date': ('date', 'created_at', 'timestamp', 'time'),
+}
+SELL_SIDES = ('sell', 'vente', 'withdraw', 'retrait')
+# Précision ajoutée à une vente refusée quand les lignes n'ont pas toutes une date
+UNDATED_ORDER_HINT = ("lignes sans date appliquées dans l'ordre du fichier: "
+                      "placer les achats avant les ventes ou ajouter une colonne date")
+# Caractères retirés d'un montant: symboles de devise et espaces (milliers)
+NUMBER_NOISE = ('$', '€', '£', ' ', '\u00a0', '\u202f', "'")
+NUMBER_PATTERN = re.compile(r'([0-9.,]+)([eE][-+]?[0-9]+)?')
+
+ImportResult = namedtuple('ImportResult', ['rows', 'imported', 'skipped', 'symbols', 'errors'])
+
+
+# --- Lecture des fichiers ---
+
+def detect_format(filename=None, sample=''):
+    """Format d'un fichier d'après son extension, sinon son premier caractère"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension in ('json', 'jsonl', 'ndjson'):
+        return 'json'
+    if extension == 'csv':
+        return 'csv'
+    return 'json' if sample.lstrip()[:1] in ('[', '{') else 'csv'
+
+
+def iter_csv_rows(stream):
+    """Lignes d'un fichier CSV (dictionnaires), lues au fil de l'eau"""
+    sample = stream.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    stream = _Prepended(sample, stream)
+    for row in csv.DictReader(stream, dialect=dialect):
+        yield row
+
+
+def iter_json_rows(stream, read_size=JSON_READ_SIZE):
+    """Objets d'un tableau JSON ou d'un fichier JSON Lines, lus au fil de l'eau
+
+    Le fichier est lu par blocs; seuls les objets pas encore consommés
+    restent en mémoire.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        # Séparateurs entre objets: blancs, virgules et crochets du tableau
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                return
+            buffer, position = stream.read(read_size), 0
+            eof = not buffer
+            continue
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError(f"JSON invalide à la position {position}")
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if not isinstance(row, dict):
+            raise ValueError("Le fichier JSON doit contenir des objets")
+        yield row
+        position = end
+
+
+def iter_rows(stream, file_format):
+    """Lignes d'un fichier texte au format 'csv' ou 'json'"""
+    if file_format not in FORMATS:
+        raise ValueError(f"Format inconnu: {file_format}")
+    return iter_json_rows(stream) if file_format == 'json' else iter_csv_rows(stream)
+
+
+class _Prepended:
+    """Flux texte précédé d'un début déjà lu (détection du dialecte CSV)"""
+
+    def __init__(self, head, stream):
+        self._lines = io.StringIO(head)
+        self._stream = stream
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self._lines.readline()
+        if line and not line.endswith('\n'):
+            line += self._stream.readline()
+        if not line:
+            line = self._stream.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+# --- Normalisation des lignes ---
+
+def _field(row, field):
+    for alias in FIELD_ALIASES[field]:
+        value = row.get(alias)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _ungroup(text, separator, value):
+    """Partie entière sans ses séparateurs de milliers (groupes de 3 chiffres)"""
+    groups = text.split(separator)
+    if not 1 <= len(groups[0]) <= 3 or any(len(group) != 3 for group in groups[1:]):
+        raise ValueError(f"montant ambigu: {value}")
+    return ''.join(groups)
+
+
+def parse_number(value):
+    """Nombre d'un export (virgule ou point décimal, séparateurs de milliers, devise)
+
+    Avec une virgule et un point, le dernier des deux est le séparateur
+    décimal. Un séparateur seul suivi d'exactement trois chiffres (après 1 à
+    3 chiffres, hors '0') sépare les milliers: '1,000' vaut 1000, '1,5'
+    vaut 1.5. Lève ValueError pour un montant ambigu plutôt que de deviner.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    for char in NUMBER_NOISE:
+        text = text.replace(char, '')
+    sign = ''
+    if text[:1] in ('-', '+'):
+        sign, text = text[0], text[1:]
+    match = NUMBER_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError(f"montant invalide: {value}")
+    text, exponent = match.group(1), match.group(2) or ''
+
+    if ',' in text and '.' in text:
+        decimal = ',' if text.rfind(',') > text.rfind('.') else '.'
+        thousands = '.' if decimal == ',' else ','
+        if text.count(decimal) > 1:
+            raise ValueError(f"montant ambigu: {value}")
+        integer, fraction = text.split(decimal)
+        integer = _ungroup(integer, thousands, value)
+    elif ',' in text or '.' in text:
+        separator = ',' if ',' in text else '.'
+        parts = text.split(separator)
+        if len(parts) > 2:
+            integer, fraction = _ungroup(text, separator, value), ''
+        elif len(parts[1]) == 3 and 1 <= len(parts[0]) <= 3 and not parts[0].startswith('0'):
+            integer, fraction = parts[0] + parts[1], ''
+        else:
+            integer, fraction = parts
+    else:
+        integer, fraction = text, ''
+    if not integer and not fraction:
+        raise ValueError(f"montant invalide: {value}")
+    return float(f"{sign}{integer or '0'}.{fraction or '0'}{exponent}")
+
+
+def parse_date(value):
+    """Date naïve UTC à partir d'une date ISO 8601 ou d'un timestamp epoch"""
+    if value is None:
+        return None
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    if ts > 1e11:  # millisecondes
+        ts /= 1000
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+def normalize_row(raw):
+    """(symbole, nom, côté, quantité, prix, date) d'une ligne d'export
+
+    Les noms de colonnes sont insensibles à la casse; une quantité négative
+    est une vente. Lève ValueError pour une ligne invalide.
+    """
+    row = {str(key).strip().lower(): value for key, value in raw.items() if key is not None}
+    symbol = str(_field(row, 'symbol') or '').strip().upper()
+    if not symbol:
+        raise ValueError("symbole manquant")
+    if len(symbol) > MAX_SYMBOL_LENGTH:
+        raise ValueError(f"symbole trop long: {symbol}")
+
+    quantity = _field(row, 'quantity')
+    if quantity is None:
+        raise ValueError("quantité manquante")
+    quantity = parse_number(quantity)
+    price = parse_number(_field(row, 'price') or 0)
+    side = str(_field(row, 'side') or 'buy').strip().lower()
+    side = 'sell' if side in SELL_SIDES or quantity < 0 else 'buy'
+    quantity = abs(quantity)
+    if quantity <= 0:
+        raise ValueError("quantité nulle")
+    if price < 0:
+        raise ValueError("prix négatif")
+
+    name = _field(row, 'name')
+    return symbol, (str(name).strip() if name else None), side, quantity, price, parse_date(_field(row, 'date'))
+
+
+# --- Import ---
+
+class _Position:
+    """Agrégats et lots ouverts d'une position pendant un import"""
+
+    def __init__(self, holding_id, quantity, purchase_price, realized_pnl, method, lots, created=False):
+        self.holding_id = holding_id
+        self.created = created  # position ouverte par cet import
+        self.quantity = quantity
+        self.purchase_price = purchase_price
+        self.realized_pnl = realized_pnl
+        self.method = method
+        self.lots = deque(lots)  # lots d'achat ouverts, du plus ancien au plus récent
+
+    def buy(self, quantity, price):
+        cost = self.purchase_price * self.quantity + quantity * price
+        self.quantity += quantity
+        self.purchase_price = cost / self.quantity
+
+    def sell(self, quantity, price, consumed):
+        """Consomme les lots (FIFO ou LIFO) comme CostBasisEngine.sell, retourne le P&L réalisé"""
+        if quantity > self.quantity + EPSILON:
+            raise InsufficientQuantityError("Quantité insuffisante dans le portefeuille")
+
+        lots_cost = 0
+        to_consume = quantity
+        while to_consume > EPSILON and self.lots:
+            lot = self.lots[-1] if self.method == 'lifo' else self.lots[0]
+            taken = min(lot['remaining_quantity'], to_consume)
+            lot['remaining_quantity'] -= taken
+            lots_cost += taken * lot['price']
+            to_consume -= taken
+            consumed.append(lot)
+            if lot['remaining_quantity'] <= EPSILON:
+                self.lots.pop() if self.method == 'lifo' else self.lots.popleft()
+        lots_cost += max(to_consume, 0) * self.purchase_price
+
+        cost = self.purchase_price * quantity if self.method == 'average' else lots_cost
+        realized = quantity * price - cost
+        remaining_quantity = self.quantity - quantity
+        remaining_cost = self.purchase_price * self.quantity - cost
+        self.quantity = remaining_quantity
+        self.purchase_price = remaining_cost / remaining_quantity if remaining_quantity > EPSILON else 0
+        self.realized_pnl += realized
+        return realized
+
+
+class PortfolioImporter:
+    """Importe des transactions en masse dans le portefeuille d'un utilisateur"""
+
+    def __init__(self, cost_basis, coin_directory=None, fetch_prices=None, chunk_size=IMPORT_CHUNK_SIZE):
+        self.db = cost_basis.db
+        self.Holding = cost_basis.Holding
+        self.Asset = cost_basis.Asset
+        self.Transaction = cost_basis.Transaction
+        self.cost_basis = cost_basis
+        self.coin_directory = coin_directory
+        self.fetch_prices = fetch_prices  # appelée une fois avec tous les symboles importés
+        self.chunk_size = chunk_size
+
+    def _open_position(self, user_id, symbol, name):
+        """Position de l'utilisateur sur un symbole (créée si besoin), ou None si inconnu"""
+        Holding, Asset, Transaction = self.Holding, self.Asset, self.Transaction
+        session = self.db.session
+
+        asset = session.query(Asset).filter_by(symbol=symbol).first()
+        coin_id = self.coin_directory.resolve(symbol) if self.coin_directory else None
+        if asset is None:
+            # Annuaire chargé: un symbole qu'il ne connaît pas n'est pas une crypto
+            if (coin_id is None and self.coin_directory and len(self.coin_directory.index())
+                    and not self.coin_directory.knows(symbol)):
+                return None
+            asset = Asset(symbol=symbol, name=name, coin_id=coin_id, current_price=0, price_change_24h=0)
+            session.add(asset)
+            session.flush()
+        asset.name = asset.name or name
+        asset.coin_id = asset.coin_id or coin_id
+
+        holding = session.query(Holding).filter_by(user_id=user_id, asset_id=asset.id).first()
+        created = holding is None
+        if created:
+            holding = Holding(user_id=user_id, asset=asset, quantity=0, purchase_price=0, realized_pnl=0,
+                              cost_method=self.cost_basis.default_method, last_updated=datetime.now())
+            session.add(holding)
+            session.flush()
+
+        lots = [{'id': lot.id, 'remaining_quantity': lot.remaining_quantity, 'price': lot.price}
+                for lot in session.query(Transaction.id, Transaction.remaining_quantity, Transaction.price)
+                .filter(Transaction.holding_id == holding.id,
+                        Transaction.side == 'buy',
+                        Transaction.remaining_quantity > EPSILON)
+                .order_by(Transaction.id)]
+        return _Position(holding.id, holding.quantity or 0, holding.purchase_price or 0,
+                         holding.realized_pnl or 0, holding.cost_method or self.cost_basis.default_method, lots,
+                         created)
+
+    def _insert(self, mappings):
+        # return_defaults: les lots insérés reçoivent leur id (mis à jour s'ils sont consommés plus tard)
+        self.db.session.bulk_insert_mappings(self.Transaction, mappings, return_defaults=True)
+        mappings.clear()
+
+    def import_rows(self, user_id, rows):
+        """Importe des lignes d'export, retourne un ImportResult
+
+        Les lignes sont appliquées par date croissante quand toutes les lignes
+        valides en ont une (l'ordre du fichier départage les dates égales),
+        sinon dans l'ordre du fichier. Une ligne invalide (ou une vente
+        supérieure à la quantité détenue) est ignorée et signalée; le reste de
+        l'import est enregistré en une seule transaction.
+        """
+        positions = {}
+        accepted = set()  # symboles avec au moins une ligne importée
+        unknown = set()
+        pending = []    # transactions à insérer
+        consumed = {}   # lots déjà insérés dont la quantité restante a changé
+        errors = []
+        count = imported = 0
+        now = datetime.utcnow()
+
+        def reject(line, message):
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"Ligne {line}: {message}")
+
+        parsed = []
+        for line, raw in enumerate(rows, start=1):
+            count += 1
+            try:
+                parsed.append((line, normalize_row(raw)))
+            except (ValueError, TypeError) as e:
+                reject(line, e)
+        by_date = all(row[5] is not None for _, row in parsed)
+        if by_date:
+            parsed.sort(key=lambda item: item[1][5])
+
+        try:
+            for line, (symbol, name, side, quantity, price, when) in parsed:
+                if symbol in unknown:
+                    reject(line, f"symbole inconnu: {symbol}")
+                    continue
+
+                position = positions.get(symbol)
+                if position is None:
+                    position = self._open_position(user_id, symbol, name or symbol)
+                    if position is None:
+                        unknown.add(symbol)
+                        reject(line, f"symbole inconnu: {symbol}")
+                        continue
+                    positions[symbol] = position
+
+                transaction = {
+                    'user_id': user_id,
+                    'holding_id': position.holding_id,
+                    'symbol': symbol,
+                    'side': side,
+                    'quantity': quantity,
+                    'price': price,
+                    'remaining_quantity': 0,
+                    'realized_pnl': 0,
+                    'created_at': when or now
+                }
+                if side == 'buy':
+                    position.buy(quantity, price)
+                    transaction['remaining_quantity'] = quantity
+                    position.lots.append(transaction)
+                else:
+                    lots = []
+                    try:
+                        transaction['realized_pnl'] = position.sell(quantity, price, lots)
+                    except InsufficientQuantityError as e:
+                        reject(line, e if by_date else f"{e} ({UNDATED_ORDER_HINT})")
+                        continue
+                    for lot in lots:
+                        if 'id' in lot:
+                            consumed[lot['id']] = lot
+                pending.append(transaction)
+                accepted.add(symbol)
+                imported += 1
+
+                if len(pending) >= self.chunk_size:
+                    self._insert(pending)
+            self._insert(pending)
+
+            # Positions ouvertes pour des lignes toutes rejetées: supprimées sans historique
+            rejected = [position.holding_id for symbol, position in positions.items()
+                        if symbol not in accepted and position.created]
+            if rejected:
+                self.Holding.query.filter(self.Holding.id.in_(rejected)).delete(synchronize_session=False)
+            positions = {symbol: position for symbol, position in positions.items() if symbol in accepted}
+
+            self.db.session.bulk_update_mappings(self.Transaction, [
+                {'id': lot['id'], 'remaining_quantity': lot['remaining_quantity']}
+                for lot in consumed.values()])
+            self.db.session.bulk_update_mappings(self.Holding, [{
+                'id': position.holding_id,
+                'quantity': position.quantity,
+                'purchase_price': position.purchase_price,
+                'realized_pnl': position.realized_pnl,
+                'last_updated': datetime.now()
+            } for position in positions.values()])
+
+            # Positions entièrement vendues: supprimées comme par un retrait
+            closed = [position.holding_id for position in positions.values() if position.quantity <= EPSILON]
+            if closed:
+                for holding in self.Holding.query.filter(self.Holding.id.in_(closed)):
+                    self.cost_basis.close_position(holding)
+                    self.db.session.delete(holding)
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+        # Un seul appel groupé pour les prix de tous les symboles importés
+        if self.fetch_prices and positions:
+            self.fetch_prices(sorted(positions))
+
+        return ImportResult(count, imported, count - imported, sorted(positions), errors)
+
+    def import_file(self, user_id, stream, file_format):
+        """Importe un flux texte au format 'csv' ou 'json'"""
+        return self.import_rows(user_id, iter_rows(stream, file_format))
+
+
+# --- Export ---
+
+def export_rows(db, Holding, Asset, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """Positions d'un utilisateur, lues par paquets (champs EXPORT_FIELDS)"""
+    query = select(
+        Asset.symbol,
+        func.coalesce(Asset.name, Asset.symbol).label('name'),
+        Holding.quantity,
+        Holding.purchase_price.label('price'),
+        func.coalesce(Asset.current_price, 0).label('current_price'),
+        func.coalesce(Holding.realized_pnl, 0).label('realized_pnl'),
+        Holding.cost_method
+    ).join(Asset, Asset.id == Holding.asset_id).where(Holding.user_id == user_id).order_by(Asset.symbol)
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for row in result:
+        yield row._asdict()
+
+
+def generate_csv(rows):
+    """Fichier CSV produit ligne par ligne"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= JSON_READ_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_json(rows):
+    """Tableau JSON produit objet par objet"""
+    separator = '[\n'
+    for row in rows:
+        yield separator + json.dumps(row)
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+def generate_export(rows, file_format):
+    if file_format not in FORMATS:
+        raise ValueError(f"Format inconnu: {file_format}")
+    return generate_json(rows) if file_format == 'json' else generate_csv(rows)
+
+
+if __name__ == '__main__':
+    # Ajouter le repertoire courant au path pour les imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from app import app, db, User, Holding, Asset, portfolio_importer, touch_portfolio
+
+    command = sys.argv[1].lower() if len(sys.argv) > 1 else None
+    with app.app_context():
+        user = User.query.filter_by(username=sys.argv[2]).first() if len(sys.argv) > 3 else None
+        if command in ('import', 'export') and user is None:
+            print("Utilisateur inconnu" if len(sys.argv) > 3 else "Arguments manquants")
+            sys.exit(1)
+
+        if command == 'import':
+            path = sys.argv[3]
+            file_format = sys.argv[4] if len(sys.argv) > 4 else detect_format(path)
+            started = datetime.now()
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = portfolio_importer.import_file(user.id, stream, file_format)
+            touch_portfolio(user)
+            db.session.commit()
+            print(f"{result.imported}/{result.rows} lignes importees ({len(result.symbols)} symboles) "
+                  f"en {(datetime.now() - started).total_seconds():.1f}s")
+            for error in result.errors:
+                print(f"   - {error}")
+        elif command == 'export':
+            path = sys.argv[3]
+            file_format = sys.argv[4] if len(sys.argv) > 4 else detect_format(path)
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                for chunk in generate_export(export_rows(db, Holding, Asset, user.id), file_format):
+                    output.write(chunk)
+            print(f"Portefeuille de {user.username} exporte dans {path}")
+        else:
+            print("Usage:")
+            print("  python portfolio_io.py import <utilisateur> <fichier> [csv|json]   - Importer des transactions")
+            print("  python portfolio_io.py export <utilisateur> <fichier> [csv|json]   - Exporter les positions")
@@ -0,0 +1,162 @@
+"""
+Historique des prix pour l'application Portefeuille Crypto
+
+Un échantillon (symbole, timestamp, prix) est ajouté à chaque
+rafraîchissement dans une table étroite indexée par (symbole, ts). Les
+requêtes par plage et le sous-échantillonnage (1m/1h/1d) sont faits par la
+base avec un GROUP BY sur ts / taille du seau. Les anciens échantillons
+bruts peuvent être compactés en moyennes horaires.
+"""
+
+import re
+import time
+from itertools import groupby
+from operator import itemgetter
+
+from sqlalchemy import select, func, insert
+
+# Tailles de seaux disponibles (secondes)
+INTERVALS = {
+    '1m': 60,
+    '5m': 300,
+    '1h': 3600,
+    '1d': 86400
+}
+
+DURATION_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'y': 365 * 86400}
+
+# Plage maximale d'une requête d'historique et nombre maximal de points
+MAX_DURATION = 5 * DURATION_UNITS['y']
+MAX_POINTS = 2000
+
+
+def parse_duration(value, maximum=MAX_DURATION):
+    """Convertit '90d', '24h', '1y'... en secondes (ValueError au-delà de maximum)"""
+    match = re.fullmatch(r'(\d+)([mhdwy])', (value or '').strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Durée invalide: {value}")
+    duration = int(match.group(1)) * DURATION_UNITS[match.group(2)]
+    if duration > maximum:
+        raise ValueError(f"Durée trop longue: {value} (maximum {maximum // DURATION_UNITS['d']} jours)")
+    return duration
+
+
+def bounded_interval(duration, interval=None):
+    """Intervalle demandé (ou par défaut), élargi pour rester sous MAX_POINTS points
+
+    Lève ValueError pour un intervalle inconnu.
+    """
+    interval = interval or default_interval(duration)
+    if interval not in INTERVALS:
+        raise ValueError(f"Intervalle invalide: {interval}")
+    for name, bucket in sorted(INTERVALS.items(), key=lambda item: item[1]):
+        if bucket >= INTERVALS[interval] and duration // bucket <= MAX_POINTS:
+            return name
+    return max(INTERVALS, key=INTERVALS.get)
+
+
+def default_interval(duration):
+    """Taille de seau adaptée à une plage (quelques centaines de points au plus)"""
+    if duration <= 6 * 3600:
+        return '1m'
+    if duration <= 2 * 86400:
+        return '5m'
+    if duration <= 30 * 86400:
+        return '1h'
+    return '1d'
+
+
+class PriceHistory:
+    """Stockage et lecture des séries de prix"""
+
+    def __init__(self, db, PricePoint):
+        self.db = db
+        self.PricePoint = PricePoint
+
+    def _insert_ignore(self, connection, rows):
+        table = self.PricePoint.__table__
+        dialect = connection.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            connection.execute(insert(table), rows)
+            return
+        connection.execute(dialect_insert(table).on_conflict_do_nothing(), rows)
+
+    def append(self, prices, ts=None):
+        """Ajoute un échantillon par symbole (dict symbole -> {'price': ...})
+
+        L'écriture utilise sa propre transaction pour ne pas interférer avec
+        la session de la requête en cours.
+        """
+        ts = int(ts or time.time())
+        rows = [{'symbol': symbol, 'ts': ts, 'price': info['price']}
+                for symbol, info in prices.items() if info.get('price')]
+        if not rows:
+            return 0
+        with self.db.engine.begin() as connection:
+            self._insert_ignore(connection, rows)
+        return len(rows)
+
+    def points(self, symbol, start, end=None):
+        """Échantillons bruts [(ts, prix)] d'un symbole sur une plage"""
+        PricePoint = self.PricePoint
+        query = (select(PricePoint.ts, PricePoint.price)
+                 .where(PricePoint.symbol == symbol.upper(), PricePoint.ts >= start)
+                 .order_by(PricePoint.ts))
+        if end is not None:
+            query = query.where(PricePoint.ts <= end)
+        return [tuple(row) for row in self.db.session.execute(query)]
+
+    def downsample(self, symbols, start, end=None, bucket=3600):
+        """Prix moyen par seau pour plusieurs symboles en une requête
+
+        Retourne {symbole: [(début du seau, prix moyen), ...]}.
+        """
+        PricePoint = self.PricePoint
+        bucket_start = ((PricePoint.ts // bucket) * bucket).label('bucket')
+        query = (select(PricePoint.symbol, bucket_start, func.avg(PricePoint.price))
+                 .where(PricePoint.symbol.in_([s.upper() for s in symbols]),
+                        PricePoint.ts >= start)
+                 .group_by(PricePoint.symbol, bucket_start)
+                 .order_by(PricePoint.symbol, bucket_start))
+        if end is not None:
+            query = query.where(PricePoint.ts <= end)
+
+        # Exécution Core: pas de chargement ORM pour des milliers de lignes
+        series = {}
+        for symbol, rows in groupby(self.db.session.connection().execute(query), key=itemgetter(0)):
+            series[symbol] = [(int(bucket_ts), price) for _, bucket_ts, price in rows]
+        return series
+
+    def compact(self, before, bucket=3600, since=0):
+        """Remplace les échantillons de [since, before[ par leur moyenne par seau
+
+        Les bornes sont alignées sur la taille du seau, pour que chaque seau
+        compacté soit entièrement compris dans la plage.
+        """
+        since -= since % bucket
+        before -= before % bucket
+        table = self.PricePoint.__table__
+        bucket_start = ((table.c.ts // bucket) * bucket).label('bucket')
+        with self.db.engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.symbol, bucket_start, func.avg(table.c.price), func.count())
+                .where(table.c.ts >= since, table.c.ts < before)
+                .group_by(table.c.symbol, bucket_start)
+            ).all()
+            # Seaux déjà compactés (un seul échantillon aligné): rien à faire
+            rows = [row for row in rows if row[3] > 1]
+            removed = 0
+            for symbol, start, _, _ in rows:
+                removed += connection.execute(
+                    table.delete().where(table.c.symbol == symbol,
+                                         table.c.ts >= start,
+                                         table.c.ts < start + bucket)).rowcount
+            if rows:
+                connection.execute(insert(table), [
+                    {'symbol': symbol, 'ts': int(start), 'price': price}
+                    for symbol, start, price, _ in rows])
+        return removed - len(rows)
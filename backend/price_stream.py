@@ -0,0 +1,194 @@
+"""
+Diffusion des prix en direct (Server-Sent Events)
+
+Un seul éditeur par processus récupère, à chaque cycle, les prix de l'union
+des symboles suivis par les clients connectés (une seule lecture par
+symbole quel que soit le nombre de navigateurs ouverts), puis réveille les
+abonnés dont un symbole a changé. L'instantané du marché est diffusé sur le
+même flux (événement 'market') quand son ETag change: les pages n'ont plus
+à interroger /api/market_data périodiquement. Les abonnés attendent sur une
+condition: avec des workers gevent, chaque connexion inactive ne coûte
+qu'une greenlet.
+"""
+
+import json
+import threading
+import time
+
+# Intervalle entre deux cycles de l'éditeur (secondes)
+DEFAULT_INTERVAL = 30
+# Commentaire SSE envoyé aux connexions inactives (proxies, détection de coupure)
+HEARTBEAT = 15
+# Délai de reconnexion suggéré au navigateur (millisecondes)
+RECONNECT_DELAY = 5000
+# Entrées de l'instantané du marché diffusées (le tableau de bord en affiche 8)
+MARKET_ENTRIES = 10
+
+
+def format_event(event, data, event_id=None):
+    """Message SSE au format texte"""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def _events(version, prices, market):
+    """Messages SSE d'un instantané: marché puis prix modifiés"""
+    if market is not None:
+        yield format_event('market', market, version)
+    if prices:
+        yield format_event('prices', prices, version)
+
+
+class PricePublisher:
+    """Éditeur de prix unique, partagé par tous les flux SSE du processus"""
+
+    def __init__(self, app, fetch_prices, interval=DEFAULT_INTERVAL, fetch_market=None):
+        self.app = app
+        self.fetch_prices = fetch_prices
+        self.fetch_market = fetch_market  # retourne (etag, entrées) de l'instantané du marché, ou None
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._prices = {}       # symbole -> dernier prix publié
+        self._versions = {}     # symbole -> version de la dernière modification
+        self._version = 0
+        self._subscribers = {}  # symbole -> nombre de flux abonnés
+        self._streams = 0
+        self._market = None     # (version, etag, entrées) du dernier instantané publié
+        self._thread = None
+        self._wake = threading.Event()
+
+    # --- Abonnements ---
+
+    def subscribe(self, symbols):
+        """Enregistre un flux pour des symboles, démarre l'éditeur si besoin"""
+        symbols = {s.upper() for s in symbols}
+        with self._condition:
+            self._streams += 1
+            for symbol in symbols:
+                self._subscribers[symbol] = self._subscribers.get(symbol, 0) + 1
+            missing = bool(symbols - set(self._prices))
+        self.start()
+        if missing:
+            # Nouveau symbole: cycle immédiat plutôt qu'au prochain intervalle
+            self._wake.set()
+        return symbols
+
+    def unsubscribe(self, symbols):
+        with self._condition:
+            self._streams -= 1
+            for symbol in symbols:
+                count = self._subscribers.get(symbol, 0) - 1
+                if count > 0:
+                    self._subscribers[symbol] = count
+                else:
+                    self._subscribers.pop(symbol, None)
+
+    def subscribed_symbols(self):
+        with self._condition:
+            return sorted(self._subscribers)
+
+    # --- Publication ---
+
+    def publish(self, prices):
+        """Publie des prix (dict symbole -> {'price', 'change_24h'}), retourne les symboles modifiés"""
+        updates = {symbol.upper(): {'price': info['price'], 'change_24h': info.get('change_24h', 0)}
+                   for symbol, info in prices.items() if info.get('price')}
+        with self._condition:
+            changed = [symbol for symbol, update in updates.items() if self._prices.get(symbol) != update]
+            if changed:
+                self._version += 1
+                for symbol in changed:
+                    self._prices[symbol] = updates[symbol]
+                    self._versions[symbol] = self._version
+                self._condition.notify_all()
+        return changed
+
+    def publish_market(self, etag, entries):
+        """Publie l'instantané du marché s'il a changé, retourne True dans ce cas"""
+        with self._condition:
+            if self._market and self._market[1] == etag:
+                return False
+            self._version += 1
+            self._market = (self._version, etag, entries[:MARKET_ENTRIES])
+            self._condition.notify_all()
+        return True
+
+    def snapshot(self, symbols, since=0):
+        """(version, prix des symboles modifiés depuis 'since', marché modifié depuis 'since' ou None)"""
+        with self._condition:
+            market = self._market[2] if self._market and self._market[0] > since else None
+            return self._version, {symbol: self._prices[symbol] for symbol in symbols
+                                   if self._versions.get(symbol, 0) > since}, market
+
+    def wait(self, symbols, since, timeout):
+        """Attend une publication touchant l'un des symboles ou le marché, retourne snapshot()"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                version, changes, market = self.snapshot(symbols, since)
+                remaining = deadline - time.monotonic()
+                if changes or market is not None or remaining <= 0:
+                    return version, changes, market
+                self._condition.wait(remaining)
+
+    # --- Boucle de l'éditeur ---
+
+    def run_once(self):
+        """Récupère en un appel les prix de tous les symboles suivis et les publie,
+        puis l'instantané du marché s'il a changé"""
+        with self._condition:
+            if not self._streams:
+                return []
+        symbols = self.subscribed_symbols()
+        changed = []
+        with self.app.app_context():
+            if symbols:
+                changed = self.publish(self.fetch_prices(symbols))
+            market = self.fetch_market() if self.fetch_market else None
+        if market:
+            self.publish_market(*market)
+        return changed
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                self.app.logger.error(f"Erreur diffusion des prix: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        """Démarre le thread de l'éditeur (une seule fois par processus)"""
+        with self._condition:
+            if self._thread and self._thread.is_alive():
+                return self._thread
+            self._thread = threading.Thread(target=self._loop, name='price-publisher', daemon=True)
+            self._thread.start()
+            return self._thread
+
+    # --- Flux SSE ---
+
+    def stream(self, symbols, max_duration=None, heartbeat=HEARTBEAT):
+        """Générateur de messages SSE pour un client
+
+        Envoie d'abord les prix connus, puis seulement les changements. La
+        connexion est fermée après max_duration secondes; EventSource se
+        reconnecte de lui-même.
+        """
+        symbols = self.subscribe(symbols)
+        started = time.monotonic()
+        try:
+            yield f"retry: {RECONNECT_DELAY}\n\n"
+            version, prices, market = self.snapshot(symbols)
+            yield from _events(version, prices, market)
+            while max_duration is None or time.monotonic() - started < max_duration:
+                version, prices, market = self.wait(symbols, version, heartbeat)
+                if prices or market is not None:
+                    yield from _events(version, prices, market)
+                else:
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(symbols)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Worker d'ingestion des prix pour l'application Portefeuille Crypto
+
+Garde à jour les prix (table asset) de tous les symboles détenus (table
+holding) ou surveillés par une alerte active, afin que les routes HTTP lisent des prix déjà stockés au lieu
+d'attendre l'API CoinGecko. Peut tourner comme processus séparé ou comme thread
+dans l'application.
+"""
+
+import sys
+import os
+import time
+import threading
+from datetime import datetime
+
+from sqlalchemy import func, select, case
+
+# Intervalle de rafraîchissement par défaut (secondes)
+DEFAULT_INTERVAL = 60
+# Symboles par requête UPDATE (limite de paramètres SQLite)
+UPDATE_CHUNK_SIZE = 150
+
+
+def store_prices(db, Asset, prices):
+    """Enregistre les prix dans la table asset, partagée par tous les utilisateurs
+
+    Une seule requête UPDATE ... WHERE symbol IN (...) par paquet de
+    symboles, quel que soit le nombre d'utilisateurs qui les détiennent; les
+    symboles encore inconnus sont insérés. Les prix nuls (échec de
+    récupération) sont ignorés pour ne pas écraser le dernier prix connu.
+    L'écriture utilise sa propre transaction.
+    """
+    updates = {symbol.upper(): info for symbol, info in prices.items() if info.get('price')}
+    if not updates:
+        return 0
+
+    table = Asset.__table__
+    now = datetime.now()
+    symbols = list(updates)
+    with db.engine.begin() as connection:
+        for start in range(0, len(symbols), UPDATE_CHUNK_SIZE):
+            chunk = symbols[start:start + UPDATE_CHUNK_SIZE]
+            existing = set(connection.execute(
+                select(table.c.symbol).where(table.c.symbol.in_(chunk))).scalars())
+            if existing:
+                connection.execute(table.update().where(table.c.symbol.in_(existing)).values(
+                    current_price=case({s: updates[s]['price'] for s in existing}, value=table.c.symbol),
+                    price_change_24h=case({s: updates[s].get('change_24h') or 0 for s in existing},
+                                          value=table.c.symbol),
+                    updated_at=now))
+            missing = [s for s in chunk if s not in existing]
+            if missing:
+                connection.execute(table.insert(), [{
+                    'symbol': s,
+                    'current_price': updates[s]['price'],
+                    'price_change_24h': updates[s].get('change_24h') or 0,
+                    'updated_at': now
+                } for s in missing])
+    return len(updates)
+
+
+class PriceIngestionWorker:
+    """Rafraîchit périodiquement les prix de tous les symboles détenus ou suivis"""
+
+    def __init__(self, app, db, Holding, Asset, fetch_prices, interval=DEFAULT_INTERVAL, on_update=None,
+                 extra_symbols=None):
+        self.app = app
+        self.db = db
+        self.Holding = Holding
+        self.Asset = Asset
+        self.fetch_prices = fetch_prices
+        self.interval = interval
+        self.on_update = on_update  # appelée avec les prix de chaque cycle (diffusion en direct)
+        self.extra_symbols = extra_symbols  # symboles suivis sans être détenus (alertes)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._tasks = []  # tâches périodiques: [nom, fonction, intervalle, prochaine exécution]
+
+    def add_task(self, name, fn, interval):
+        """Ajoute une tâche exécutée toutes les 'interval' secondes dans la boucle du worker"""
+        self._tasks.append([name, fn, interval, 0])
+
+    def run_tasks(self):
+        """Exécute les tâches périodiques arrivées à échéance"""
+        now = time.time()
+        for task in self._tasks:
+            name, fn, interval, next_run = task
+            if now < next_run:
+                continue
+            task[3] = now + interval
+            try:
+                with self.app.app_context():
+                    fn()
+            except Exception as e:
+                self.app.logger.error(f"Erreur tâche {name}: {e}")
+
+    def symbols_by_popularity(self):
+        """Liste des symboles détenus, du plus détenu au moins détenu"""
+        holders = func.count(self.Holding.id)
+        rows = (self.db.session.query(self.Asset.symbol, holders)
+                .join(self.Holding, self.Holding.asset_id == self.Asset.id)
+                .group_by(self.Asset.symbol)
+                .order_by(holders.desc(), self.Asset.symbol)
+                .all())
+        return [symbol for symbol, _ in rows]
+
+    def symbols_to_refresh(self):
+        """Symboles détenus (du plus détenu au moins détenu), puis les symboles suivis"""
+        symbols = self.symbols_by_popularity()
+        if self.extra_symbols:
+            held = set(symbols)
+            symbols += [symbol for symbol in self.extra_symbols() if symbol not in held]
+        return symbols
+
+    def run_once(self):
+        """Exécute un cycle de rafraîchissement, retourne le nombre de symboles mis à jour"""
+        with self.app.app_context():
+            symbols = self.symbols_to_refresh()
+            if not symbols:
+                return 0
+            # fetch_prices enregistre lui-même les prix récupérés (store_prices)
+            prices = self.fetch_prices(symbols, use_cache=False)
+            updated = sum(1 for info in prices.values() if info.get('price'))
+            if self.on_update:
+                self.on_update(prices)
+            return updated
+
+    def _loop(self):
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                count = self.run_once()
+                self.app.logger.info(f"Worker prix: {count} symboles mis à jour")
+            except Exception as e:
+                self.app.logger.error(f"Erreur worker prix: {e}")
+            self.run_tasks()
+            remaining = self.interval - (time.time() - started)
+            self._wake.wait(max(remaining, 0))
+            self._wake.clear()
+
+    def wake(self):
+        """Demande un rafraîchissement immédiat"""
+        self._wake.set()
+
+    def start(self):
+        """Démarre le worker dans un thread de l'application"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='price-worker', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Arrête le thread du worker"""
+        self._stop.set()
+        self._wake.set()
+
+    def run_forever(self):
+        """Boucle bloquante pour l'exécution comme processus séparé"""
+        try:
+            self._loop()
+        except KeyboardInterrupt:
+            print("Worker arrete.")
+
+
+if __name__ == '__main__':
+    # Ajouter le repertoire courant au path pour les imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from app import price_worker as worker
+
+    interval = worker.interval
+
+    if len(sys.argv) > 1 and sys.argv[1].lower() == 'once':
+        print(f"{worker.run_once()} symboles mis a jour")
+    elif len(sys.argv) > 1 and sys.argv[1].lower() == 'run':
+        print(f"Worker prix demarre (intervalle: {interval}s)")
+        worker.run_forever()
+    else:
+        print("Usage:")
+        print("  python price_worker.py run     - Rafraichir les prix en continu")
+        print("  python price_worker.py once    - Executer un seul cycle")
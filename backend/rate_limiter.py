@@ -0,0 +1,178 @@
+"""
+Limiteur de débit à seau de jetons (token bucket) pour les appels API
+
+Chaque endpoint amont a son propre budget (nombre d'appels par période).
+L'état des seaux peut être gardé en mémoire (un processus) ou dans un
+fichier SQLite partagé, pour que tous les workers gunicorn respectent
+ensemble le quota CoinGecko au lieu de le multiplier.
+
+Les jetons sont réservés à l'avance: un appelant qui doit attendre connaît
+immédiatement son délai, ce qui évite les réveils inutiles et garantit que
+le débit total ne dépasse jamais le budget.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+
+DEFAULT_BUDGET = 'default'
+
+
+def parse_budgets(spec):
+    """Convertit 'search=10/60,default=30/60' en {endpoint: (appels, période)}"""
+    budgets = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        endpoint, budget = item.split('=')
+        calls, period = budget.split('/')
+        budgets[endpoint.strip()] = (float(calls), float(period))
+    if DEFAULT_BUDGET not in budgets:
+        raise ValueError("Le budget 'default' doit être défini")
+    return budgets
+
+
+def _take(available, updated_at, now, capacity, rate, tokens, max_wait):
+    """Calcule la réservation: retourne (jetons restants, attente) ou None"""
+    available = min(capacity, available + (now - updated_at) * rate)
+    if available >= tokens:
+        return available - tokens, 0.0
+    wait = (tokens - available) / rate
+    if max_wait is not None and wait > max_wait:
+        return None
+    # Réserve le jeton: le solde devient négatif jusqu'au remplissage
+    return available - tokens, wait
+
+
+class MemoryBucketStore:
+    """État des seaux en mémoire, protégé par un verrou"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key, capacity, rate, tokens, max_wait):
+        now = time.time()
+        with self._lock:
+            available, updated_at = self._buckets.get(key, (capacity, now))
+            result = _take(available, updated_at, now, capacity, rate, tokens, max_wait)
+            if result is None:
+                return None
+            self._buckets[key] = (result[0], now)
+            return result[1]
+
+
+class SQLiteBucketStore:
+    """État des seaux partagé entre processus via un fichier SQLite"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute('''CREATE TABLE IF NOT EXISTS rate_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )''')
+
+    def _connect(self):
+        # Une connexion par thread, jamais héritée d'un processus parent (fork gunicorn)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def reserve(self, key, capacity, rate, tokens, max_wait):
+        conn = self._connect()
+        # BEGIN IMMEDIATE verrouille en écriture: un seul processus à la fois
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?',
+                               (key,)).fetchone()
+            available, updated_at = row if row else (capacity, now)
+            result = _take(available, updated_at, now, capacity, rate, tokens, max_wait)
+            if result is not None:
+                conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) '
+                             'VALUES (?, ?, ?)', (key, result[0], now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return None if result is None else result[1]
+
+
+class RateLimiter:
+    """Limiteur à seau de jetons avec un budget par endpoint amont"""
+
+    def __init__(self, budgets, store=None):
+        self.budgets = budgets
+        self.store = store or MemoryBucketStore()
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def _budget(self, endpoint):
+        key = endpoint if endpoint in self.budgets else DEFAULT_BUDGET
+        calls, period = self.budgets[key]
+        return key, calls, calls / period
+
+    def reserve(self, endpoint, tokens=1, max_wait=None):
+        """Réserve des jetons, retourne le délai à attendre ou None si refusé"""
+        key, capacity, rate = self._budget(endpoint)
+        return self.store.reserve(key, capacity, rate, tokens, max_wait)
+
+    def _record(self, endpoint, waited, acquired):
+        with self._metrics_lock:
+            stats = self._metrics.setdefault(endpoint, {
+                'acquired': 0, 'rejected': 0, 'wait_seconds': 0.0})
+            stats['acquired' if acquired else 'rejected'] += 1
+            stats['wait_seconds'] += waited
+
+    def acquire(self, endpoint=DEFAULT_BUDGET, tokens=1, blocking=True, timeout=None):
+        """Acquiert des jetons en bloquant au plus 'timeout' secondes
+
+        En mode non bloquant, retourne False immédiatement si aucun jeton
+        n'est disponible.
+        """
+        wait = self.reserve(endpoint, tokens, max_wait=timeout if blocking else 0)
+        if wait is None:
+            self._record(endpoint, 0.0, False)
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        self._record(endpoint, wait, True)
+        return True
+
+    async def acquire_async(self, endpoint=DEFAULT_BUDGET, tokens=1, timeout=None):
+        """Variante asyncio de acquire(), sans bloquer la boucle d'événements"""
+        wait = self.reserve(endpoint, tokens, max_wait=timeout)
+        if wait is None:
+            self._record(endpoint, 0.0, False)
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record(endpoint, wait, True)
+        return True
+
+    def stats(self):
+        """Statistiques par endpoint: jetons acquis, refus, temps d'attente cumulé"""
+        with self._metrics_lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._metrics.items()}
+
+
+def create_rate_limiter(spec, backend='memory', path=None):
+    """Construit un limiteur à partir d'une spécification de budgets"""
+    budgets = parse_budgets(spec)
+    if backend == 'memory':
+        return RateLimiter(budgets, MemoryBucketStore())
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("Le backend 'sqlite' nécessite un chemin de fichier")
+        return RateLimiter(budgets, SQLiteBucketStore(path))
+    raise ValueError(f"Backend de rate limiting inconnu: {backend}")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Rapports d'administration pour l'application Portefeuille Crypto
+
+Chaque rapport est une seule requête d'agrégation (GROUP BY / jointures
+externes) dont les lignes sont lues par paquets avec yield_per (curseur
+côté serveur sous PostgreSQL): la mémoire reste constante quel que soit le
+nombre de lignes, et les résultats sont écrits au fur et à mesure.
+"""
+
+import sys
+import os
+import csv
+import contextlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, literal, union_all
+
+# Lignes lues par paquet
+YIELD_PER = 1000
+
+
+def _stream(db, query, yield_per=YIELD_PER):
+    """Exécute une requête et retourne ses lignes par paquets"""
+    return db.session.execute(query.execution_options(yield_per=yield_per))
+
+
+def table_counts(db, *models):
+    """Nombre de lignes de chaque table, en une requête: {table: nombre}"""
+    counts = [select(literal(model.__tablename__).label('table'), func.count().label('rows'))
+              .select_from(model) for model in models]
+    return dict(db.session.execute(union_all(*counts)).all())
+
+
+def holdings_per_user(db, User, Holding, Asset):
+    """Nombre de positions et valeur par utilisateur (utilisateurs sans position inclus)"""
+    value = func.coalesce(func.sum(Holding.quantity * func.coalesce(Asset.current_price, 0)), 0)
+    query = (select(User.id, User.username, User.email,
+                    func.count(Holding.id).label('holdings'),
+                    value.label('value'))
+             .select_from(User)
+             .outerjoin(Holding, Holding.user_id == User.id)
+             .outerjoin(Asset, Asset.id == Holding.asset_id)
+             .group_by(User.id, User.username, User.email)
+             .order_by(User.id))
+    return _stream(db, query)
+
+
+def aum_by_symbol(db, Holding, Asset):
+    """Encours total (quantité détenue x prix) par symbole, du plus grand au plus petit"""
+    quantity = func.sum(Holding.quantity)
+    aum = quantity * func.coalesce(Asset.current_price, 0)
+    query = (select(Asset.symbol, Asset.name,
+                    func.count(Holding.id).label('holders'),
+                    quantity.label('quantity'),
+                    Asset.current_price,
+                    aum.label('aum'))
+             .select_from(Asset)
+             .join(Holding, Holding.asset_id == Asset.id)
+             .group_by(Asset.id, Asset.symbol, Asset.name, Asset.current_price)
+             .order_by(aum.desc(), Asset.symbol))
+    return _stream(db, query)
+
+
+def stale_prices(db, Holding, Asset, max_age):
+    """Actifs détenus dont le prix manque ou date de plus de max_age (timedelta)"""
+    threshold = datetime.now() - max_age
+    held = select(Holding.id).where(Holding.asset_id == Asset.id).exists()
+    query = (select(Asset.symbol, Asset.coin_id, Asset.current_price, Asset.updated_at)
+             .where(held,
+                    (Asset.updated_at.is_(None)) | (Asset.updated_at < threshold)
+                    | (func.coalesce(Asset.current_price, 0) <= 0))
+             .order_by(Asset.updated_at.asc(), Asset.symbol))
+    return _stream(db, query)
+
+
+def orphan_rows(db, User, Holding, Asset, Transaction):
+    """Lignes qui référencent une ligne disparue: (table, id, colonne, valeur)"""
+    def missing(model, column, parent, parent_column):
+        exists = select(parent_column).where(parent_column == column).exists()
+        return (select(literal(model.__tablename__).label('table'), model.id.label('id'),
+                       literal(column.key).label('column'), column.label('value'))
+                .where(column.is_not(None), ~exists))
+
+    query = union_all(
+        missing(Holding, Holding.user_id, User, User.id),
+        missing(Holding, Holding.asset_id, Asset, Asset.id),
+        missing(Transaction, Transaction.user_id, User, User.id),
+        missing(Transaction, Transaction.holding_id, Holding, Holding.id),
+    )
+    return _stream(db, query)
+
+
+REPORTS = {
+    'users': "Positions et valeur par utilisateur",
+    'aum': "Encours par symbole",
+    'stale': "Prix manquants ou périmés des actifs détenus",
+    'orphans': "Lignes orphelines",
+}
+
+
+def run_report(name, db, User, Holding, Asset, Transaction, max_age=timedelta(hours=1)):
+    """Lignes d'un rapport de REPORTS"""
+    if name == 'users':
+        return holdings_per_user(db, User, Holding, Asset)
+    if name == 'aum':
+        return aum_by_symbol(db, Holding, Asset)
+    if name == 'stale':
+        return stale_prices(db, Holding, Asset, max_age)
+    if name == 'orphans':
+        return orphan_rows(db, User, Holding, Asset, Transaction)
+    raise ValueError(f"Rapport inconnu: {name}")
+
+
+def write_csv(result, output):
+    """Écrit les lignes d'un rapport en CSV au fur et à mesure, retourne leur nombre"""
+    writer = csv.writer(output)
+    writer.writerow(result.keys())
+    count = 0
+    for row in result:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    # Ajouter le repertoire courant au path pour les imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    # Les messages du démarrage de l'application ne doivent pas se mêler au CSV
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import app, db, User, Holding, Asset, Transaction
+
+    if len(sys.argv) > 1 and sys.argv[1].lower() in REPORTS:
+        max_age = timedelta(minutes=int(sys.argv[2])) if len(sys.argv) > 2 else timedelta(hours=1)
+        with app.app_context():
+            result = run_report(sys.argv[1].lower(), db, User, Holding, Asset, Transaction, max_age)
+            count = write_csv(result, sys.stdout)
+        print(f"{count} lignes", file=sys.stderr)
+    else:
+        print("Usage:")
+        for name, description in REPORTS.items():
+            print(f"  python reports.py {name:<20} - {description} (CSV)")
+        print("  python reports.py stale <minutes>     - Prix de plus de <minutes> (defaut: 60)")
@@ -0,0 +1,98 @@
+"""
+Cache des réponses rendues pour l'application Portefeuille Crypto
+
+Les pages en lecture seule (tableau de bord, analytics, retrait) sont
+mises en cache par (route, paramètres, utilisateur, version du portefeuille,
+devise, époque des prix). La version du portefeuille change à chaque
+ajout, suppression ou retrait; l'époque des prix à chaque rafraîchissement
+effectif des prix ou des taux de change. Une page en cache reste donc
+exacte et est servie sans requête SQL ni rendu Jinja (hors chargement de
+l'utilisateur de la session).
+
+Le cache est borné (LRU en mémoire ou table SQLite partagée entre workers,
+voir cache.py) et chaque route l'active explicitement avec le décorateur
+cached(). Les réponses ne sont ni lues ni écrites quand des messages flash
+sont en attente: ils sont affichés par la page et ne doivent être ni
+perdus ni rejoués. Les en-têtes de la réponse sont rejoués avec elle, sauf
+les cookies.
+"""
+
+import time
+from functools import wraps
+
+from flask import request, session, make_response, Response
+
+from cache import FRESH
+
+EPOCH_KEY = 'price_epoch'
+# L'époque des prix reste valable jusqu'au prochain rafraîchissement
+EPOCH_TTL = 365 * 24 * 3600
+# En-têtes propres à une réponse, jamais rejoués (cookies, longueur recalculée)
+UNCACHED_HEADERS = ('set-cookie', 'content-length')
+
+
+class PriceEpoch:
+    """Horodatage du dernier rafraîchissement des prix, partagé via le cache"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._local = 0
+
+    def current(self):
+        cached = self.cache.get(EPOCH_KEY)
+        return cached[0] if cached else self._local
+
+    def bump(self):
+        """Invalide toutes les réponses calculées avec les prix précédents"""
+        # Un horodatage plutôt qu'un compteur: pas de lecture-écriture entre processus
+        self._local = max(time.time(), self._local + 1e-6)
+        self.cache.set(EPOCH_KEY, self._local, ttl=EPOCH_TTL)
+        return self._local
+
+
+class ResponseCache:
+    """Cache de réponses GET, activé route par route
+
+    vary: fonction appelée dans la requête qui retourne les éléments de clé
+    propres à l'utilisateur (id, version du portefeuille, devise...), ou
+    None pour ne pas utiliser le cache (utilisateur anonyme).
+    """
+
+    def __init__(self, cache, epoch, vary, enabled=True):
+        self.cache = cache
+        self.epoch = epoch
+        self.vary = vary
+        self.enabled = enabled
+
+    def key(self, parts):
+        query = request.query_string.decode('latin-1')
+        return ':'.join(str(part) for part in (request.endpoint, query, *parts, self.epoch.current()))
+
+    def cached(self, view):
+        """Décorateur: sert la réponse en cache de la route si elle est à jour"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            parts = self.vary()
+            if parts is None:
+                return view(*args, **kwargs)
+
+            key = self.key(parts)
+            cached = self.cache.get(key)
+            if cached and cached[1] == FRESH:
+                status, headers, body = cached[0]
+                return Response(body, status=status, headers=headers)
+
+            response = make_response(view(*args, **kwargs))
+            # La vue a pu ajouter des messages flash, rendus au prochain affichage
+            if (response.status_code == 200 and not response.direct_passthrough
+                    and not session.get('_flashes')):
+                headers = [[name, value] for name, value in response.headers.items()
+                           if name.lower() not in UNCACHED_HEADERS]
+                self.cache.set(key, [response.status_code, headers, response.get_data(as_text=True)])
+            return response
+        return wrapper
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,140 @@
+"""
+Analyse de risque du portefeuille
+
+Les prix journaliers de l'historique sont alignés dans une matrice
+(actifs × jours), d'où sont tirés les rendements, la volatilité, la
+matrice de covariance/corrélation, le drawdown maximum, le ratio de Sharpe
+et la VaR (historique et paramétrique). Tous les calculs sont vectorisés
+avec NumPy; le portefeuille est pondéré par les quantités actuelles.
+"""
+
+from datetime import datetime, timezone
+from statistics import NormalDist
+
+from portfolio_history import align_prices
+
+DAY = 86400
+# Les cryptomonnaies cotent tous les jours
+PERIODS_PER_YEAR = 365
+
+
+def returns_matrix(prices):
+    """Rendements simples d'une matrice de prix (actifs × dates)"""
+    return prices[:, 1:] / prices[:, :-1] - 1
+
+
+def max_drawdown(values):
+    """Plus forte baisse depuis un sommet (fraction négative ou nulle)"""
+    import numpy as np
+
+    if len(values) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(values)
+    drawdowns = np.where(peaks > 0, values / np.where(peaks > 0, peaks, 1) - 1, 0)
+    return float(drawdowns.min())
+
+
+def value_at_risk(returns, value, confidence):
+    """VaR historique et paramétrique sur une période, en montant positif"""
+    import numpy as np
+
+    historical = -np.percentile(returns, (1 - confidence) * 100) * value
+    z = NormalDist().inv_cdf(1 - confidence)
+    parametric = -(returns.mean() + z * returns.std(ddof=1)) * value
+    return max(float(historical), 0.0), max(float(parametric), 0.0)
+
+
+class RiskEngine:
+    """Calcule les indicateurs de risque d'un portefeuille"""
+
+    def __init__(self, db, Holding, Asset, price_history, cache=None, risk_free_rate=0.0):
+        self.db = db
+        self.Holding = Holding
+        self.Asset = Asset
+        self.price_history = price_history
+        self.cache = cache
+        self.risk_free_rate = risk_free_rate
+
+    def _holdings(self, user_id):
+        """Quantité détenue par symbole"""
+        Holding = self.Holding
+        Asset = self.Asset
+        rows = (self.db.session.query(Asset.symbol, Holding.quantity)
+                .join(Asset, Asset.id == Holding.asset_id)
+                .filter(Holding.user_id == user_id, Holding.quantity > 0))
+        return dict(rows.all())
+
+    def compute(self, user_id, start, end, confidence=0.95):
+        """Indicateurs de risque sur [start, end] à partir des prix journaliers"""
+        import numpy as np
+
+        quantities = self._holdings(user_id)
+        start -= start % DAY
+        grid = np.arange(start, end, DAY, dtype=np.int64)
+        series = self.price_history.downsample(list(quantities), start, end, bucket=DAY) if quantities else {}
+
+        # Actifs sans historique exclus de l'analyse
+        symbols = sorted(symbol for symbol in quantities if series.get(symbol))
+        result = {
+            'symbols': symbols,
+            'excluded': sorted(set(quantities) - set(symbols)),
+            'observations': 0,
+            'confidence': confidence
+        }
+        if not symbols or len(grid) < 3:
+            return result
+
+        prices = np.vstack([align_prices(series[symbol], grid) for symbol in symbols])
+        qty = np.array([quantities[symbol] for symbol in symbols])
+        # Ne garder que les jours où tous les actifs ont déjà un prix
+        prices = prices[:, grid >= max(series[symbol][0][0] for symbol in symbols)]
+        if prices.shape[1] < 3:
+            return result
+
+        returns = returns_matrix(prices)
+        values = qty @ prices
+        weights = qty * prices[:, -1] / values[-1] if values[-1] > 0 else np.zeros(len(symbols))
+        portfolio_returns = returns_matrix(values[np.newaxis, :])[0]
+
+        covariance = np.atleast_2d(np.cov(returns, ddof=1))
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = covariance / np.outer(std, std)
+        correlation = np.nan_to_num(correlation)
+
+        annual = np.sqrt(PERIODS_PER_YEAR)
+        portfolio_volatility = float(np.sqrt(weights @ covariance @ weights) * annual)
+        mean_return = float(portfolio_returns.mean() * PERIODS_PER_YEAR)
+        sharpe = ((mean_return - self.risk_free_rate) / portfolio_volatility
+                  if portfolio_volatility > 0 else 0.0)
+        var_historical, var_parametric = value_at_risk(portfolio_returns, float(values[-1]), confidence)
+
+        result.update({
+            'observations': int(returns.shape[1]),
+            'portfolio_value': round(float(values[-1]), 2),
+            'weights': np.round(weights, 4).tolist(),
+            'volatility': np.round(std * annual, 4).tolist(),
+            'portfolio_volatility': round(portfolio_volatility, 4),
+            'annual_return': round(mean_return, 4),
+            'sharpe_ratio': round(sharpe, 3),
+            'max_drawdown': round(max_drawdown(values), 4),
+            'var_historical': round(var_historical, 2),
+            'var_parametric': round(var_parametric, 2),
+            'covariance': np.round(covariance, 8).tolist(),
+            'correlation': np.round(correlation, 3).tolist()
+        })
+        return result
+
+    def get(self, user_id, version, window_name, window, confidence=0.95):
+        """Indicateurs mis en cache par (utilisateur, version du portefeuille, fenêtre)"""
+        key = f"{user_id}:{version}:{window_name}:{confidence}"
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached:
+                return cached[0]
+
+        end = int(datetime.now(timezone.utc).timestamp())
+        result = self.compute(user_id, end - window, end, confidence)
+        if self.cache is not None:
+            self.cache.set(key, result)
+        return result
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'évaluation des alertes de prix (hors ligne)
+
+Ajoute N alertes (au-dessus, en dessous, variation) réparties sur l'univers
+du faux CoinGecko à une copie d'une base générée par seed_db.py, puis
+mesure la construction de l'index, des cycles d'évaluation sans
+déclenchement et un cycle où les prix bougent de --move %, avec envoi des
+déclenchements au récepteur de webhooks local.
+
+Usage:
+    python bench_alerts.py --db data/users-1k.db [--alerts 1000000] [--move 5] [--cycles 5]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import webhook_stub
+from fake_coingecko import COINS, coin_price
+from harness import load_app
+from seed_db import insert_chunks
+
+
+def seed_alerts(webapp, count, users, rng):
+    """Insère des alertes dont les seuils encadrent le prix actuel"""
+    now = datetime.now()
+    kinds = ('above', 'below', 'move')
+
+    def alerts():
+        for _ in range(count):
+            coin = rng.choice(COINS)
+            price = coin_price(coin)
+            kind = rng.choice(kinds)
+            if kind == 'above':
+                threshold = price * rng.uniform(1.001, 1.5)
+            elif kind == 'below':
+                threshold = price * rng.uniform(0.5, 0.999)
+            else:
+                threshold = rng.uniform(1, 50)
+            yield {'user_id': rng.randint(1, users), 'symbol': coin['symbol'], 'kind': kind,
+                   'threshold': threshold, 'reference_price': price, 'active': True, 'created_at': now}
+
+    with webapp.app.app_context(), webapp.db.engine.begin() as connection:
+        return insert_chunks(connection, webapp.PriceAlert.__table__, alerts())
+
+
+def prices(factor=1.0):
+    return {coin['symbol']: {'price': coin_price(coin) * factor, 'change_24h': 0} for coin in COINS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des alertes de prix")
+    parser.add_argument('--db', required=True, help="base générée par seed_db.py (copiée avant le test)")
+    parser.add_argument('--alerts', type=int, default=1000000, help="nombre d'alertes ajoutées")
+    parser.add_argument('--cycles', type=int, default=5, help="cycles d'évaluation sans déclenchement")
+    parser.add_argument('--move', type=float, default=5, help="variation des prix du dernier cycle (%%)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='crypto-alerts-')
+    database = os.path.join(workdir, 'bench.db')
+    shutil.copy(args.db, database)
+    server, stub = webhook_stub.start()
+    webapp = load_app(database, ALERT_WEBHOOK_URL=f'http://127.0.0.1:{server.server_port}/alerts',
+                      PRICE_CACHE_PATH=os.path.join(workdir, 'price_cache.db'),
+                      RATE_LIMIT_PATH=os.path.join(workdir, 'rate_limit.db'))
+    engine = webapp.alert_engine
+    try:
+        with webapp.app.app_context():
+            users = webapp.User.query.count()
+        started = time.perf_counter()
+        inserted = seed_alerts(webapp, args.alerts, users, random.Random(args.seed))
+        print(f"{inserted} alertes inserees en {time.perf_counter() - started:.1f}s")
+
+        with webapp.app.app_context():
+            started = time.perf_counter()
+            engine.index.refresh()
+            print(f"Index construit en {time.perf_counter() - started:.2f}s "
+                  f"({len(engine.index)} seuils, {len(COINS)} symboles)")
+
+            timings = []
+            for _ in range(args.cycles):
+                started = time.perf_counter()
+                engine.evaluate(prices())
+                timings.append(time.perf_counter() - started)
+            print(f"Cycle sans declenchement: {min(timings) * 1000:.2f} ms (min), "
+                  f"{max(timings) * 1000:.2f} ms (max)")
+
+            started = time.perf_counter()
+            matched = engine.index.match(prices(1 + args.move / 100))
+            match_time = time.perf_counter() - started
+            started = time.perf_counter()
+            events = engine.claim(matched)
+            claim_time = time.perf_counter() - started
+            started = time.perf_counter()
+            engine.notify(events)
+            notify_time = time.perf_counter() - started
+            print(f"Prix +{args.move}%: {len(events)} alertes declenchees - recherche {match_time * 1000:.1f} ms, "
+                  f"desactivation {claim_time * 1000:.1f} ms, notifications {notify_time * 1000:.1f} ms")
+
+        for notifier in engine.notifiers:
+            if hasattr(notifier, 'join'):
+                notifier.join()
+        print(f"Webhook: {stub.stats()['requests']} requetes, {stub.stats()['alerts']} alertes recues")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Serveur CoinGecko local pour les benchmarks (aucun accès réseau)
+
+Sert des réponses figées et déterministes pour /simple/price, /search,
+/coins/markets, /coins/list et /exchange_rates, avec une latence
+configurable et l'injection de réponses 429. /__stats retourne le nombre
+d'appels reçus par endpoint.
+
+Usage:
+    python fake_coingecko.py [--port 8999] [--latency 0.1] [--jitter 0.05] [--rate-429 0.02]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Quelques vrais coins en tête (recherche réaliste), puis des coins générés
+KNOWN_COINS = [
+    ('bitcoin', 'BTC', 'Bitcoin'), ('ethereum', 'ETH', 'Ethereum'), ('tether', 'USDT', 'Tether'),
+    ('binancecoin', 'BNB', 'BNB'), ('solana', 'SOL', 'Solana'), ('ripple', 'XRP', 'XRP'),
+    ('cardano', 'ADA', 'Cardano'), ('dogecoin', 'DOGE', 'Dogecoin'), ('polkadot', 'DOT', 'Polkadot'),
+    ('chainlink', 'LINK', 'Chainlink'), ('litecoin', 'LTC', 'Litecoin'), ('avalanche-2', 'AVAX', 'Avalanche'),
+    ('uniswap', 'UNI', 'Uniswap'), ('stellar', 'XLM', 'Stellar'), ('bitcoin-cash', 'BCH', 'Bitcoin Cash'),
+]
+COIN_COUNT = 500
+FIAT_RATES = {'usd': 60000, 'eur': 55000, 'gbp': 47000, 'cad': 82000, 'chf': 53000, 'jpy': 9000000}
+
+
+def build_coins(count=COIN_COUNT):
+    """Univers des coins: [{'id', 'symbol', 'name', 'rank'}], partagé avec seed_db.py"""
+    coins = [{'id': coin_id, 'symbol': symbol, 'name': name}
+             for coin_id, symbol, name in KNOWN_COINS]
+    for i in range(len(coins), count):
+        coins.append({'id': f'token-{i}', 'symbol': f'T{i:03d}', 'name': f'Token {i}'})
+    for rank, coin in enumerate(coins, start=1):
+        coin['rank'] = rank
+    return coins
+
+
+COINS = build_coins()
+COINS_BY_ID = {coin['id']: coin for coin in COINS}
+
+
+def coin_price(coin):
+    """Prix déterministe, qui varie lentement avec le temps (toutes les minutes)"""
+    base = 60000 / coin['rank'] ** 1.5
+    step = int(time.time() // 60)
+    return round(base * (1 + 0.01 * ((step + coin['rank']) % 7 - 3)), 6)
+
+
+class FakeCoinGecko:
+    """Comportement du serveur (latence, 429) et compteurs d'appels"""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.random = random.Random(seed)
+        self.calls = {}
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def record(self, path):
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            return self.random.random() < self.rate_429, self.random.uniform(-self.jitter, self.jitter)
+
+    def stats(self):
+        with self._lock:
+            return {'calls': dict(self.calls), 'total': sum(self.calls.values()),
+                    'rate_limited': self.rate_limited}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.rate_limited = 0
+
+    # --- Réponses ---
+
+    def simple_price(self, query):
+        ids = query.get('ids', [''])[0].split(',')
+        currencies = query.get('vs_currencies', ['usd'])[0].split(',')
+        body = {}
+        for coin_id in ids:
+            coin = COINS_BY_ID.get(coin_id)
+            if coin is None:
+                continue
+            price = coin_price(coin)
+            body[coin_id] = {}
+            for currency in currencies:
+                rate = FIAT_RATES.get(currency, FIAT_RATES['usd']) / FIAT_RATES['usd']
+                body[coin_id][currency] = price * rate
+                body[coin_id][f'{currency}_24h_change'] = (coin['rank'] % 11) - 5.0
+        return body
+
+    def search(self, query):
+        text = query.get('query', [''])[0].lower()
+        matches = [coin for coin in COINS
+                   if coin['symbol'].lower().startswith(text) or coin['name'].lower().startswith(text)]
+        return {'coins': [{'id': coin['id'], 'name': coin['name'], 'symbol': coin['symbol'],
+                           'market_cap_rank': coin['rank'], 'thumb': ''} for coin in matches[:25]]}
+
+    def markets(self, query):
+        per_page = int(query.get('per_page', ['100'])[0])
+        page = int(query.get('page', ['1'])[0])
+        coins = COINS[(page - 1) * per_page:page * per_page]
+        return [{'id': coin['id'], 'symbol': coin['symbol'].lower(), 'name': coin['name'], 'image': '',
+                 'current_price': coin_price(coin), 'price_change_percentage_24h': (coin['rank'] % 11) - 5.0,
+                 'market_cap': 1e12 / coin['rank'], 'total_volume': 1e10 / coin['rank'],
+                 'market_cap_rank': coin['rank']} for coin in coins]
+
+    def coins_list(self, query):
+        return [{'id': coin['id'], 'symbol': coin['symbol'].lower(), 'name': coin['name']} for coin in COINS]
+
+    def exchange_rates(self, query):
+        rates = {'btc': {'name': 'Bitcoin', 'unit': 'BTC', 'value': 1, 'type': 'crypto'}}
+        for currency, value in FIAT_RATES.items():
+            rates[currency] = {'name': currency.upper(), 'unit': currency.upper(), 'value': value, 'type': 'fiat'}
+        return {'rates': rates}
+
+    def route(self, path):
+        return {
+            'simple/price': self.simple_price,
+            'search': self.search,
+            'coins/markets': self.markets,
+            'coins/list': self.coins_list,
+            'exchange_rates': self.exchange_rates,
+        }.get(path)
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # connexions persistantes, comme l'API réelle
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = url.path.strip('/')
+            # Préfixe éventuel de l'URL de base (/api/v3/...)
+            if path.startswith('api/v3/'):
+                path = path[len('api/v3/'):]
+            if path == '__stats':
+                return self._send(200, fake.stats())
+
+            handler = fake.route(path)
+            limited, jitter = fake.record(path)
+            delay = max(fake.latency + jitter, 0)
+            if delay:
+                time.sleep(delay)
+            if handler is None:
+                return self._send(404, {'error': 'not found'})
+            if limited:
+                with fake._lock:
+                    fake.rate_limited += 1
+                return self._send(429, {'status': {'error_code': 429}}, {'Retry-After': '1'})
+            self._send(200, handler(parse_qs(url.query)))
+
+    return Handler
+
+
+def start(port=0, latency=0.0, jitter=0.0, rate_429=0.0, seed=None):
+    """Démarre le serveur dans un thread, retourne (serveur, FakeCoinGecko)"""
+    fake = FakeCoinGecko(latency, jitter, rate_429, seed)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-coingecko', daemon=True).start()
+    return server, fake
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serveur CoinGecko local pour les benchmarks")
+    parser.add_argument('--port', type=int, default=8999)
+    parser.add_argument('--latency', type=float, default=0.0, help="latence par appel (secondes)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="variation aléatoire de la latence (secondes)")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="proportion de réponses 429 (0 à 1)")
+    args = parser.parse_args()
+
+    server, fake = start(args.port, args.latency, args.jitter, args.rate_429)
+    print(f"Faux CoinGecko sur http://127.0.0.1:{server.server_port} (COINGECKO_API_URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sys.exit(0)
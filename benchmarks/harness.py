@@ -0,0 +1,44 @@
+"""
+Chargement de l'application pour les benchmarks
+
+La configuration de l'application est lue dans l'environnement à l'import:
+l'environnement du benchmark (base, URL du faux CoinGecko, ...) est donc
+appliqué avant d'importer backend/app.py.
+"""
+
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+BACKEND_DIR = os.path.join(REPO_ROOT, 'backend')
+DATA_DIR = os.path.join(BENCHMARKS_DIR, 'data')
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, 'baselines')
+
+# Mot de passe de tous les utilisateurs des bases générées
+PASSWORD = 'benchmark'
+
+
+def load_app(database_path, **env):
+    """Importe backend/app.py sur une base SQLite, retourne le module"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(database_path)}'
+    # Pas de thread de fond sauf demande explicite
+    os.environ.setdefault('PRICE_INGESTION_MODE', 'external')
+    os.environ.setdefault('FLASK_DEBUG', '0')
+    for name, value in env.items():
+        if value is not None:
+            os.environ[name] = str(value)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import app as webapp
+
+    # Schéma créé explicitement (l'import ne touche pas à la base), worker
+    # de prix démarré seulement en mode 'thread'
+    webapp.migrate_database()
+    webapp.start_background()
+
+    # Templates et fichiers statiques à la racine du dépôt
+    webapp.app.template_folder = os.path.join(REPO_ROOT, 'templates')
+    webapp.app.static_folder = os.path.join(REPO_ROOT, 'static')
+    return webapp
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de charge de l'application Portefeuille Crypto (hors ligne)
+
+L'application tourne dans ce processus (serveur werkzeug multi-thread) sur
+une copie d'une base générée par seed_db.py, face au faux CoinGecko local.
+Des clients concurrents, connectés chacun avec un utilisateur différent,
+rejouent des scénarios et les latences p50/p95/p99 et le débit sont
+mesurés par scénario et par étape.
+
+Les résultats peuvent être enregistrés comme référence (baselines/) puis
+comparés: une hausse du p95 au-delà de la tolérance est signalée comme
+régression (code de sortie 1).
+
+Usage:
+    python run.py --db data/users-1k.db [--scenarios dashboard,analytics] [--concurrency 8]
+                  [--iterations 50] [--latency 0.05] [--rate-429 0.0]
+                  [--save-baseline nom] [--compare nom] [--tolerance 0.2]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+import fake_coingecko
+from harness import BASELINES_DIR, PASSWORD, load_app
+
+SEARCH_QUERIES = ['bitcoin', 'ethereum', 'solana', 'token 4', 'cardano']
+
+
+# --- Scénarios: liste d'étapes (nom, méthode, chemin, données) par itération ---
+
+def dashboard(rng):
+    return [('index', 'GET', '/', None),
+            ('portfolio_stats', 'GET', '/api/portfolio_stats', None)]
+
+
+def refresh_prices(rng):
+    return [('refresh_prices', 'POST', '/refresh_prices', None)]
+
+
+def search_typing(rng):
+    """Frappe d'une recherche: une requête par caractère à partir du deuxième"""
+    query = rng.choice(SEARCH_QUERIES)
+    return [('search_crypto', 'POST', '/search_crypto', {'query': query[:length]})
+            for length in range(2, len(query) + 1)]
+
+
+def analytics(rng):
+    return [('analytics', 'GET', '/analytics', None),
+            ('portfolio_history', 'GET', '/api/portfolio_history?range=30d', None),
+            ('portfolio_risk', 'GET', '/api/portfolio_risk?window=90d', None)]
+
+
+SCENARIOS = {
+    'dashboard': dashboard,
+    'refresh_prices': refresh_prices,
+    'search': search_typing,
+    'analytics': analytics,
+}
+
+
+# --- Statistiques ---
+
+def summarize(latencies, errors, elapsed):
+    """p50/p95/p99 (millisecondes) et débit (requêtes par seconde)"""
+    summary = {'requests': len(latencies), 'errors': errors,
+               'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0}
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        summary.update(p50=cuts[49], p95=cuts[94], p99=cuts[98], mean=statistics.fmean(latencies))
+    elif latencies:
+        summary.update(p50=latencies[0], p95=latencies[0], p99=latencies[0], mean=latencies[0])
+    for key in ('p50', 'p95', 'p99', 'mean'):
+        if key in summary:
+            summary[key] = round(summary[key] * 1000, 2)
+    return summary
+
+
+# --- Exécution ---
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Pas de journal d'accès pendant les mesures"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Client:
+    """Utilisateur virtuel: une session HTTP connectée"""
+
+    def __init__(self, base_url, username):
+        self.base_url = base_url
+        self.session = requests.Session()
+        response = self.session.post(f'{base_url}/login', data={'username': username, 'password': PASSWORD},
+                                     allow_redirects=False)
+        if response.status_code != 302:
+            raise RuntimeError(f"Connexion impossible pour {username} ({response.status_code})")
+
+    def request(self, method, path, data):
+        started = time.perf_counter()
+        if method == 'GET':
+            response = self.session.get(self.base_url + path, allow_redirects=False)
+        elif data is not None:
+            response = self.session.post(self.base_url + path, json=data, allow_redirects=False)
+        else:
+            response = self.session.post(self.base_url + path, allow_redirects=False)
+        return time.perf_counter() - started, response.status_code < 400
+
+
+def run_scenario(name, clients, iterations, warmup, seed):
+    """Exécute un scénario avec un thread par client, retourne son résumé"""
+    build_steps = SCENARIOS[name]
+    steps = {}   # étape -> latences
+    errors = {}
+    lock = threading.Lock()
+
+    def worker(index, client):
+        rng = random.Random(seed + index)
+        for iteration in range(warmup + iterations):
+            for step, method, path, data in build_steps(rng):
+                latency, ok = client.request(method, path, data)
+                if iteration < warmup:
+                    continue
+                with lock:
+                    steps.setdefault(step, []).append(latency)
+                    if not ok:
+                        errors[step] = errors.get(step, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(index, client)) for index, client in enumerate(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [latency for latencies in steps.values() for latency in latencies]
+    summary = summarize(all_latencies, sum(errors.values()), elapsed)
+    summary['steps'] = {step: summarize(latencies, errors.get(step, 0), elapsed)
+                        for step, latencies in sorted(steps.items())}
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """Compare le p95 de chaque scénario à la référence, retourne les régressions"""
+    regressions = []
+    for name, summary in results['scenarios'].items():
+        reference = baseline['scenarios'].get(name)
+        if not reference or not reference.get('p95') or 'p95' not in summary:
+            continue
+        ratio = summary['p95'] / reference['p95']
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        print(f"   {name:16} p95 {reference['p95']:9.2f} -> {summary['p95']:9.2f} ms  "
+              f"({(ratio - 1) * 100:+.1f}%)  debit {reference['throughput']} -> {summary['throughput']} req/s  "
+              f"{status}")
+        if status != 'ok':
+            regressions.append(name)
+    return regressions
+
+
+def print_summary(name, summary):
+    print(f"{name}: {summary['requests']} requetes, {summary['errors']} erreurs, "
+          f"{summary['throughput']} req/s, p50 {summary.get('p50')} ms, "
+          f"p95 {summary.get('p95')} ms, p99 {summary.get('p99')} ms")
+    for step, stats in summary['steps'].items():
+        print(f"   - {step:18} p50 {stats.get('p50')} ms, p95 {stats.get('p95')} ms, p99 {stats.get('p99')} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de charge hors ligne")
+    parser.add_argument('--db', required=True, help="base générée par seed_db.py (copiée avant le test)")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"scénarios séparés par des virgules ({', '.join(SCENARIOS)})")
+    parser.add_argument('--concurrency', type=int, default=8, help="clients simultanés")
+    parser.add_argument('--iterations', type=int, default=20, help="itérations mesurées par client")
+    parser.add_argument('--warmup', type=int, default=1, help="itérations non mesurées par client")
+    parser.add_argument('--latency', type=float, default=0.05, help="latence du faux CoinGecko (secondes)")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0, help="proportion de 429 du faux CoinGecko")
+    parser.add_argument('--mode', default='inline', help="PRICE_INGESTION_MODE de l'application")
+    parser.add_argument('--rate-limits', default='default=100000/1', help="RATE_LIMITS de l'application")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--save-baseline', metavar='NOM', help="enregistre les résultats comme référence")
+    parser.add_argument('--compare', metavar='NOM', help="compare à une référence enregistrée")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="hausse du p95 tolérée (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"scénarios inconnus: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix='crypto-bench-')
+    database = os.path.join(workdir, 'bench.db')
+    shutil.copy(args.db, database)
+
+    server, fake = fake_coingecko.start(latency=args.latency, jitter=args.jitter,
+                                        rate_429=args.rate_429, seed=args.seed)
+    webapp = load_app(database,
+                      COINGECKO_API_URL=f'http://127.0.0.1:{server.server_port}',
+                      PRICE_INGESTION_MODE=args.mode,
+                      RATE_LIMITS=args.rate_limits,
+                      RATE_LIMIT_PATH=os.path.join(workdir, 'rate_limit.db'),
+                      PRICE_CACHE_PATH=os.path.join(workdir, 'price_cache.db'))
+    http = make_server('127.0.0.1', 0, webapp.app, threaded=True,
+                       request_handler=QuietRequestHandler)
+    threading.Thread(target=http.serve_forever, name='bench-server', daemon=True).start()
+    base_url = f'http://127.0.0.1:{http.server_port}'
+
+    with webapp.app.app_context():
+        user_count = webapp.User.query.count()
+    rng = random.Random(args.seed)
+    usernames = [f'user{user_id}' for user_id in
+                 rng.sample(range(1, user_count + 1), min(args.concurrency, user_count))]
+    clients = [Client(base_url, username) for username in usernames]
+
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'database': os.path.basename(args.db),
+            'users': user_count,
+            'concurrency': len(clients),
+            'iterations': args.iterations,
+            'upstream_latency': args.latency,
+            'rate_429': args.rate_429,
+            'mode': args.mode,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+        },
+        'scenarios': {}
+    }
+    try:
+        for name in names:
+            fake.reset()
+            summary = run_scenario(name, clients, args.iterations, args.warmup, args.seed)
+            summary['upstream'] = fake.stats()
+            results['scenarios'][name] = summary
+            print_summary(name, summary)
+            print(f"   appels CoinGecko: {summary['upstream']['total']} "
+                  f"(429: {summary['upstream']['rate_limited']})")
+    finally:
+        http.shutdown()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f'{args.save_baseline}.json')
+        with open(path, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"Reference enregistree: {path}")
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f'{args.compare}.json')) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Génération des bases SQLite des benchmarks
+
+Crée N utilisateurs avec chacun entre 5 et 200 positions (tirage
+déterministe), la table asset avec des prix, l'annuaire local des coins et
+un historique de prix journalier (plus horaire sur les derniers jours), à
+partir du même univers de coins que le faux CoinGecko.
+
+Usage:
+    python seed_db.py 1k                       - 1 000 utilisateurs (data/users-1k.db)
+    python seed_db.py 10k                      - 10 000 utilisateurs (data/users-10k.db)
+    python seed_db.py <nombre> [fichier] [--min-holdings 5] [--max-holdings 200] [--seed 42]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import DATA_DIR, PASSWORD, load_app
+from fake_coingecko import COINS, coin_price
+
+PRESETS = {'1k': 1000, '10k': 10000}
+# Lignes insérées par paquet
+CHUNK_SIZE = 10000
+HISTORY_DAYS = 180
+HOURLY_DAYS = 2
+DAY = 86400
+
+
+def insert_chunks(connection, table, rows):
+    """Insère des lignes (itérable de dictionnaires) par paquets, retourne leur nombre"""
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            connection.execute(table.insert(), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        connection.execute(table.insert(), chunk)
+        count += len(chunk)
+    return count
+
+
+def seed(webapp, users, min_holdings=5, max_holdings=200, seed_value=42):
+    """Remplit une base vide, retourne le nombre de lignes par table"""
+    from werkzeug.security import generate_password_hash
+
+    db = webapp.db
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(PASSWORD)  # un seul hachage pour tous
+    max_holdings = min(max_holdings, len(COINS))
+    counts = {}
+
+    with webapp.app.app_context(), db.engine.begin() as connection:
+        counts['coin'] = insert_chunks(connection, webapp.Coin.__table__, (
+            {'id': coin['id'], 'symbol': coin['symbol'], 'name': coin['name'],
+             'market_cap_rank': coin['rank'], 'updated_at': now} for coin in COINS))
+        counts['asset'] = insert_chunks(connection, webapp.Asset.__table__, (
+            {'id': position, 'symbol': coin['symbol'], 'name': coin['name'], 'coin_id': coin['id'],
+             'current_price': coin_price(coin), 'price_change_24h': (coin['rank'] % 11) - 5.0,
+             'updated_at': now} for position, coin in enumerate(COINS, start=1)))
+
+        counts['user'] = insert_chunks(connection, webapp.User.__table__, (
+            {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@bench.local',
+             'password_hash': password_hash, 'created_at': now, 'portfolio_version': 0}
+            for user_id in range(1, users + 1)))
+
+        # Les petits rangs (coins populaires) sont plus souvent détenus
+        weights = [1 / coin['rank'] ** 0.5 for coin in COINS]
+
+        def holdings():
+            for user_id in range(1, users + 1):
+                count = rng.randint(min_holdings, max_holdings)
+                asset_ids = set()
+                while len(asset_ids) < count:
+                    asset_ids.update(rng.choices(range(1, len(COINS) + 1), weights, k=count - len(asset_ids)))
+                for asset_id in asset_ids:
+                    price = coin_price(COINS[asset_id - 1])
+                    yield {'user_id': user_id, 'asset_id': asset_id,
+                           'quantity': round(rng.uniform(0.01, 100), 4),
+                           'purchase_price': price * rng.uniform(0.5, 1.5),
+                           'realized_pnl': 0, 'cost_method': 'average',
+                           'created_at': now, 'last_updated': now}
+
+        counts['holding'] = insert_chunks(connection, webapp.Holding.__table__, holdings())
+
+        end = int(time.time())
+
+        def points():
+            for coin in COINS:
+                price = coin_price(coin)
+                for day in range(HISTORY_DAYS, 0, -1):
+                    yield {'symbol': coin['symbol'], 'ts': end - day * DAY,
+                           'price': price * (1 + rng.gauss(0, 0.03))}
+                for hour in range(HOURLY_DAYS * 24, 0, -1):
+                    yield {'symbol': coin['symbol'], 'ts': end - hour * 3600 + 1,
+                           'price': price * (1 + rng.gauss(0, 0.01))}
+
+        counts['price_history'] = insert_chunks(connection, webapp.PricePoint.__table__, points())
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Génère une base SQLite pour les benchmarks")
+    parser.add_argument('users', help="nombre d'utilisateurs ou préréglage (1k, 10k)")
+    parser.add_argument('output', nargs='?', help="fichier de la base (défaut: data/users-<n>.db)")
+    parser.add_argument('--min-holdings', type=int, default=5)
+    parser.add_argument('--max-holdings', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    users = PRESETS.get(args.users) or int(args.users)
+    output = args.output or os.path.join(DATA_DIR, f'users-{args.users}.db')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if os.path.exists(output):
+        os.remove(output)
+
+    started = time.time()
+    webapp = load_app(output)
+    counts = seed(webapp, users, args.min_holdings, args.max_holdings, args.seed)
+    print(f"Base {output} generee en {time.time() - started:.1f}s")
+    for table, count in counts.items():
+        print(f"   - {table}: {count}")
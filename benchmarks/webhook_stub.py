@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Récepteur de webhooks local (alertes de prix), sans accès réseau
+
+Enregistre les corps JSON reçus en POST; GET /__stats retourne le nombre
+de requêtes et d'alertes reçues.
+
+Usage:
+    python webhook_stub.py [--port 8998]
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class WebhookStub:
+    """Requêtes reçues et compteurs"""
+
+    def __init__(self, keep=1000):
+        self.keep = keep
+        self.requests = 0
+        self.alerts = 0
+        self.received = []  # derniers corps reçus
+        self._lock = threading.Lock()
+
+    def record(self, body):
+        with self._lock:
+            self.requests += 1
+            self.alerts += len(body.get('alerts', []))
+            self.received.append(body)
+            del self.received[:-self.keep]
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'alerts': self.alerts}
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._send(400, {'error': 'invalid json'})
+            stub.record(body)
+            self._send(200, {'ok': True})
+
+        def do_GET(self):
+            if self.path.strip('/') == '__stats':
+                return self._send(200, stub.stats())
+            self._send(404, {'error': 'not found'})
+
+    return Handler
+
+
+def start(port=0):
+    """Démarre le récepteur dans un thread, retourne (serveur, WebhookStub)"""
+    stub = WebhookStub()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='webhook-stub', daemon=True).start()
+    return server, stub
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Récepteur de webhooks local")
+    parser.add_argument('--port', type=int, default=8998)
+    args = parser.parse_args()
+
+    server, stub = start(args.port)
+    print(f"Webhooks sur http://127.0.0.1:{server.server_port}/ (ALERT_WEBHOOK_URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -1,13 +1,20 @@
-from backend.app import app
+import os
+
+from backend.app import app, migrate_database, start_background
+
+# Serveur de développement uniquement (production: gunicorn -c backend/gunicorn.conf.py)
+DEBUG = os.environ.get('FLASK_DEBUG', '1') == '1'
 
 if __name__ == '__main__':
+    migrate_database()
+    start_background()
     try:
-        app.run(host='127.0.0.1', port=8080, debug=True, use_reloader=False)
+        app.run(host='127.0.0.1', port=8080, debug=DEBUG, use_reloader=False)
     except Exception as e:
         print(f"Erreur lors du démarrage du serveur: {e}")
         print("Essayez avec un port différent...")
         try:
-            app.run(host='127.0.0.1', port=5001, debug=True, use_reloader=False)
+            app.run(host='127.0.0.1', port=5001, debug=DEBUG, use_reloader=False)
         except Exception as e2:
             print(f"Erreur sur le port 5001: {e2}")
             print("Application terminée.")
\ No newline at end of file
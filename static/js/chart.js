@@ -2,6 +2,30 @@
 
 console.log('Chart.js chargé avec succès');
 
+// Devise d'affichage de l'utilisateur (voir base.html): les montants de la page
+// sont déjà convertis, les prix en direct arrivent dans la devise de cotation
+function currency() {
+    const data = document.body.dataset;
+    return {
+        code: data.currency || 'USD',
+        symbol: data.currencySymbol || '$',
+        decimals: parseInt(data.currencyDecimals || '2', 10),
+        prefix: data.currencyPrefix !== '0',
+        rate: parseFloat(data.fxRate || '1')
+    };
+}
+
+function formatMoney(value) {
+    const { symbol, decimals, prefix } = currency();
+    const amount = Math.abs(value).toFixed(decimals);
+    const sign = value < 0 && parseFloat(amount) !== 0 ? '-' : '';
+    return prefix ? sign + symbol + amount : sign + amount + ' ' + symbol;
+}
+
+function parseMoney(text) {
+    return parseFloat(text.replace(/[^\d.-]/g, ''));
+}
+
 // Graphique simple pour la répartition du portefeuille (placeholder)
 function createAllocationChart() {
     const ctx = document.getElementById('allocationChart');
@@ -16,7 +40,7 @@ function createAllocationChart() {
     const values = [];
     document.querySelectorAll('tbody tr').forEach(row => {
         names.push(row.cells[0].textContent);
-        values.push(parseFloat(row.cells[5].textContent.replace('$', '').replace(',', '')));
+        values.push(parseMoney(row.cells[5].textContent));
     });
 
     const colors = generateColors(values.length);
@@ -61,7 +85,7 @@ function createPerformanceChart() {
     document.querySelectorAll('tbody tr').forEach(row => {
         symbols.push(row.cells[1].textContent);
         const profitText = row.cells[7].textContent.trim();
-        const profitValue = parseFloat(profitText.replace('$', '').replace(',', ''));
+        const profitValue = parseMoney(profitText);
         profits.push(profitValue);
     });
 
@@ -72,7 +96,7 @@ function createPerformanceChart() {
         data: {
             labels: symbols,
             datasets: [{
-                label: 'Profit/Perte ($)',
+                label: `Profit/Perte (${currency().code})`,
                 data: profits,
                 backgroundColor: colors,
                 borderColor: colors.map(color => color),
@@ -98,7 +122,7 @@ function createPerformanceChart() {
                     beginAtZero: true,
                     ticks: {
                         callback: function (value) {
-                            return '$' + value.toFixed(2);
+                            return formatMoney(value);
                         }
                     }
                 }
@@ -107,6 +131,84 @@ function createPerformanceChart() {
     });
 }
 
+// Courbe de valeur et de P&L du portefeuille (/api/portfolio_history)
+function createHistoryChart(range) {
+    const ctx = document.getElementById('historyChart');
+    if (!ctx) return;
+
+    fetch('/api/portfolio_history?range=' + encodeURIComponent(range || ctx.dataset.range || '30d'))
+        .then(response => response.json())
+        .then(data => {
+            if (data.error || !data.value || data.value.length === 0) return;
+
+            const daily = data.interval === '1d';
+            const labels = data.timestamps.map(ts => {
+                const date = new Date(ts * 1000);
+                return daily ? date.toLocaleDateString('fr-FR')
+                             : date.toLocaleString('fr-FR', { dateStyle: 'short', timeStyle: 'short' });
+            });
+
+            if (ctx.chart) ctx.chart.destroy();
+            ctx.chart = new Chart(ctx, {
+                type: 'line',
+                data: {
+                    labels: labels,
+                    datasets: [{
+                        label: `Valeur (${currency().code})`,
+                        data: data.value,
+                        borderColor: '#007bff',
+                        backgroundColor: 'rgba(0, 123, 255, 0.1)',
+                        fill: true,
+                        pointRadius: 0,
+                        tension: 0.2
+                    }, {
+                        label: `Profit/Perte (${currency().code})`,
+                        data: data.profit_loss,
+                        borderColor: '#28a745',
+                        pointRadius: 0,
+                        tension: 0.2
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    interaction: {
+                        mode: 'index',
+                        intersect: false
+                    },
+                    plugins: {
+                        title: {
+                            display: true,
+                            text: 'Évolution du Portefeuille',
+                            font: {
+                                size: 16
+                            }
+                        },
+                        legend: {
+                            position: 'bottom'
+                        }
+                    },
+                    scales: {
+                        x: {
+                            ticks: {
+                                maxTicksLimit: 10
+                            }
+                        },
+                        y: {
+                            ticks: {
+                                callback: function (value) {
+                                    return formatMoney(value);
+                                }
+                            }
+                        }
+                    }
+                }
+            });
+        })
+        .catch(error => {
+            console.log("Erreur lors du chargement de l'historique:", error);
+        });
+}
+
 // Générer des couleurs aléatoires
 function generateColors(count) {
     const colors = [];
@@ -136,30 +238,55 @@ function animateCounters() {
                 currentValue = numericValue;
                 clearInterval(timer);
             }
-            totalValueElement.textContent = 'Valeur Totale: $' + currentValue.toFixed(2);
+            totalValueElement.textContent = 'Valeur Totale: ' + formatMoney(currentValue);
         }, 30);
     }
 }
 
-// Auto-refresh des prix (toutes les 30 secondes)
-function startPriceRefresh() {
-    setInterval(function () {
-        fetch('/api/refresh_prices', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    location.reload(); // Recharger la page pour mettre à jour les prix
-                }
-            })
-            .catch(error => {
-                console.log('Erreur lors de la mise à jour des prix:', error);
-            });
-    }, 30000); // 30 secondes
+// Prix en direct et instantané du marché: un seul flux SSE par page au lieu d'un polling
+// (une page qui affiche le marché définit window.onMarketData)
+function startPriceStream() {
+    const cards = document.querySelectorAll('[data-symbol]');
+    const onMarketData = window.onMarketData;
+    if ((cards.length === 0 && typeof onMarketData !== 'function') || !window.EventSource) return null;
+
+    const source = new EventSource('/api/stream/prices');
+    source.addEventListener('prices', function (event) {
+        const prices = JSON.parse(event.data);
+        cards.forEach(card => {
+            const info = prices[card.dataset.symbol];
+            if (info) updatePriceCard(card, info);
+        });
+    });
+    if (typeof onMarketData === 'function') {
+        source.addEventListener('market', function (event) {
+            onMarketData(JSON.parse(event.data));
+        });
+    }
+    source.onerror = function () {
+        // EventSource se reconnecte automatiquement
+        console.log('Flux des prix interrompu, reconnexion...');
+    };
+    return source;
+}
+
+// Met à jour le prix et le P&L affichés pour une position
+function updatePriceCard(card, info) {
+    const price = info.price * currency().rate;
+    const priceElement = card.querySelector('.current-price');
+    if (priceElement) {
+        priceElement.textContent = formatMoney(price);
+    }
+
+    const profitElement = card.querySelector('.profit-loss-small');
+    const quantity = parseFloat(card.dataset.quantity);
+    const purchasePrice = parseFloat(card.dataset.purchasePrice);
+    if (profitElement && !isNaN(quantity) && !isNaN(purchasePrice)) {
+        const profit = (price - purchasePrice) * quantity;
+        profitElement.textContent = (profit >= 0 ? '+' : '') + formatMoney(profit);
+        profitElement.classList.toggle('profit', profit >= 0);
+        profitElement.classList.toggle('loss', profit < 0);
+    }
 }
 
 // Initialisation quand le DOM est chargé
@@ -167,10 +294,11 @@ document.addEventListener('DOMContentLoaded', function () {
     // Créer les graphiques si les canvas existent
     createAllocationChart();
     createPerformanceChart();
+    createHistoryChart();
 
     // Démarrer les animations
     animateCounters();
 
-    // Démarrer la mise à jour automatique des prix
-    startPriceRefresh();
+    // Recevoir les prix en direct
+    startPriceStream();
 });
\ No newline at end of file
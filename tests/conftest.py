@@ -0,0 +1,37 @@
+"""
+Configuration commune des tests de l'application Portefeuille Crypto
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    """Module app sur une base SQLite temporaire, schéma migré"""
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'test.db')}"
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'memory'
+    import app as module
+    module.app.config['TESTING'] = True
+    module.app.template_folder = os.path.join(os.path.dirname(BACKEND), 'templates')
+    module.migrate_database()
+    return module
+
+
+@pytest.fixture
+def user(app_module):
+    """Utilisateur neuf (nom unique par test)"""
+    with app_module.app.app_context():
+        count = app_module.User.query.count()
+        user = app_module.User(username=f'test{count}', email=f'test{count}@example.com',
+                               password_hash='x')
+        app_module.db.session.add(user)
+        app_module.db.session.commit()
+        yield user
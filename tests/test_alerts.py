@@ -0,0 +1,47 @@
+"""
+Tests des alertes de prix (validation, rafraîchissement des symboles suivis)
+"""
+
+import pytest
+
+from alerts import validate_alert
+from price_worker import PriceIngestionWorker
+
+
+@pytest.mark.parametrize('threshold', [float('nan'), float('inf'), float('-inf'), 0, -5, None])
+def test_validate_alert_rejects_invalid_threshold(threshold):
+    with pytest.raises(ValueError):
+        validate_alert('above', threshold)
+
+
+def test_validate_alert_accepts_finite_threshold():
+    validate_alert('above', 50000.0)
+    validate_alert('move', 10)
+
+
+def test_alert_on_unheld_symbol_fires_after_refresh(app_module, user):
+    m = app_module
+    fetched = []
+
+    def fetch_prices(symbols, use_cache=True):
+        fetched.append(list(symbols))
+        prices = {symbol: {'price': 2.0, 'change_24h': 0} for symbol in symbols}
+        m.record_prices(prices)
+        return prices
+
+    with m.app.app_context():
+        alert = m.PriceAlert(user_id=user.id, symbol='NOHOLD', kind='above', threshold=1.5)
+        m.db.session.add(alert)
+        m.db.session.commit()
+        alert_id = alert.id
+
+    worker = PriceIngestionWorker(m.app, m.db, m.Holding, m.Asset, fetch_prices,
+                                  extra_symbols=m.alert_engine.watched_symbols)
+    worker.run_once()
+
+    assert 'NOHOLD' in fetched[0]
+    with m.app.app_context():
+        alert = m.db.session.get(m.PriceAlert, alert_id)
+        assert not alert.active
+        assert alert.triggered_price == 2.0
+        assert m.AlertNotification.query.filter_by(alert_id=alert_id).count() == 1
@@ -0,0 +1,46 @@
+"""
+Tests de la résolution des symboles par l'annuaire des coins
+"""
+
+from coin_directory import CoinIndex
+
+
+def coin(coin_id, symbol, name, rank=None):
+    return {'id': coin_id, 'symbol': symbol, 'name': name, 'thumb': None, 'market_cap_rank': rank}
+
+
+def test_resolve_prefers_ranked_coin():
+    index = CoinIndex([
+        coin('eth-copy', 'ETH', 'E'),
+        coin('ethereum', 'ETH', 'Ethereum', rank=2),
+    ])
+    assert index.resolve('eth') == 'ethereum'
+
+
+def test_resolve_ambiguous_unranked_symbol_returns_none():
+    index = CoinIndex([
+        coin('uni-copy', 'UNI', 'U'),
+        coin('uniswap', 'UNI', 'Uniswap'),
+        coin('solo', 'SOLO', 'Solo'),
+    ])
+    assert index.resolve('UNI') is None
+    assert 'UNI' in index
+    assert index.resolve('SOLO') == 'solo'
+    assert 'NONE' not in index
+
+
+def test_refresh_takes_ranks_from_market_snapshot(app_module):
+    class Client:
+        def get(self, path):
+            assert path == '/coins/list'
+            return [{'id': 'link-copy', 'symbol': 'link', 'name': 'L'},
+                    {'id': 'chainlink', 'symbol': 'link', 'name': 'Chainlink'}]
+
+    with app_module.app.app_context():
+        directory = app_module.coin_directory
+        directory.refresh(Client(), [{'id': 'chainlink', 'rank': 15, 'image': 'link.png'}])
+        assert directory.resolve('LINK') == 'chainlink'
+        directory.refresh(Client())
+        # Rang déjà connu conservé quand l'instantané n'en donne pas
+        assert directory.resolve('LINK') == 'chainlink'
+        directory.load([])
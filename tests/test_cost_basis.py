@@ -0,0 +1,41 @@
+"""
+Tests du prix de revient des positions antérieures au registre des transactions
+"""
+
+import pytest
+
+
+def legacy_holding(m, user, symbol, quantity, price, method):
+    """Position créée sans transaction (base d'une version antérieure)"""
+    asset = m.Asset(symbol=symbol, name=symbol, current_price=0, price_change_24h=0)
+    holding = m.Holding(user_id=user.id, asset=asset, quantity=quantity, purchase_price=price,
+                        realized_pnl=0, cost_method=method)
+    m.db.session.add_all([asset, holding])
+    m.db.session.commit()
+    return holding
+
+
+@pytest.mark.parametrize('method, expected', [('fifo', 2000.0), ('lifo', 500.0 + 1000.0)])
+def test_sell_consumes_unlotted_quantity_as_oldest_lot(app_module, user, method, expected):
+    m = app_module
+    with m.app.app_context():
+        holding = legacy_holding(m, user, f'OLD{method.upper()}', 10, 100, method)
+        m.cost_basis.buy(holding, 5, 200)
+        sale = m.cost_basis.sell(holding, 10, 300)
+        # FIFO: 10 anciennes à 100; LIFO: le lot de 5 à 200 puis 5 anciennes à 100
+        assert sale.realized_pnl == pytest.approx(expected)
+        assert holding.quantity == pytest.approx(5)
+        m.db.session.commit()
+
+
+def test_migrate_creates_opening_lots(app_module, user):
+    m = app_module
+    with m.app.app_context():
+        holding = legacy_holding(m, user, 'MIGR', 3, 50, 'fifo')
+        m.migrate_database()
+        lots = m.Transaction.query.filter_by(holding_id=holding.id).all()
+        assert [(lot.side, lot.quantity, lot.remaining_quantity, lot.price) for lot in lots] == [
+            ('buy', 3, 3, 50)]
+        assert lots[0].created_at == holding.created_at
+        m.migrate_database()
+        assert m.Transaction.query.filter_by(holding_id=holding.id).count() == 1
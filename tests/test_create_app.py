@@ -0,0 +1,19 @@
+"""
+Tests du point d'entrée create_app
+"""
+
+import pytest
+
+
+def test_create_app_applies_runtime_config(app_module):
+    app = app_module.create_app({'PRICE_STREAM_MAX_DURATION': 42})
+    assert app.config['PRICE_STREAM_MAX_DURATION'] == 42
+
+
+@pytest.mark.parametrize('name', ['SQLALCHEMY_DATABASE_URI', 'PRICE_CACHE_BACKEND', 'RESPONSE_CACHE_TTL',
+                                  'RATE_LIMITS', 'SQLALCHEMY_ENGINE_OPTIONS'])
+def test_create_app_rejects_import_time_config(app_module, name):
+    before = app_module.app.config[name]
+    with pytest.raises(ValueError, match=name):
+        app_module.create_app({name: 'autre'})
+    assert app_module.app.config[name] == before
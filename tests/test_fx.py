@@ -0,0 +1,38 @@
+"""
+Tests des taux de change en cache
+"""
+
+import logging
+
+from cache import create_cache
+from fx import FxRates, QUOTE_CURRENCY
+
+RATES = {'rates': {'usd': {'value': 60000.0}, 'eur': {'value': 55000.0}}}
+
+
+def test_failure_backs_off_and_serves_quote_currency(caplog):
+    calls = []
+
+    def fetch_rates():
+        calls.append(1)
+        if len(calls) <= 2:
+            raise ConnectionError("amont indisponible")
+        return RATES
+
+    fx = FxRates(fetch_rates, create_cache('memory', ttl=3600), logger=logging.getLogger('fx-test'))
+    with caplog.at_level(logging.ERROR, logger='fx-test'):
+        for _ in range(5):
+            assert fx.currency('EUR').code == QUOTE_CURRENCY
+    assert len(calls) == 1
+    assert len(caplog.records) == 1
+
+    # Backoff écoulé: nouvel échec, sans nouveau message
+    fx._retry_at = 0
+    assert fx.currency('EUR').code == QUOTE_CURRENCY
+    assert len(calls) == 2
+    assert len(caplog.records) == 1
+
+    fx._retry_at = 0
+    currency = fx.currency('EUR')
+    assert (currency.code, round(currency.rate, 4)) == ('EUR', round(55000 / 60000, 4))
+    assert len(calls) == 3
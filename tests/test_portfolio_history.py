@@ -0,0 +1,82 @@
+"""
+Tests de l'historique de valeur du portefeuille
+"""
+
+from datetime import datetime, timedelta, timezone
+
+HOUR = 3600
+
+
+def _epoch(when):
+    return int(when.replace(tzinfo=timezone.utc).timestamp())
+
+
+def test_empty_portfolio_series_have_equal_length(app_module, user):
+    end = _epoch(datetime.utcnow())
+    with app_module.app.app_context():
+        history = app_module.portfolio_history.compute(user.id, end - 24 * HOUR, end, HOUR)
+    lengths = {len(history[name]) for name in ('timestamps', 'value', 'invested', 'profit_loss')}
+    assert lengths == {len(history['timestamps'])}
+    assert not any(history['value'])
+
+
+def test_withdrawn_position_stays_in_history(app_module, user):
+    m = app_module
+    now = datetime.utcnow()
+    bought, sold = now - timedelta(hours=10), now - timedelta(hours=5)
+    with m.app.app_context():
+        asset = m.Asset.query.filter_by(symbol='HIST').first()
+        if asset is None:
+            asset = m.Asset(symbol='HIST', name='Hist', current_price=0, price_change_24h=0)
+            m.db.session.add(asset)
+        holding = m.Holding(user_id=user.id, asset=asset, quantity=0, purchase_price=0)
+        m.db.session.add(holding)
+        m.cost_basis.buy(holding, 2, 100, when=bought)
+        m.cost_basis.sell(holding, 2, 150, when=sold)
+        m.cost_basis.close_position(holding)
+        m.db.session.delete(holding)
+        m.db.session.commit()
+
+        end = _epoch(now)
+        history = m.portfolio_history.compute(user.id, end - 24 * HOUR, end, HOUR)
+
+    invested = dict(zip(history['timestamps'], history['invested']))
+    assert invested[max(t for t in invested if t <= _epoch(bought - timedelta(hours=1)))] == 0
+    assert invested[max(t for t in invested if _epoch(bought) <= t < _epoch(sold))] == 200
+    assert history['invested'][-1] == -100
+
+
+def test_legacy_holding_keeps_quantity_after_a_buy(app_module, user):
+    m = app_module
+    now = datetime.utcnow()
+    created, bought = now - timedelta(hours=20), now - timedelta(hours=4)
+    with m.app.app_context():
+        asset = m.Asset(symbol='LEGA', name='Legacy', current_price=0, price_change_24h=0)
+        # Position antérieure au registre: aucune transaction
+        holding = m.Holding(user_id=user.id, asset=asset, quantity=10, purchase_price=100,
+                            realized_pnl=0, cost_method='fifo', created_at=created)
+        m.db.session.add_all([asset, holding])
+        m.cost_basis.buy(holding, 5, 200, when=bought)
+        m.db.session.commit()
+
+        end = _epoch(now)
+        history = m.portfolio_history.compute(user.id, end - 24 * HOUR, end, HOUR)
+
+    invested = dict(zip(history['timestamps'], history['invested']))
+    assert invested[max(t for t in invested if t < _epoch(created))] == 0
+    assert invested[max(t for t in invested if _epoch(created) <= t < _epoch(bought))] == 1000
+    assert history['invested'][-1] == 2000
+
+
+def test_history_range_is_bounded(app_module, user):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+    assert client.get('/api/portfolio_history?range=9999y&interval=1m').status_code == 400
+    assert client.get('/api/price_history/BTC?range=9999y').status_code == 400
+    response = client.get('/api/portfolio_history?range=5y&interval=1m')
+    assert response.status_code == 200
+    assert response.get_json()['interval'] == '1d'
+    assert len(response.get_json()['timestamps']) <= 2001
@@ -0,0 +1,69 @@
+"""
+Tests de l'import de portefeuille (lecture des montants, symboles importés)
+"""
+
+import pytest
+
+from portfolio_io import parse_number, PortfolioImporter
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1,000', 1000.0),
+    ('$1,000.50', 1000.5),
+    ('1.234,5', 1234.5),
+    ('1 234,5', 1234.5),
+    ('1,234,567.89', 1234567.89),
+    ('0,5', 0.5),
+    ('0.123', 0.123),
+    ('-2.5', -2.5),
+    ('1e-5', 1e-5),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('text', ['1,2,3', '1.234.5', '12,34,567', '1,23.456,7', 'abc', ''])
+def test_parse_number_rejects_ambiguous(text):
+    with pytest.raises(ValueError):
+        parse_number(text)
+
+
+def test_import_reports_only_accepted_symbols(app_module, user):
+    fetched = []
+    importer = PortfolioImporter(app_module.cost_basis, fetch_prices=fetched.append)
+    result = importer.import_rows(user.id, [
+        {'symbol': 'BTC', 'quantity': '1,000', 'price': '$30,000.00'},
+        {'symbol': 'ETH', 'side': 'sell', 'quantity': '5', 'price': '2000'},
+        {'symbol': 'SOL', 'quantity': '1,23.4', 'price': '20'},
+    ])
+
+    assert (result.imported, result.skipped) == (1, 2)
+    assert result.symbols == ['BTC']
+    assert fetched == [['BTC']]
+    holdings = app_module.Holding.query.filter_by(user_id=user.id).all()
+    assert [holding.asset.symbol for holding in holdings] == ['BTC']
+    assert holdings[0].quantity == 1000
+
+
+def test_import_applies_rows_by_date(app_module, user):
+    importer = PortfolioImporter(app_module.cost_basis)
+    # Export le plus récent d'abord: la vente précède ses achats dans le fichier
+    result = importer.import_rows(user.id, [
+        {'symbol': 'NEWF', 'side': 'sell', 'quantity': '3', 'price': '20', 'date': '2024-03-01T00:00:00Z'},
+        {'symbol': 'NEWF', 'quantity': '2', 'price': '10', 'date': '2024-02-01T00:00:00Z'},
+        {'symbol': 'NEWF', 'quantity': '2', 'price': '12', 'date': '2024-01-01T00:00:00Z'},
+    ])
+    assert (result.imported, result.errors) == (3, [])
+    holding = app_module.Holding.query.filter_by(user_id=user.id).one()
+    assert holding.quantity == pytest.approx(1)
+
+
+def test_import_without_dates_explains_order(app_module, user):
+    importer = PortfolioImporter(app_module.cost_basis)
+    result = importer.import_rows(user.id, [
+        {'symbol': 'NODT', 'quantity': '1', 'price': '10'},
+        {'symbol': 'NODT', 'side': 'sell', 'quantity': '3', 'price': '20'},
+        {'symbol': 'NODT', 'quantity': '2', 'price': '10'},
+    ])
+    assert result.imported == 2
+    assert "ordre du fichier" in result.errors[0]
@@ -0,0 +1,44 @@
+"""
+Tests du flux SSE des prix et de l'instantané du marché
+"""
+
+import json
+
+from flask import Flask
+
+from price_stream import PricePublisher
+
+
+def events(messages):
+    """[(événement, données)] des messages SSE reçus"""
+    parsed = []
+    for message in messages:
+        lines = dict(line.split(': ', 1) for line in message.strip().split('\n') if ': ' in line)
+        if 'event' in lines:
+            parsed.append((lines['event'], json.loads(lines['data'])))
+    return parsed
+
+
+def test_stream_sends_market_snapshot_when_etag_changes():
+    market = {'etag': 'a', 'entries': [{'symbol': 'BTC', 'current_price': 1}]}
+    publisher = PricePublisher(Flask(__name__),
+                               lambda symbols: {symbol: {'price': 10.0} for symbol in symbols},
+                               fetch_market=lambda: (market['etag'], market['entries']))
+    publisher.start = lambda: None  # cycles déclenchés par le test
+
+    stream = publisher.stream(['ETH'], heartbeat=0.01)
+    assert next(stream).startswith('retry:')
+    publisher.run_once()
+    received = events([next(stream), next(stream)])
+    assert ('market', [{'symbol': 'BTC', 'current_price': 1}]) in received
+    assert ('prices', {'ETH': {'price': 10.0, 'change_24h': 0}}) in received
+
+    # Même ETag: rien de nouveau, seulement le heartbeat
+    publisher.run_once()
+    assert next(stream) == ": ping\n\n"
+
+    market.update(etag='b', entries=[{'symbol': 'ETH', 'current_price': 2}])
+    publisher.run_once()
+    assert events([next(stream)]) == [('market', [{'symbol': 'ETH', 'current_price': 2}])]
+    stream.close()
+    assert publisher.run_once() == []
@@ -0,0 +1,48 @@
+"""
+Tests du cache des réponses rendues
+"""
+
+import pytest
+from flask import Flask, make_response
+
+from cache import create_cache
+from response_cache import ResponseCache, PriceEpoch
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def client(request, tmp_path):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    path = str(tmp_path / 'cache.db')
+    epoch = PriceEpoch(create_cache(request.param, path, table='epoch'))
+    response_cache = ResponseCache(create_cache(request.param, path, ttl=60, table='response'),
+                                   epoch, vary=lambda: ('user',))
+    calls = []
+
+    @app.route('/page')
+    @response_cache.cached
+    def page():
+        calls.append(1)
+        response = make_response({'value': len(calls)})
+        response.headers['Cache-Control'] = 'private, max-age=30'
+        response.headers['X-Portfolio-Version'] = '7'
+        response.set_cookie('seen', 'yes')
+        return response
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_hit_replays_headers_of_miss(client):
+    miss = client.get('/page')
+    hit = client.get('/page')
+
+    assert len(client.calls) == 1
+    assert hit.get_data() == miss.get_data()
+    assert hit.status_code == miss.status_code
+    assert hit.mimetype == miss.mimetype == 'application/json'
+    for name in ('Cache-Control', 'X-Portfolio-Version', 'Content-Type', 'Content-Length'):
+        assert hit.headers[name] == miss.headers[name]
+    assert 'Set-Cookie' in miss.headers
+    assert 'Set-Cookie' not in hit.headers